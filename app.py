@@ -1,22 +1,197 @@
 import streamlit as st
-import networkx as nx
-import matplotlib.pyplot as plt
-from collections import defaultdict
+import functools
+import uuid
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import figuras
+import perfilador
+import trabajos
+import validacion_red
 
 st.title("Configuración Inicial de la Red de Protección")
 
+# Identificador de la sesión para contar sus figuras vivas
+if "id_sesion" not in st.session_state:
+    st.session_state.id_sesion = uuid.uuid4().hex
+
+
+# --- Perfilador (opcional, barra lateral): registro por sesión activo durante la corrida ---
+def widgets_de_la_corrida():
+    ids = getattr(getattr(get_script_run_ctx(), "shared", None), "widget_ids_this_run", None)
+    if ids is None:
+        return 0
+    return len(ids.snapshot() if hasattr(ids, "snapshot") else ids)
+
+
+def registro_perfil():
+    if not st.session_state.get("perfilador_activo"):
+        return None
+    if "perfil" not in st.session_state:
+        st.session_state.perfil = perfilador.Registro(contador_widgets=widgets_de_la_corrida)
+    return st.session_state.perfil
+
+
+# Los fragmentos se vuelven a ejecutar sin pasar por el inicio de la página: activan el registro
+# de la sesión por su cuenta y miden su ejecución como una sección con el nombre del Paso
+def perfilado(nombre):
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with perfilador.activo(registro_perfil()), perfilador.seccion(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def mostrar_figura(fig, **kwargs):
+    with perfilador.seccion("codificación de figura"):
+        st.pyplot(fig, **kwargs)
+
+
+# Gráfico vectorial: el navegador dibuja la especificación Vega-Lite (el servidor solo la serializa)
+def mostrar_vista(especificacion, **kwargs):
+    with perfilador.seccion("envío de vista"):
+        st.vega_lite_chart(especificacion, **kwargs)
+
+
+# --- Trabajos en segundo plano: la sesión guarda en st.session_state[nombre] la clave del trabajo ---
+INTERVALO_TRABAJOS = 0.5
+
+
+# Trabajo de la sesión para las entradas actuales (clave); si las entradas cambiaron, el trabajo
+# anterior se suelta (y se cancela si ninguna otra sesión lo espera)
+def trabajo_de_sesion(nombre, clave):
+    anterior = st.session_state.get(nombre)
+    if anterior is None:
+        return None
+    trabajo = trabajos.POOL.obtener(anterior) if anterior == clave else None
+    if trabajo is None:
+        trabajos.POOL.soltar(anterior, st.session_state.id_sesion)
+        del st.session_state[nombre]
+    return trabajo
+
+
+def enviar_trabajo(nombre, clave, etiqueta, funcion, *args, **kwargs):
+    st.session_state[nombre] = clave
+    return trabajos.POOL.enviar(clave, etiqueta, funcion, *args, sesion=st.session_state.id_sesion, **kwargs)
+
+
+# Avance de un trabajo en curso: el fragmento se vuelve a ejecutar cada INTERVALO_TRABAJOS segundos
+# (sin bloquear el resto de la página) y al terminar el trabajo vuelve a ejecutar la página
+def seguir_trabajo(nombre, trabajo):
+    @st.fragment(run_every=INTERVALO_TRABAJOS)
+    def seguimiento():
+        if trabajo.terminado():
+            st.rerun()
+        texto = f"{trabajo.nombre}: {trabajo.estado} · {trabajo.segundos():.1f} s"
+        if trabajo.texto:
+            texto += f" · {trabajo.texto}"
+        if trabajo.avance is None:
+            st.info(f"⏳ {texto}")
+        else:
+            st.progress(trabajo.avance, text=texto)
+        if len(trabajo.sesiones) > 1:
+            st.caption(f"Cálculo compartido con {len(trabajo.sesiones) - 1} sesión(es) más.")
+        if st.button("Cancelar", key=f"cancelar_{nombre}"):
+            trabajos.POOL.soltar(trabajo.clave, st.session_state.id_sesion)
+            del st.session_state[nombre]
+            st.rerun()
+
+    seguimiento()
+
+
+# Resultado de un trabajo terminado; None (con el mensaje correspondiente) si falló o se canceló
+def resultado_trabajo(nombre, trabajo):
+    if trabajo.estado == trabajos.TERMINADO:
+        return trabajo.resultado
+    if trabajo.estado == trabajos.FALLIDO:
+        st.error(f"❌ {trabajo.nombre} falló: {trabajo.error}")
+    else:
+        st.info(f"{trabajo.nombre}: cancelado.")
+    st.session_state.pop(nombre, None)
+    return None
+
+
+if registro_perfil() is not None:
+    registro_perfil().nueva_corrida()
+perfilador.fijar(registro_perfil())
+seccion_corrida = perfilador.iniciar("corrida completa")
+seccion_paso = perfilador.iniciar("Paso 1")
+
 import streamlit as st
 
 st.header("Paso 1: Entrada de Líneas y Nodos")
 
+import io
+import importacion
+import modelo_red
+
+# Modelo de red de la sesión: ramas en columnas NumPy con ids estables (fuente de los Pasos 2 a 9)
+if "modelo_red" not in st.session_state:
+    st.session_state.modelo_red = modelo_red.red_vacia()
+
+# --- Carga masiva de la red desde CSV/JSON ---
+with st.expander("📂 Carga masiva de la red (CSV / JSON)"):
+    st.markdown(
+        "*Una fila por línea o transformador con las columnas "
+        "`tipo, origen, destino, z_mag, z_ang, i_mag, i_ang` (tipo: linea / trafo / nodo). "
+        "Las filas de tipo nodo pueden traer coordenadas fijas `x, y`.*"
+    )
+    archivo_red = st.file_uploader("Archivo de red", type=["csv", "json", "jsonl"], key="archivo_red")
+    if archivo_red is not None and st.session_state.get("archivo_red_id") != archivo_red.file_id:
+        formato = "csv" if archivo_red.name.lower().endswith(".csv") else "json"
+        carga = importacion.importar_red(io.TextIOWrapper(archivo_red, encoding="utf-8-sig"), formato)
+        st.session_state.archivo_red_id = archivo_red.file_id
+        st.session_state.errores_carga = carga["errores"]
+        if carga["filas"]:
+            st.session_state.red_filas = modelo_red.fijar_ids(st.session_state.modelo_red, carga["filas"])
+            st.session_state.red_nodos = carga["nodos"]
+            st.session_state.coordenadas_fijas = carga["coordenadas"]
+            st.session_state.pop("layout_red", None)
+            st.session_state.red_version = st.session_state.get("red_version", 0) + 1
+            st.session_state.linea_protegida_idx = 0
+            st.session_state.modo_edicion = "Tabla"
+
+    for error in st.session_state.get("errores_carga", []):
+        st.warning(f"⚠️ {error}")
+
+modo_edicion = st.radio(
+    "Modo de edición de la red:",
+    ["Formulario", "Tabla"],
+    key="modo_edicion",
+    horizontal=True
+)
+modo_tabla = modo_edicion == "Tabla"
+
 # --- Crear 4 columnas ---
 col1, col2, col3, col4 = st.columns(4)
 
-with col1:
-    cantidad_nodos = st.number_input("Cantidad de Nodos", min_value=1, step=1)
+if modo_tabla:
+    # Al pasar a modo tabla sin archivo, se parte de la red ingresada en el formulario
+    if "red_filas" not in st.session_state:
+        st.session_state.red_filas = [
+            f for f in modelo_red.a_filas(
+                st.session_state.modelo_red,
+                st.session_state.get("rtc", 1.0) / st.session_state.get("rtp", 1.0) if st.session_state.get("rtp", 1.0) != 0 else 1.0
+            )
+            if f["origen"] and f["destino"]
+        ]
+        st.session_state.red_version = st.session_state.get("red_version", 0) + 1
+
+    nodos_tabla = {f["origen"] for f in st.session_state.red_filas} | {f["destino"] for f in st.session_state.red_filas}
+    nodos_tabla |= set(st.session_state.get("red_nodos", []))
+    cantidad_nodos = len(nodos_tabla)
+    cantidad_lineas = sum(1 for f in st.session_state.red_filas if f["tipo"] == "linea")
+    with col1:
+        st.metric("Cantidad de Nodos", cantidad_nodos)
+    with col2:
+        st.metric("Cantidad de Líneas", cantidad_lineas)
+else:
+    with col1:
+        cantidad_nodos = st.number_input("Cantidad de Nodos", min_value=1, step=1)
 
-with col2:
-    cantidad_lineas = st.number_input("Cantidad de Líneas", min_value=1, step=1)
+    with col2:
+        cantidad_lineas = st.number_input("Cantidad de Líneas", min_value=1, step=1)
 
 with col3:
     rtc = st.text_input("RTC", value="1.0")
@@ -40,10 +215,12 @@ else:
 
 # Guardar en session_state para usar en el paso 2
 st.session_state["cantidad_lineas"] = cantidad_lineas
+perfilador.terminar(seccion_paso)
 
 #------------------------------------------------------------------------------------------------------------------------------------
 
 st.header("Paso 2: Creación de Líneas y Transformadores")
+seccion_paso = perfilador.iniciar("Paso 2")
 
 # --- Validación del paso anterior ---
 if "cantidad_lineas" not in st.session_state:
@@ -52,342 +229,450 @@ if "cantidad_lineas" not in st.session_state:
 
 cantidad_lineas = st.session_state["cantidad_lineas"]
 
-# Crear dos columnas
-col1, col2 = st.columns(2)
-
-# =========================
-# COLUMNA 1 - LÍNEAS
-# =========================
-with col1:
-    st.subheader("Definición de Líneas")
-
-    # Inicialización de datos si no existen o si cambió la cantidad
-    if "lineas_data" not in st.session_state or len(st.session_state.lineas_data) != cantidad_lineas:
-        st.session_state.lineas_data = [{"origen": "", "destino": ""} for _ in range(cantidad_lineas)]
-
-    if "linea_protegida_idx" not in st.session_state:
-        st.session_state.linea_protegida_idx = 0
-
-    opciones_proteccion = [f"Línea {i + 1}" for i in range(cantidad_lineas)]
-    linea_protegida = st.radio("Selecciona la línea a proteger:", opciones_proteccion, index=st.session_state.linea_protegida_idx)
-    st.session_state.linea_protegida_idx = opciones_proteccion.index(linea_protegida)
-
-    # Ingreso de nodos de cada línea
-    for i in range(cantidad_lineas):
-        with st.expander(f"📡 Línea {i + 1}", expanded=True):
-            col_origen, col_destino = st.columns(2)
-            with col_origen:
-                origen = st.text_input(f"Origen L{i + 1}", key=f"origen_{i}")
-            with col_destino:
-                destino = st.text_input(f"Destino L{i + 1}", key=f"destino_{i}")
-            st.session_state.lineas_data[i]["origen"] = origen
-            st.session_state.lineas_data[i]["destino"] = destino
-
-    # Validación de línea protegida vs transformadores
-    lp_idx = st.session_state.linea_protegida_idx
-    lp_origen = st.session_state.lineas_data[lp_idx]["origen"].strip()
-    lp_destino = st.session_state.lineas_data[lp_idx]["destino"].strip()
-    linea_protegida_set = frozenset([lp_origen, lp_destino])
+TAM_PAGINA = 50
+
+
+# Tabla única y paginada para redes grandes: los cambios de la página visible se aplican
+# sobre red_filas al cambiar de página, sin crear un widget por elemento
+def editar_tabla_red():
+    filas = st.session_state.red_filas
+    n_paginas = max(1, -(-len(filas) // TAM_PAGINA))
+    col_pag, col_info = st.columns([1, 3])
+    with col_pag:
+        pagina = st.number_input("Página", min_value=1, max_value=n_paginas, step=1, key="pagina_red") - 1
+    with col_info:
+        st.caption(f"{len(filas)} elementos · {n_paginas} páginas de {TAM_PAGINA}")
+
+    editada = st.session_state.get("red_pagina_editada")
+    if editada and (editada[0] != pagina or editada[1] != st.session_state.red_version):
+        if editada[1] == st.session_state.red_version:
+            i0 = editada[0] * TAM_PAGINA
+            filas[i0:i0 + TAM_PAGINA] = modelo_red.fijar_ids(st.session_state.modelo_red, editada[2])
+            st.session_state.red_version += 1
+        st.session_state.red_pagina_editada = None
+
+    i0 = pagina * TAM_PAGINA
+    filas_pagina = st.data_editor(
+        [{c: f.get(c) for c in ["id"] + importacion.COLUMNAS} for f in filas[i0:i0 + TAM_PAGINA]],
+        num_rows="dynamic",
+        use_container_width=True,
+        key=f"tabla_red_{st.session_state.red_version}_{pagina}",
+        column_config={
+            "id": st.column_config.NumberColumn("Id", disabled=True),
+            "tipo": st.column_config.SelectboxColumn("Tipo", options=["linea", "trafo"], required=True),
+            "origen": st.column_config.TextColumn("Origen", required=True),
+            "destino": st.column_config.TextColumn("Destino", required=True),
+            "z_mag": st.column_config.NumberColumn("|Z| (Ω)", min_value=0.0, format="%.4f"),
+            "z_ang": st.column_config.NumberColumn("∠Z (°)", format="%.2f"),
+            "i_mag": st.column_config.NumberColumn("|Icc| (A)", min_value=0.0, format="%.2f"),
+            "i_ang": st.column_config.NumberColumn("∠Icc (°)", format="%.2f"),
+        }
+    )
+    st.session_state.red_pagina_editada = (pagina, st.session_state.red_version, filas_pagina)
+    return filas[:i0] + filas_pagina + filas[i0 + TAM_PAGINA:]
+
+
+if modo_tabla:
+    st.subheader("Definición de Líneas y Transformadores")
 
-    trafos = st.session_state.get("trafos_data", []) if st.session_state.get("hay_transformadores") == "Sí" else []
-    for trafo in trafos:
-        t1 = trafo["origen"].strip()
-        t2 = trafo["destino"].strip()
-        if frozenset([t1, t2]) == linea_protegida_set:
-            st.warning("⚠️ La línea seleccionada como protegida no puede ser protegida porque hay un transformador entre los mismos nodos.")
-            break
-
-# =========================
-# COLUMNA 2 - TRANSFORMADORES
-# =========================
-with col2:
-    st.subheader("Transformadores en la Red")
-
-    hay_transformadores = st.radio(
-        "¿Hay transformadores en la red?",
-        options=["No", "Sí"],
-        index=0,
-        key="hay_transformadores"
+    validacion = importacion.validar_filas(editar_tabla_red())
+    for error in validacion["errores"]:
+        st.warning(f"⚠️ {error}")
+
+    # Las filas de la tabla traen Z e I: el modelo toma topología y parámetros de una vez
+    rtc_tabla = st.session_state.get("rtc", 1.0)
+    rtp_tabla = st.session_state.get("rtp", 1.0)
+    modelo_red.sincronizar(
+        st.session_state.modelo_red, validacion["filas"],
+        rtc_tabla / rtp_tabla if rtp_tabla != 0 else 1.0, con_parametros=True
     )
+    st.session_state.lineas_data, st.session_state.trafos_data = modelo_red.listas(st.session_state.modelo_red)
+    st.session_state.hay_transformadores = "Sí" if st.session_state.trafos_data else "No"
+
+    if st.session_state.lineas_data:
+        opciones_proteccion = [
+            f"Línea {i + 1} ({l['origen']} → {l['destino']})" for i, l in enumerate(st.session_state.lineas_data)
+        ]
+        st.session_state.linea_protegida_idx = min(st.session_state.get("linea_protegida_idx", 0), len(opciones_proteccion) - 1)
+        linea_protegida = st.selectbox(
+            "Selecciona la línea a proteger:", opciones_proteccion, index=st.session_state.linea_protegida_idx
+        )
+        st.session_state.linea_protegida_idx = opciones_proteccion.index(linea_protegida)
+    else:
+        st.error("⚠️ La tabla no contiene líneas válidas.")
+        st.stop()
 
-    if hay_transformadores == "Sí":
-        cantidad_transformadores = st.number_input(
-            "¿Cuántos transformadores?",
-            min_value=1,
-            step=1,
-            key="num_trafo"
+    st.download_button(
+        "Descargar red (CSV)",
+        importacion.filas_a_csv(validacion["filas"]),
+        file_name="red.csv",
+        mime="text/csv"
+    )
+else:
+    # Crear dos columnas
+    col1, col2 = st.columns(2)
+
+    # =========================
+    # COLUMNA 1 - LÍNEAS
+    # =========================
+    with col1:
+        st.subheader("Definición de Líneas")
+
+        # Inicialización de datos si no existen o si cambió la cantidad (las líneas que quedan
+        # conservan su id y con él sus parámetros)
+        lineas_previas = st.session_state.get("lineas_data", [])[:cantidad_lineas]
+        st.session_state.lineas_data = lineas_previas + modelo_red.fijar_ids(
+            st.session_state.modelo_red,
+            [{"origen": "", "destino": ""} for _ in range(cantidad_lineas - len(lineas_previas))]
         )
 
-        if "trafos_data" not in st.session_state or len(st.session_state.trafos_data) != cantidad_transformadores:
-            st.session_state.trafos_data = [{"origen": "", "destino": ""} for _ in range(cantidad_transformadores)]
+        if "linea_protegida_idx" not in st.session_state:
+            st.session_state.linea_protegida_idx = 0
 
-        for i in range(cantidad_transformadores):
-            with st.expander(f"🔌 Transformador {i + 1}", expanded=True):
+        opciones_proteccion = [f"Línea {i + 1}" for i in range(cantidad_lineas)]
+        linea_protegida = st.radio("Selecciona la línea a proteger:", opciones_proteccion, index=st.session_state.linea_protegida_idx)
+        st.session_state.linea_protegida_idx = opciones_proteccion.index(linea_protegida)
+
+        # Ingreso de nodos de cada línea
+        for i in range(cantidad_lineas):
+            with st.expander(f"📡 Línea {i + 1}", expanded=True):
                 col_origen, col_destino = st.columns(2)
                 with col_origen:
-                    origen = st.text_input(f"Origen T{i + 1}", key=f"trafo_origen_{i}")
+                    origen = st.text_input(f"Origen L{i + 1}", key=f"origen_{i}")
                 with col_destino:
-                    destino = st.text_input(f"Destino T{i + 1}", key=f"trafo_destino_{i}")
-                st.session_state.trafos_data[i]["origen"] = origen
-                st.session_state.trafos_data[i]["destino"] = destino
+                    destino = st.text_input(f"Destino L{i + 1}", key=f"destino_{i}")
+                st.session_state.lineas_data[i]["origen"] = origen
+                st.session_state.lineas_data[i]["destino"] = destino
+
+        # Validación de línea protegida vs transformadores
+        lp_idx = st.session_state.linea_protegida_idx
+        lp_origen = st.session_state.lineas_data[lp_idx]["origen"].strip()
+        lp_destino = st.session_state.lineas_data[lp_idx]["destino"].strip()
+        linea_protegida_set = frozenset([lp_origen, lp_destino])
+
+        trafos = st.session_state.get("trafos_data", []) if st.session_state.get("hay_transformadores") == "Sí" else []
+        for trafo in trafos:
+            t1 = trafo["origen"].strip()
+            t2 = trafo["destino"].strip()
+            if frozenset([t1, t2]) == linea_protegida_set:
+                st.warning("⚠️ La línea seleccionada como protegida no puede ser protegida porque hay un transformador entre los mismos nodos.")
+                break
+
+    # =========================
+    # COLUMNA 2 - TRANSFORMADORES
+    # =========================
+    with col2:
+        st.subheader("Transformadores en la Red")
+
+        hay_transformadores = st.radio(
+            "¿Hay transformadores en la red?",
+            options=["No", "Sí"],
+            index=0,
+            key="hay_transformadores"
+        )
 
-#----------------------------------------------------------------------------------------------------------------------------------------------
+        if hay_transformadores == "Sí":
+            cantidad_transformadores = st.number_input(
+                "¿Cuántos transformadores?",
+                min_value=1,
+                step=1,
+                key="num_trafo"
+            )
+
+            trafos_previos = st.session_state.get("trafos_data", [])[:cantidad_transformadores]
+            st.session_state.trafos_data = trafos_previos + modelo_red.fijar_ids(
+                st.session_state.modelo_red,
+                [{"origen": "", "destino": ""} for _ in range(cantidad_transformadores - len(trafos_previos))]
+            )
+
+            for i in range(cantidad_transformadores):
+                with st.expander(f"🔌 Transformador {i + 1}", expanded=True):
+                    col_origen, col_destino = st.columns(2)
+                    with col_origen:
+                        origen = st.text_input(f"Origen T{i + 1}", key=f"trafo_origen_{i}")
+                    with col_destino:
+                        destino = st.text_input(f"Destino T{i + 1}", key=f"trafo_destino_{i}")
+                    st.session_state.trafos_data[i]["origen"] = origen
+                    st.session_state.trafos_data[i]["destino"] = destino
+
+    # Topología del formulario en el modelo (los parámetros se ingresan en el Paso 4)
+    modelo_red.sincronizar(
+        st.session_state.modelo_red,
+        [dict(l, tipo="linea") for l in st.session_state.lineas_data]
+        + [dict(t, tipo="trafo") for t in (st.session_state.trafos_data if hay_transformadores == "Sí" else [])]
+    )
 
-import streamlit as st
-import networkx as nx
-import matplotlib.pyplot as plt
-from collections import defaultdict
+# --- Validación de la topología: el validador de la sesión solo procesa las ramas editadas ---
+if "validador_red" not in st.session_state:
+    st.session_state.validador_red = validacion_red.ValidadorRed()
+informe_red = st.session_state.validador_red.sincronizar(
+    st.session_state.modelo_red, st.session_state.get("red_nodos", []) if modo_tabla else []
+).informe()
+with st.expander(
+    f"🧭 Validación de la topología: {informe_red['nodos']} nodos · {informe_red['ramas']} ramas · "
+    f"{informe_red['componentes']} componente(s)",
+    expanded=not informe_red["conexa"] or bool(informe_red["conflictos"] or informe_red["lazos"])
+):
+    avisos = validacion_red.mensajes(informe_red)
+    for nivel, texto in avisos:
+        {"error": st.error, "advertencia": st.warning, "info": st.info}[nivel](texto)
+    if not avisos:
+        st.success("✅ Red conexa, sin conflictos, lazos ni ramas duplicadas.")
+    st.caption(f"Nodos colgantes (una sola rama): {informe_red['colgantes']}")
+
+perfilador.terminar(seccion_paso)
 
-st.header("Paso 3: Visualización de la Red")
+#----------------------------------------------------------------------------------------------------------------------------------------------
 
-if st.button("Graficar"):
-    # --- Inicializar grafo como MultiGraph para permitir múltiples aristas ---
-    G = nx.MultiGraph()
-    conflictos = set()
+import streamlit as st
 
-    # --- Recuperar datos ---
-    lineas = st.session_state.get("lineas_data", [])
-    trafos = st.session_state.get("trafos_data", []) if st.session_state.get("hay_transformadores") == "Sí" else []
-    linea_idx = st.session_state.get("linea_protegida_idx", None)
+import grafo_red
+import render_red
+
+# Cada Paso es un fragmento con entradas explícitas: un cambio dentro de un Paso vuelve a
+# ejecutar solo ese Paso y los Pasos anidados que dependen de él, no la página completa.
+@st.fragment
+@perfilado("Paso 3")
+def paso_3_visualizacion(lineas, trafos, linea_idx):
+    st.header("Paso 3: Visualización de la Red")
+
+    # --- Coordenadas fijas (p. ej. posición geográfica de subestaciones) ---
+    with st.expander("📍 Coordenadas fijas de nodos"):
+        coordenadas = st.data_editor(
+            [{"nodo": n, "x": x, "y": y} for n, (x, y) in st.session_state.get("coordenadas_fijas", {}).items()],
+            num_rows="dynamic",
+            key="editor_coordenadas",
+            column_config={
+                "nodo": st.column_config.TextColumn("Nodo", required=True),
+                "x": st.column_config.NumberColumn("x", required=True),
+                "y": st.column_config.NumberColumn("y", required=True),
+            }
+        )
+        fijas = {
+            str(c["nodo"]).strip(): (float(c["x"]), float(c["y"]))
+            for c in coordenadas
+            if c.get("nodo") and c.get("x") is not None and c.get("y") is not None
+        }
+        if st.button("Recalcular disposición"):
+            st.session_state.pop("layout_red", None)
+            if "trabajo_layout" in st.session_state:
+                trabajos.POOL.soltar(st.session_state.pop("trabajo_layout"), st.session_state.id_sesion)
+
+    # En redes grandes el layout se calcula en segundo plano; el dibujo se muestra al terminar
+    # mientras no cambien la topología ni las coordenadas fijas
+    trabajo = trabajo_de_sesion("trabajo_layout", grafo_red.clave_layout(lineas, trafos, fijas))
+    if not st.button("Graficar") and trabajo is None:
+        return
 
     if linea_idx is None or linea_idx >= len(lineas):
         st.error("❌ No se ha seleccionado una línea protegida válida.")
-        st.stop()
+        return
 
     linea_protegida = lineas[linea_idx]
     lp_origen = linea_protegida["origen"].strip()
     lp_destino = linea_protegida["destino"].strip()
     linea_protegida_set = frozenset([lp_origen, lp_destino])
 
-    lineas_set = []
-    trafos_set = set()
-
-    # --- Agregar líneas ---
-    for linea in lineas:
-        n1 = linea["origen"].strip()
-        n2 = linea["destino"].strip()
-        if n1 and n2:
-            key = frozenset([n1, n2])
-            lineas_set.append(key)
-            G.add_edge(n1, n2, tipo="linea")
-
-    # --- Agregar transformadores y validar conflictos ---
-    for trafo in trafos:
-        t1 = trafo["origen"].strip()
-        t2 = trafo["destino"].strip()
-        par = frozenset([t1, t2])
-        if par in lineas_set:
-            conflictos.add(tuple(sorted([t1, t2])))
-        else:
-            trafos_set.add(par)
-            G.add_edge(t1, t2, tipo="trafo")
+    # --- Grafo y layout: el layout del estudio se actualiza solo donde cambió la topología ---
+    if trabajo is None and grafo_red.cantidad_nodos(lineas, trafos) > grafo_red.UMBRAL_SEGUNDO_PLANO:
+        trabajo = enviar_trabajo(
+            "trabajo_layout", grafo_red.clave_layout(lineas, trafos, fijas), "Layout de la red",
+            grafo_red.grafo_y_posiciones, [dict(l) for l in lineas], [dict(t) for t in trafos],
+            st.session_state.get("layout_red"), dict(fijas)
+        )
+    if trabajo is not None:
+        if not trabajo.terminado():
+            seguir_trabajo("trabajo_layout", trabajo)
+            return
+        resultado = resultado_trabajo("trabajo_layout", trabajo)
+        if resultado is None:
+            return
+        G, conflictos, trafos_set, pos, st.session_state.layout_red = resultado
+    else:
+        G, conflictos, trafos_set, pos, st.session_state.layout_red = grafo_red.grafo_y_posiciones(
+            lineas, trafos, st.session_state.get("layout_red"), fijas
+        )
 
     if linea_protegida_set in trafos_set:
         st.warning("⚠️ La línea seleccionada como protegida no puede ser protegida porque hay un transformador entre los mismos nodos.")
-        st.stop()
+        return
 
     if conflictos:
         st.error(f"❌ Conflicto: hay líneas y transformadores entre los mismos nodos: {list(conflictos)}")
-        st.stop()
+        return
 
     # --- Dibujar el grafo ---
     st.subheader("🔍 Visualización de la Red")
-    fig, ax = plt.subplots(figsize=(8, 6))
-    pos = nx.spring_layout(G, seed=42)
-
-    # Dibujar nodos
-    nx.draw_networkx_nodes(G, pos, node_size=800, node_color="lightblue", ax=ax)
-    nx.draw_networkx_labels(G, pos, font_size=12, font_weight="bold", ax=ax)
-
-    # Dibujar líneas (soporta paralelas con desplazamiento)
-    edges_lineas = [(u, v, k) for u, v, k, d in G.edges(keys=True, data=True) if d["tipo"] == "linea"]
-    multi_edges = defaultdict(list)
-    for u, v, k in edges_lineas:
-        key = frozenset([u, v])
-        multi_edges[key].append((u, v, k))
-
-    # Identificar el índice de la línea protegida en el conjunto total
-    linea_protegida_idx = st.session_state.linea_protegida_idx
-    lineas_en_grafo = list(G.edges(keys=True, data=True))
-    lineas_tipo_linea = [e for e in lineas_en_grafo if e[3].get("tipo") == "linea"]
-
-    # Obtener el triple (u, v, k) de la línea protegida
-    if linea_protegida_idx < len(lineas_tipo_linea):
-        linea_protegida_u, linea_protegida_v, linea_protegida_k, _ = lineas_tipo_linea[linea_protegida_idx]
-    else:
-        linea_protegida_u = linea_protegida_v = linea_protegida_k = None  # caso inválido
-
-    for edge_list in multi_edges.values():
-        n = len(edge_list)
-        for i, (u, v, k) in enumerate(edge_list):
-            offset = (i - (n - 1) / 2) * 0.05
-            x0, y0 = pos[u]
-            x1, y1 = pos[v]
-
-            dx = y1 - y0
-            dy = x0 - x1
-            norm = (dx ** 2 + dy ** 2) ** 0.5 or 1
-            dx /= norm
-            dy /= norm
-
-            x0_off = x0 + offset * dx
-            y0_off = y0 + offset * dy
-            x1_off = x1 + offset * dx
-            y1_off = y1 + offset * dy
-
-            # Verificar si esta es la línea protegida exacta (por índice y clave)
-            is_protected = (u == linea_protegida_u and v == linea_protegida_v and k == linea_protegida_k) or \
-                        (v == linea_protegida_u and u == linea_protegida_v and k == linea_protegida_k)
-
-            color = "green" if is_protected else "gray"
-            ax.plot([x0_off, x1_off], [y0_off, y1_off], color=color, linewidth=3)
-
-
-    # Dibujar transformadores
-    edges_trafos = [(u, v) for u, v, d in G.edges(data=True) if d["tipo"] == "trafo"]
-    nx.draw_networkx_edges(G, pos, edgelist=edges_trafos, style="dashed", width=2, edge_color="red", ax=ax)
-
-    for u, v in edges_trafos:
-        # Punto medio para poner la letra T
-        x = (pos[u][0] + pos[v][0]) / 2
-        y = (pos[u][1] + pos[v][1]) / 2
-        ax.text(x, y, "T", fontsize=14, fontweight="bold", ha="center", va="center",
-                bbox=dict(facecolor="white", edgecolor="black", boxstyle="round,pad=0.3"))
-
-    # === Dibujar recuadro "R" encima de la línea protegida, cerca al nodo de origen ===
-    if lp_origen in pos and lp_destino in pos:
-        x0, y0 = pos[lp_origen]
-        x1, y1 = pos[lp_destino]
-
-        # Calcular punto entre origen y destino, más cerca del origen (70%)
-        rx = x0 * 0.8 + x1 * 0.2
-        ry = y0 * 0.8 + y1 * 0.2
-
-        ax.text(
-            rx, ry, "R",
-            fontsize=14, fontweight="bold", ha="center", va="center",
-            bbox=dict(facecolor="mediumpurple", edgecolor="black", boxstyle="round,pad=0.3")
-        )
+    # Vista vectorial: nodos y ramas como arreglos compactos, con zoom y tooltips en el navegador
+    mostrar_vista(render_red.especificacion_red(G, pos, linea_idx, lp_origen, lp_destino), width="stretch")
+
 
-    
-    st.pyplot(fig)
+paso_3_visualizacion(
+    st.session_state.get("lineas_data", []),
+    st.session_state.get("trafos_data", []) if st.session_state.get("hay_transformadores") == "Sí" else [],
+    st.session_state.get("linea_protegida_idx", None)
+)
 
 #-----------------------------------------------------------------------------------------------------------------------------7
+import math
+import cmath
 import streamlit as st
+import numpy as np
 
-st.header("Paso 4: Ingreso de Parámetros Eléctricos")
+import coordinacion
+import cortocircuito
+import motor_zonas
 
-# Recuperar entradas del paso 1 (con fallback por si acaso)
-rtc = st.session_state.get("rtc", 1.0)
-rtp = st.session_state.get("rtp", 1.0)
-ajuste_impedancia = rtc / rtp if rtp != 0 else 1.0
-
-# Recuperar entradas del paso 2
-lineas = st.session_state.get("lineas_data", [])
-trafos = st.session_state.get("trafos_data", []) if st.session_state.get("hay_transformadores") == "Sí" else []
-
-# Crear sets de nodos conectados para evitar duplicación
-trafos_set = {frozenset([t["origen"].strip(), t["destino"].strip()]) for t in trafos}
-
-# Crear columnas principales
-col_lineas, col_trafos = st.columns(2)
-
-# Inicialización de parámetros si no existe
-if "param_lineas" not in st.session_state:
-    st.session_state.param_lineas = {}
-if "param_trafos" not in st.session_state:
-    st.session_state.param_trafos = {}
-
-# ============================
-# COLUMNA IZQUIERDA: LÍNEAS
-# ============================
-with col_lineas:
-    st.subheader("Parámetros de Líneas")
-
-    for linea in lineas:
-        origen = linea["origen"].strip()
-        destino = linea["destino"].strip()
-        par = frozenset([origen, destino])
-
-        if not origen or not destino or par in trafos_set:
-            continue
-
-        key = f"{origen}_{destino}"
-        if key not in st.session_state.param_lineas:
-            st.session_state.param_lineas[key] = {
-                "z_mag": 0.0, "z_ang": 0.0, "i_mag": 0.0, "i_ang": 0.0
-            }
 
-        with st.expander(f"📡 Línea ({origen} → {destino})", expanded=True):
-            st.markdown("**Impedancia Z**")
-            col1, col2 = st.columns(2)
-            with col1:
-                z_mag_input = st.number_input(
-                    f"Magnitud (Ω) [{key}]", key=f"z_mag_{key}", min_value=0.0, format="%.4f"
-                )
-            with col2:
-                z_ang_input = st.number_input(
-                    f"Ángulo (°) [{key}]", key=f"z_ang_{key}", format="%.2f"
-                )
-
-            st.session_state.param_lineas[key]["z_mag"] = z_mag_input * ajuste_impedancia
-            st.session_state.param_lineas[key]["z_ang"] = z_ang_input
-
-            st.markdown("**Corriente de Cortocircuito**")
-            col3, col4 = st.columns(2)
-            with col3:
-                st.session_state.param_lineas[key]["i_mag"] = st.number_input(
-                    f"Magnitud (A) [{key}]", key=f"i_mag_{key}", min_value=0.0, format="%.2f"
-                )
-            with col4:
-                st.session_state.param_lineas[key]["i_ang"] = st.number_input(
-                    f"Ángulo (°) [{key}]", key=f"i_ang_{key}", format="%.2f"
-                )
-
-# ===============================
-# COLUMNA DERECHA: TRANSFORMADORES
-# ===============================
-with col_trafos:
-    st.subheader("Parámetros de Transformadores")
-
-    for trafo in trafos:
-        origen = trafo["origen"].strip()
-        destino = trafo["destino"].strip()
-        if not origen or not destino:
-            continue
-
-        key = f"{origen}_{destino}"
-        if key not in st.session_state.param_trafos:
-            st.session_state.param_trafos[key] = {
-                "z_mag": 0.0, "z_ang": 0.0, "i_mag": 0.0, "i_ang": 0.0
+# Índice de adyacencia (nodo -> líneas y trafos incidentes): se reconstruye solo si cambia la
+# versión de la topología del modelo; si no, los parámetros se copian en el lugar
+def indice_de_red(modelo):
+    indice = st.session_state.get("indice_red")
+    if indice is None or indice["version"] != modelo["version"]:
+        st.session_state.indice_red = coordinacion.indice_desde_modelo(modelo)
+        return st.session_state.indice_red
+    return coordinacion.parametros_desde_modelo(indice, modelo)
+
+
+# Zonas de todos los relés; con fuentes definidas, el infeed sale de las fallas calculadas con Zbus.
+# El motor de la sesión solo recalcula los relés que dependen de lo que cambió desde el último rerun.
+def zonas_de_red(indice_red, porcentaje_z1, config_falla):
+    motor = st.session_state.get("motor_zonas")
+    if motor is None or motor.indice is not indice_red:
+        motor = st.session_state.motor_zonas = motor_zonas.MotorZonas(indice_red, porcentaje_z1, config_falla)
+    else:
+        motor.sincronizar(porcentaje_z1, config_falla)
+    return motor.resultado
+
+
+@st.fragment
+@perfilado("Paso 4")
+def paso_4_parametros(modelo, ajuste_impedancia, modo_tabla):
+    st.header("Paso 4: Ingreso de Parámetros Eléctricos")
+
+    # --- Corrientes de cortocircuito calculadas con Zbus (opcional) ---
+    with st.expander("⚡ Cálculo automático de corrientes de cortocircuito (Zbus)"):
+        st.markdown(
+            "*Falla trifásica franca en cada nodo a partir de las impedancias de rama y de las "
+            "impedancias de Thévenin de las fuentes (Ω primarios). Reemplaza las corrientes ingresadas "
+            "a mano y calcula el infeed de todos los relés.*"
+        )
+        tension_kv = st.number_input("Tensión nominal (kV)", min_value=0.0, value=115.0, key="tension_falla_kv")
+        filas_fuentes = st.data_editor(
+            [{"nodo": n, "z_mag": abs(z), "z_ang": math.degrees(cmath.phase(z))}
+             for n, z in st.session_state.get("fuentes_falla", {}).items()],
+            num_rows="dynamic",
+            key="editor_fuentes",
+            column_config={
+                "nodo": st.column_config.TextColumn("Nodo", required=True),
+                "z_mag": st.column_config.NumberColumn("|Zs| (Ω)", min_value=0.0, format="%.4f", required=True),
+                "z_ang": st.column_config.NumberColumn("∠Zs (°)", format="%.2f", required=True),
             }
+        )
+        fuentes = {
+            str(f["nodo"]).strip(): cmath.rect(float(f["z_mag"]), math.radians(float(f["z_ang"] or 0.0)))
+            for f in filas_fuentes
+            if f.get("nodo") and f.get("z_mag")
+        }
+        usar_zbus = st.checkbox("Usar corrientes calculadas", key="usar_zbus", disabled=not fuentes)
+        resumen_fallas = st.container()
+
+    config_falla = (
+        {"fuentes": fuentes, "tension_kv": tension_kv, "ajuste_impedancia": ajuste_impedancia}
+        if usar_zbus and fuentes and tension_kv > 0 else None
+    )
 
-        with st.expander(f"🔌 Transformador ({origen} → {destino})", expanded=True):
-            st.markdown("**Impedancia Z**")
-            col1, col2 = st.columns(2)
-            with col1:
-                z_mag_input = st.number_input(
-                    f"Magnitud (Ω) [{key}]", key=f"z_mag_trafo_{key}", min_value=0.0, format="%.4f"
-                )
-            with col2:
-                z_ang_input = st.number_input(
-                    f"Ángulo (°) [{key}]", key=f"z_ang_trafo_{key}", format="%.2f"
-                )
-
-            st.session_state.param_trafos[key]["z_mag"] = z_mag_input * ajuste_impedancia
-            st.session_state.param_trafos[key]["z_ang"] = z_ang_input
-
-            st.markdown("**Corriente de Cortocircuito**")
-            col3, col4 = st.columns(2)
-            with col3:
-                st.session_state.param_trafos[key]["i_mag"] = st.number_input(
-                    f"Magnitud (A) [{key}]", key=f"i_mag_trafo_{key}", min_value=0.0, format="%.2f"
-                )
-            with col4:
-                st.session_state.param_trafos[key]["i_ang"] = st.number_input(
-                    f"Ángulo (°) [{key}]", key=f"i_ang_trafo_{key}", format="%.2f"
-                )
+    indice_red = indice_de_red(modelo)
 
+    if modo_tabla:
+        st.info("ℹ️ Los parámetros eléctricos se editan en la tabla de red del Paso 2.")
+    else:
+        # Crear columnas principales
+        col_lineas, col_trafos = st.columns(2)
+        columnas = {coordinacion.LINEA: col_lineas, coordinacion.TRAFO: col_trafos}
+        with col_lineas:
+            st.subheader("Parámetros de Líneas")
+        with col_trafos:
+            st.subheader("Parámetros de Transformadores")
+
+        # Una entrada por rama del índice (las paralelas tienen clave propia, p. ej. A_B#2).
+        # Los widgets arrancan con los valores del modelo y se escriben en él de una sola vez.
+        filas = indice_red["fila_modelo"]
+        z_ingresada = np.zeros(len(filas), dtype=np.complex128)
+        i_ingresada = np.zeros(len(filas), dtype=np.complex128)
+        for b, (clave, tipo) in enumerate(zip(indice_red["clave"], indice_red["tipo"])):
+            sufijo = clave if tipo == coordinacion.LINEA else f"trafo_{clave}"
+            z_b, i_b = modelo["z"][filas[b]], modelo["icc"][filas[b]]
+            iniciales = {
+                f"z_mag_{sufijo}": abs(z_b) / (ajuste_impedancia or 1.0),
+                f"z_ang_{sufijo}": math.degrees(cmath.phase(z_b)),
+                f"i_mag_{sufijo}": abs(i_b),
+                f"i_ang_{sufijo}": math.degrees(cmath.phase(i_b)),
+            }
+            for k, v in iniciales.items():
+                if k not in st.session_state:
+                    st.session_state[k] = float(v)
+
+            origen = indice_red["nodos"][indice_red["origen"][b]]
+            destino = indice_red["nodos"][indice_red["destino"][b]]
+            titulo = f"📡 Línea ({origen} → {destino})" if tipo == coordinacion.LINEA else f"🔌 Transformador ({origen} → {destino})"
+            with columnas[tipo], st.expander(titulo, expanded=True):
+                st.markdown("**Impedancia Z**")
+                col1, col2 = st.columns(2)
+                with col1:
+                    z_mag_input = st.number_input(
+                        f"Magnitud (Ω) [{clave}]", key=f"z_mag_{sufijo}", min_value=0.0, format="%.4f"
+                    )
+                with col2:
+                    z_ang_input = st.number_input(
+                        f"Ángulo (°) [{clave}]", key=f"z_ang_{sufijo}", format="%.2f"
+                    )
+                z_ingresada[b] = cmath.rect(z_mag_input * ajuste_impedancia, math.radians(z_ang_input))
+
+                st.markdown("**Corriente de Cortocircuito**")
+                if config_falla:
+                    st.caption("Calculada con Zbus")
+                    continue
+                col3, col4 = st.columns(2)
+                with col3:
+                    i_mag_input = st.number_input(
+                        f"Magnitud (A) [{clave}]", key=f"i_mag_{sufijo}", min_value=0.0, format="%.2f"
+                    )
+                with col4:
+                    i_ang_input = st.number_input(
+                        f"Ángulo (°) [{clave}]", key=f"i_ang_{sufijo}", format="%.2f"
+                    )
+                i_ingresada[b] = cmath.rect(i_mag_input, math.radians(i_ang_input))
+
+        modelo_red.asignar(modelo, indice_red["id"], z=z_ingresada, icc=None if config_falla else i_ingresada)
+        coordinacion.parametros_desde_modelo(indice_red, modelo)
+
+    st.session_state.fuentes_falla = fuentes
+
+    # Corriente de cada rama con parámetros = su aporte a la falla en su nodo destino
+    if config_falla:
+        fallas = cortocircuito.fallas_red(indice_red, **config_falla)
+        con_param = indice_red["tiene_param"]
+        modelo_red.asignar(modelo, indice_red["id"][con_param], icc=fallas["i_en_destino"][con_param])
+        coordinacion.parametros_desde_modelo(indice_red, modelo)
+
+        with resumen_fallas:
+            energizados = np.flatnonzero(fallas["energizado"])
+            st.dataframe(
+                {
+                    "Nodo": [indice_red["nodos"][n] for n in energizados],
+                    "|Icc| (A)": np.abs(fallas["i_falla"][energizados]).round(2),
+                    "∠Icc (°)": np.degrees(np.angle(fallas["i_falla"][energizados])).round(2),
+                    "|Zth| (Ω)": np.abs(fallas["zth"][energizados]).round(4),
+                },
+                use_container_width=True
+            )
+            sin_fuente = len(indice_red["nodos"]) - len(energizados)
+            if sin_fuente:
+                st.warning(f"⚠️ {sin_fuente} nodos no están conectados a ninguna fuente (corriente nula).")
+
+    # Pasos que dependen de los parámetros
+    paso_5_coordinacion(modelo, config_falla)
 
 
 #-----------------------------------------------------------------------------------------------------------------------------------
@@ -395,534 +680,717 @@ import math
 import cmath
 import streamlit as st
 
-st.header("Paso 5: Coordinación de Protección")
+import coordinacion
 
-st.subheader("Alcances de protección")
-st.markdown("#### Zona 1")
-st.markdown(
-    "*⏱️ Tiempo de operación: Instantaneo*"
-)
 
-# Asegurar que trafos_data esté inicializado
-if "trafos_data" not in st.session_state:
-    st.session_state.trafos_data = []
+def mostrar_z(nombre, z):
+    mod = abs(z)
+    ang = math.degrees(cmath.phase(z)) if math.isfinite(mod) else 0.0
+    st.latex(f"{nombre} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
 
-if "param_trafos" not in st.session_state:
-    st.session_state.param_trafos = {}
 
-if "lineas_data" not in st.session_state:
-    st.session_state.lineas_data = []
+@st.fragment
+@perfilado("Paso 5")
+def paso_5_coordinacion(modelo, config_falla=None):
+    st.header("Paso 5: Coordinación de Protección")
 
-if "param_lineas" not in st.session_state:
-    st.session_state.param_lineas = {}
+    st.subheader("Alcances de protección")
+    st.markdown("#### Zona 1")
+    st.markdown(
+        "*⏱️ Tiempo de operación: Instantaneo*"
+    )
 
+    indice_red = indice_de_red(modelo)
+
+    # Obtener la línea protegida
+    linea_idx = st.session_state.linea_protegida_idx
+    rama_lp = indice_red["rama_de_linea"][linea_idx] if linea_idx < len(indice_red["rama_de_linea"]) else -1
+
+    # Verificar si la línea protegida está en los parámetros
+    if rama_lp < 0 or not indice_red["tiene_param"][rama_lp]:
+        st.error("❌ No se encontraron los parámetros de la línea protegida.")
+        return
+
+    # Zona 1 - Ajuste con porcentaje
+    st.markdown("#### Zona 1")
+    st.markdown("*⏱️ Tiempo de operación: Instantáneo*")
+
+    # Slider para porcentaje
+    porcentaje_z1 = st.slider(
+        "Selecciona el porcentaje del alcance de la Zona 1:",
+        min_value=0,
+        max_value=100,
+        value=85,
+        step=1,
+        key="porcentaje_z1"
+    )
 
-# Obtener la línea protegida
-linea_idx = st.session_state.linea_protegida_idx
-linea_protegida = st.session_state.lineas_data[linea_idx]
-lp_origen = linea_protegida["origen"].strip()
-lp_destino = linea_protegida["destino"].strip()
-key_lp = f"{lp_origen}_{lp_destino}"
+    # Alcances de todos los relés (memorizados por topología + parámetros); se toma el de la línea protegida
+    zonas = coordinacion.seleccionar_rele(zonas_de_red(indice_red, porcentaje_z1, config_falla), rama_lp, 0)
 
-# Verificar si la línea protegida está en los parámetros
-if key_lp not in st.session_state.param_lineas:
-    st.error("❌ No se encontraron los parámetros de la línea protegida.")
-    st.stop()
+    z_linea = complex(zonas["z_linea"])
+    z_alcance_z1 = complex(zonas["z1"])
 
-# Obtener impedancia de la línea protegida
-z_mag = st.session_state.param_lineas[key_lp]["z_mag"]
-z_ang_deg = st.session_state.param_lineas[key_lp]["z_ang"]
-z_ang_rad = math.radians(z_ang_deg)
+    # Mostrar resultado
+    st.markdown("**Resultado:**")
+    mostrar_z("Z_{alcance\\_z1}", z_alcance_z1)
 
-# Calcular impedancia compleja
-z_linea = cmath.rect(z_mag, z_ang_rad)
 
-#st.latex(f"{z_linea}")
 
-# Zona 1 - Ajuste con porcentaje
-st.markdown("#### Zona 1")
-st.markdown("*⏱️ Tiempo de operación: Instantáneo*")
 
-# Slider para porcentaje
-porcentaje_z1 = st.slider(
-    "Selecciona el porcentaje del alcance de la Zona 1:",
-    min_value=0,
-    max_value=100,
-    value=85,
-    step=1
-)
+    st.markdown("#### Zona 2")
+    st.markdown(
+        "*⏱️ Tiempo de operación: **300–400 ms** con Esquema PUTT, "
+        "**150–250 ms** sin esquema de teleprotección*"
+    )
+    z2_min = complex(zonas["z2_min"])
+    z2_med = complex(zonas["z2_med"])
+    z2_max = complex(zonas["z2_max"])
+    z_alcance_z2 = complex(zonas["z2"])
 
-# Calcular Z_alcance_z1
-factor_z1 = porcentaje_z1 / 100
-z_alcance_z1 = factor_z1 * z_linea
-#st.latex(f"{z_alcance_z1}")
+    # ---------------------------------------------------
+    # Mostrar resultados
+    st.markdown("**Resultado:**")
 
-# Mostrar resultado
-st.markdown("**Resultado:**")
-mod = abs(z_alcance_z1)
-ang = math.degrees(cmath.phase(z_alcance_z1))
-st.latex(f"Z_{{alcance\\_z1}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
+    mostrar_z("Z_{z2\\_min}", z2_min)
+    mostrar_z("Z_{z2\\_}", z2_med)
+    mostrar_z("Z_{z2\\_max}", z2_max)
 
+    st.markdown(
+        "*Valor escogido*"
+    )
 
+    mostrar_z("Z_{alcance\\_z2}", z_alcance_z2)
 
 
-st.markdown("#### Zona 2")
-st.markdown(
-    "*⏱️ Tiempo de operación: **300–400 ms** con Esquema PUTT, "
-    "**150–250 ms** sin esquema de teleprotección*"
-)
-# Reusar z_linea de zona 1
-z2_min = 1.2 * z_linea
-
-# ---------------------------------------------------
-# Buscar líneas conectadas al nodo de destino
-lineas_conectadas = []
-for linea in st.session_state.lineas_data:
-    o = linea["origen"].strip()
-    d = linea["destino"].strip()
-    if not o or not d:
-        continue
-    if {o, d} == {lp_origen, lp_destino}:
-        continue  # evitar incluir la línea protegida
-    if lp_destino in (o, d):
-        key = f"{o}_{d}"
-        if key in st.session_state.param_lineas:
-            z_mag = st.session_state.param_lineas[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_lineas[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            lineas_conectadas.append(z)
-
-if lineas_conectadas:
-    z_min_linea = min(lineas_conectadas, key=abs)
-    z2_med = z_linea + 0.5 * z_min_linea
-else:
-    z2_med = 0
-
-# ---------------------------------------------------
-# Buscar transformadores conectados al nodo de destino
-trafos_conectados = []
-for trafo in st.session_state.trafos_data:
-    o = trafo["origen"].strip()
-    d = trafo["destino"].strip()
-    if lp_destino in (o, d):
-        key = f"{o}_{d}"
-        if key in st.session_state.param_trafos:
-            z_mag = st.session_state.param_trafos[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_trafos[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            trafos_conectados.append(z)
-
-if trafos_conectados:
-    z_min_trafo = min(trafos_conectados, key=abs)
-    z2_max = z_linea + 0.5 * z_min_trafo
-else:
-    z2_max = float('inf') ## CONDICION DE QUE NO HAY TRAFO Y EL VALOR SE VA A INFINITO
 
-# ---------------------------------------------------
-# Selección del alcance de zona 2
-z_alcance_z2 = z2_min  # default
 
-if abs(z2_med) < abs(z2_min):
-    z_alcance_z2 = z2_med
-elif abs(z2_med) > abs(z2_max):
-    z_alcance_z2 = z2_max
-else:
-    z_alcance_z2 = z2_min
 
-# ---------------------------------------------------
-# Mostrar resultados
-st.markdown("**Resultado:**")
+    st.markdown("#### Zona 3")
+    st.markdown(
+        "*⏱️ Tiempo de operación: **800–1000 ms***"
+    )
+    z3_1 = complex(zonas["z3_1"])
+    z3_2 = complex(zonas["z3_2"])
+    z3_3 = complex(zonas["z3_3"])
 
-mod1 = abs(z2_min)
-ang1 = math.degrees(cmath.phase(z2_min))
-mod2 = abs(z2_med)
-ang2 = math.degrees(cmath.phase(mod2))
-mod3 = abs(z2_max)
-ang3 = math.degrees(cmath.phase(z2_max))
+    # Mostrar resultado
+    st.markdown("**Resultado:**")
 
-st.latex(f"Z_{{z2\\_min}} = {mod1:.4f} \\angle {ang1:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z2\\_}} = {mod2:.4f} \\angle {ang2:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z2\\_max}} = {mod3:.4f} \\angle {ang3:.2f}^\\circ \\, \\Omega")
+    mostrar_z("Z_{z3\\_1}", z3_1)
+    mostrar_z("Z_{z3\\_}", z3_2)
+    mostrar_z("Z_{z3\\_3}", z3_3)
 
-st.markdown(
-    "*Valor escogido*"
-)
+    # Valor con menor magnitud
+    z_alcance_z3 = complex(zonas["z3"])
 
-mod = abs(z_alcance_z2)
-ang = math.degrees(cmath.phase(z_alcance_z2))
-st.latex(f"Z_{{alcance\\_z2}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
+    st.markdown(
+        "*Valor escogido*"
+    )
 
+    mostrar_z("Z_{alcance\\_z3}", z_alcance_z3)
 
+    st.markdown("#### Zona 4")
+    st.markdown(
+        "*⏱️ Tiempo de operación: **<1500 ms***"
+    )
 
+    z4_1 = complex(zonas["z4_1"])
+    z4_2 = complex(zonas["z4_2"])
+    z4_3 = complex(zonas["z4_3"])
+    z_alcance_z4 = complex(zonas["z4"])
 
+    # Mostrar resultado
+    st.markdown("**Resultado:**")
 
-st.markdown("#### Zona 3")
-st.markdown(
-    "*⏱️ Tiempo de operación: **800–1000 ms***"
-)
-# ------------------------------------------
-z_mayor_linea = None
-for linea in st.session_state.lineas_data:
-    o = linea["origen"].strip()
-    d = linea["destino"].strip()
-    if not o or not d:
-        continue
-    if {o, d} == {lp_origen, lp_destino}:
-        continue  # evitar la línea protegida
-    if o == lp_destino:  # solo las que INICIAN en el nodo destino
-        key = f"{min(o, d)}_{max(o, d)}"
-        if key in st.session_state.param_lineas:
-            z_mag = st.session_state.param_lineas[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_lineas[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            if not z_mayor_linea or abs(z) > abs(z_mayor_linea):
-                z_mayor_linea = z
-                
-
-if z_mayor_linea is None:
-    z_mayor_linea = 0j
-
-
-
-# ------------------------------------------
-# Buscar trafo con mayor impedancia conectado al nodo destino
-z_mayor_trafo = None
-for trafo in st.session_state.trafos_data:
-    o = trafo["origen"].strip()
-    d = trafo["destino"].strip()
-    if lp_destino in (o, d):
-        key = f"{o}_{d}"
-        if key in st.session_state.param_trafos:
-            z_mag = st.session_state.param_trafos[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_trafos[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            if not z_mayor_trafo or abs(z) > abs(z_mayor_trafo):
-                z_mayor_trafo = z
-
-if not z_mayor_trafo:
-    z_mayor_trafo = float('inf')
-
-# ------------------------------------------
-# Cálculos de Z3_1, Z3_2, Z3_3
-z3_1 = 1.2 * (z_linea + z_mayor_linea)
-z3_2 = z_linea + 1.25 * z_mayor_linea
-z3_3 = z_linea + 0.8 * z_mayor_trafo
-
-
-
-mod1 = abs(z3_1)
-ang1 = math.degrees(cmath.phase(z3_1))
-mod2 = abs(z3_2)
-ang2 = math.degrees(cmath.phase(z3_2))
-mod3 = abs(z3_3)
-ang3 = math.degrees(cmath.phase(z3_3))
-
-
-# Mostrar resultado
-st.markdown("**Resultado:**")
-
-st.latex(f"Z_{{z3\\_1}} = {mod1:.4f} \\angle {ang1:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z3\\_}} = {mod2:.4f} \\angle {ang2:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z3\\_3}} = {mod3:.4f} \\angle {ang3:.2f}^\\circ \\, \\Omega")
-
-# Seleccionar el valor con menor magnitud
-z_alcance_z3 = min([z3_1, z3_2, z3_3], key=abs)
-
-st.markdown(
-    "*Valor escogido*"
-)
+    mostrar_z("Z_{z4\\_1}", z4_1)
+    mostrar_z("Z_{z4\\_}", z4_2)
+    mostrar_z("Z_{z4\\_3}", z4_3)
 
-mod = abs(z_alcance_z3)
-ang = math.degrees(cmath.phase(z_alcance_z3))
-st.latex(f"Z_{{alcance\\_z3}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
+    st.markdown(
+        "*Valor escogido*"
+    )
 
-st.markdown("#### Zona 4")
-st.markdown(
-    "*⏱️ Tiempo de operación: **<1500 ms***"
-)
+    mostrar_z("Z_{alcance\\_z4}", z_alcance_z4)
 
-# -----------------------------
-# Z4_1: 20% de la línea más corta que inicia en el nodo de origen
-z_min_linea_inicio = None
-for linea in st.session_state.lineas_data:
-    o = linea["origen"].strip()
-    d = linea["destino"].strip()
-    if not o or not d:
-        continue
-    if {o, d} == {lp_origen, lp_destino}:
-        continue  # evitar la línea protegida
-    if o == lp_origen:
-        key = f"{o}_{d}"
-        if key in st.session_state.param_lineas:
-            z_mag = st.session_state.param_lineas[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_lineas[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            if not z_min_linea_inicio or abs(z) < abs(z_min_linea_inicio):
-                z_min_linea_inicio = z
-
-z4_1 = 0.2 * z_min_linea_inicio if z_min_linea_inicio else 0
-
-# -----------------------------
-# Z4_2: 20% de la impedancia de la línea protegida
-z4_2 = 0.2 * z_linea
-
-# -----------------------------
-# Z4_3: 20% del trafo más pequeño conectado al nodo de origen
-z_min_trafo_origen = None
-for trafo in st.session_state.trafos_data:
-    o = trafo["origen"].strip()
-    d = trafo["destino"].strip()
-    if lp_origen in (o, d):
-        key = f"{o}_{d}"
-        if key in st.session_state.param_trafos:
-            z_mag = st.session_state.param_trafos[key]["z_mag"]
-            z_ang = math.radians(st.session_state.param_trafos[key]["z_ang"])
-            z = cmath.rect(z_mag, z_ang)
-            if not z_min_trafo_origen or abs(z) < abs(z_min_trafo_origen):
-                z_min_trafo_origen = z
-
-z4_3 = 0.2 * z_min_trafo_origen if z_min_trafo_origen else 0
-
-# -----------------------------
-# Selección final por menor módulo
-#z_alcance_z4 = min([z4_1, z4_2, z4_3], key=abs)
-z_alcance_z4 = min((z for z in [z4_1, z4_2, z4_3] if z != 0), key=abs)
-
-# -----------------------------
-# Mostrar resultado
-st.markdown("**Resultado:**")
-
-mod1 = abs(z4_1)
-ang1 = math.degrees(cmath.phase(z4_1))
-mod2 = abs(z4_2)
-ang2 = math.degrees(cmath.phase(z4_2))
-mod3 = abs(z4_3)
-ang3 = math.degrees(cmath.phase(z4_3))
-
-
-# Mostrar resultado
-st.markdown("**Resultado:**")
-
-st.latex(f"Z_{{z4\\_1}} = {mod1:.4f} \\angle {ang1:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z4\\_}} = {mod2:.4f} \\angle {ang2:.2f}^\\circ \\, \\Omega")
-st.latex(f"Z_{{z4\\_3}} = {mod3:.4f} \\angle {ang3:.2f}^\\circ \\, \\Omega")
-
-st.markdown(
-    "*Valor escogido*"
-)
+    # Pasos que dependen de los alcances
+    paso_6_ajustes(zonas, indice_red, porcentaje_z1, config_falla)
+    paso_8_contingencias(indice_red, porcentaje_z1, config_falla)
 
-mod = abs(z_alcance_z4)
-ang = math.degrees(cmath.phase(z_alcance_z4))
-st.latex(f"Z_{{alcance\\_z4}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
 
 #---------------------------------------------------------------------------------------------------------------------------------------
-st.markdown("## Paso 6 – Ajustes de Protección")
 
-col1, col2 = st.columns(2)
+import render_zonas
+
+
+@st.fragment
+@perfilado("Paso 6")
+def paso_6_ajustes(zonas, indice_red, porcentaje_z1, config_falla=None):
+    z_alcance_z1 = complex(zonas["z1"])
+    z_alcance_z2 = complex(zonas["z2"])
+    z_alcance_z3 = complex(zonas["z3"])
+    z_alcance_z4 = complex(zonas["z4"])
+
+    st.markdown("## Paso 6 – Ajustes de Protección")
+
+    col1, col2 = st.columns(2)
+
+    # -----------------------
+    # 🟦 Columna 1: Ajuste por R_Arco
+    with col1:
+        st.markdown("### Ajuste por Rₐᵣcₒ")
+
+        # Selección del ángulo
+        theta_escogido_deg = st.selectbox(
+            "Selecciona el ángulo de ajuste (Theta):",
+            [45, 60, 75],
+            index=1,
+            key="theta_arco"
+        )
+        theta_escogido_rad = math.radians(theta_escogido_deg)
+
+        # Calcular impedancias ajustadas
+        r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4 = coordinacion.calcular_r_arco(
+            [z_alcance_z1, z_alcance_z2, z_alcance_z3, z_alcance_z4], theta_escogido_rad
+        )
+
+        # Mostrar resultados
+        for i, z in enumerate([r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4], start=1):
+            mostrar_z(f"R_{{Arco\\_Z\\_alcance\\_z{i}}}", z)
+
+    # -----------------------
+    # -----------------------
+    # -----------------------
+    # 🟨 Columna 2: Ajuste por Infeed – Zona 2
+    with col2:
+        st.markdown("### Ajuste por Infeed – Zona 2")
+
+        st.markdown("*Este ajuste utiliza la corriente de cortocircuito del paso 4.*")
+
+        # Corriente del relé = corriente de la línea protegida; I_f = ramas aguas abajo (sin la usada en el alcance)
+        ir = zonas["ir"]
+        if_total = zonas["if_z2"]
+        k_infeed = zonas["k_infeed"]
+        z2_infeed = complex(zonas["z2_infeed"])
+
+        st.markdown("**Cálculos automáticos:**")
+        st.write(f"Corriente del relé (I_r): {ir:.2f} A")
+        st.write(f"Corrientes aguas abajo (I_f): {if_total:.2f} A")
+        st.write(f"Factor de Infeed (K): {k_infeed:.2f}")
+
+        st.markdown("**Resultado corregido por Infeed:**")
+        mostrar_z("Z_{alcance\\_z2\\_infeed}", z2_infeed)
+
+        st.markdown("### Ajuste por Infeed – Zona 3")
 
-# -----------------------
-# 🟦 Columna 1: Ajuste por R_Arco
-with col1:
-    st.markdown("### Ajuste por Rₐᵣcₒ")
+        if_total_z3 = zonas["if_z3"]
+        k_infeed_z3 = zonas["k_infeed_z3"]
+        z3_infeed = complex(zonas["z3_infeed"])
 
-    # Selección del ángulo
-    theta_escogido_deg = st.selectbox(
-        "Selecciona el ángulo de ajuste (Theta):",
-        [45, 60, 75],
-        index=1,
-        key="theta_arco"
+        st.markdown("**Cálculos automáticos Zona 3:**")
+        st.write(f"Corriente del relé (I_r): {ir:.2f} A")
+        st.write(f"Corrientes aguas abajo (I_f): {if_total_z3:.2f} A")
+        st.write(f"Factor de Infeed (K): {k_infeed_z3:.2f}")
+
+        st.markdown("**Resultado corregido por Infeed:**")
+        mostrar_z("Z_{alcance\\_z3\\_infeed}", z3_infeed)
+
+    # Mostrar en Streamlit con los valores ajustados
+    mostrar_vista(render_zonas.especificacion_zonas_con_circulos(r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4))
+
+    paso_6_sensibilidad(indice_red, zonas)
+
+    # Coordinación de toda la red con los mismos ajustes
+    paso_7_red(indice_red, porcentaje_z1, theta_escogido_deg, config_falla)
+    paso_9_comtrade([r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4])
+
+
+import time
+
+import sensibilidad
+import render_sensibilidad
+
+NOMBRES_METRICAS = {
+    "margen_z1_remota": "Margen Z1 – barra remota (p.u.)",
+    "margen_z2_remota": "Margen Z2 – barra remota (p.u.)",
+    "margen_z2_z1": "Margen Z2 sobre Z1 (p.u.)",
+    "margen_z3_z2": "Margen Z3 sobre Z2 (p.u.)",
+    "alcance_z1": "Alcance Z1 con Rₐᵣcₒ (Ω)",
+    "alcance_z2": "Alcance Z2 con Rₐᵣcₒ (Ω)",
+    "alcance_z3": "Alcance Z3 con Rₐᵣcₒ (Ω)",
+    "alcance_z4": "Alcance Z4 con Rₐᵣcₒ (Ω)",
+    "rf_z1": "Cobertura resistiva Z1 (Ω)",
+    "rf_z2": "Cobertura resistiva Z2 (Ω)",
+    "rf_z3": "Cobertura resistiva Z3 (Ω)",
+}
+
+
+def _valores_rango(rango, paso):
+    return np.round(np.arange(rango[0], rango[1] + paso / 2, paso), 6)
+
+
+@st.fragment
+@perfilado("Paso 6 (sensibilidad)")
+def paso_6_sensibilidad(indice_red, zonas):
+    with st.expander("🔬 Sensibilidad de ajustes (porcentaje de Z1 × theta × factores)"):
+        st.markdown(
+            "*Evalúa toda la malla de ajustes en una sola pasada vectorizada. Márgenes en p.u. de la línea "
+            "protegida: negativo (rojo) indica que el criterio no se cumple.*"
+        )
+        todos = st.radio("Relés", ["Relé de la línea protegida", "Toda la red (peor caso)"], horizontal=True,
+                         key="sens_alcance") != "Relé de la línea protegida"
+
+        col1, col2 = st.columns(2)
+        with col1:
+            rango_z1 = st.slider("Porcentaje de Z1 (%)", 0, 100, (50, 100), key="sens_z1")
+            paso_z1 = st.number_input("Paso del porcentaje (%)", min_value=1, max_value=50, value=5, key="sens_paso_z1")
+            rango_f2 = st.slider("Factor Z2 mínima (× Z línea)", 1.0, 2.0, (1.1, 1.3), step=0.05, key="sens_f2")
+        with col2:
+            rango_theta = st.slider("Theta de Rₐᵣcₒ (°)", 30, 90, (45, 75), key="sens_theta")
+            paso_theta = st.number_input("Paso de theta (°)", min_value=1, max_value=30, value=5, key="sens_paso_theta")
+            rango_f3 = st.slider("Factor Z3_1 (× Z línea + Z adyacente)", 1.0, 2.0, (1.1, 1.3), step=0.05, key="sens_f3")
+
+        # La malla solo se evalúa a pedido (el expander se ejecuta aunque esté cerrado); queda
+        # memorizada, así que mover los cortes mostrados no la recalcula
+        if not st.checkbox("Calcular la malla de sensibilidad", key="sens_activo"):
+            return
+
+        porcentajes = _valores_rango(rango_z1, paso_z1)
+        thetas = _valores_rango(rango_theta, paso_theta)
+        factores = {"z2": _valores_rango(rango_f2, 0.05), "z3": _valores_rango(rango_f3, 0.05)}
+        seleccion = {} if todos else {"rama_rele": [zonas["rama"]], "sentido": [zonas["sentido"]]}
+
+        inicio = time.perf_counter()
+        resultado = sensibilidad.barrido_red(indice_red, porcentajes, thetas, factores, **seleccion)
+        st.caption(
+            f"{resultado['celdas']:,} combinaciones × {resultado['reles']:,} relés evaluadas en "
+            f"{time.perf_counter() - inicio:.3f} s"
+        )
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            metrica = st.selectbox("Métrica", list(NOMBRES_METRICAS), format_func=NOMBRES_METRICAS.get, key="sens_metrica")
+        with col2:
+            f2 = st.select_slider("Factor Z2 mostrado", factores["z2"], value=factores["z2"][len(factores["z2"]) // 2], key="sens_f2_corte")
+        with col3:
+            f3 = st.select_slider("Factor Z3 mostrado", factores["z3"], value=factores["z3"][len(factores["z3"]) // 2], key="sens_f3_corte")
+        indices = {"z2": int(np.argmin(np.abs(factores["z2"] - f2))), "z3": int(np.argmin(np.abs(factores["z3"] - f3)))}
+
+        es_margen = metrica in sensibilidad.MARGENES
+        columnas = [("min", "mínimo" if todos else "")]
+        if todos and es_margen:
+            columnas.append(("violaciones", "relés que lo violan"))
+        elif todos:
+            columnas.append(("max", "máximo"))
+
+        for sufijo, descripcion in columnas:
+            valores = sensibilidad.corte(resultado, f"{metrica}_{sufijo}", indices)
+            titulo = NOMBRES_METRICAS[metrica] + (f" – {descripcion}" if descripcion else "")
+            mostrar_vista(render_sensibilidad.especificacion_mapa_calor(
+                valores, porcentajes, thetas, titulo,
+                "relés" if sufijo == "violaciones" else NOMBRES_METRICAS[metrica],
+                centrado=es_margen and sufijo != "violaciones"
+            ), use_container_width=True)
+
+
+import time
+
+import escalonamiento
+import selectividad
+import verificacion
+
+
+@st.fragment
+@perfilado("Paso 7")
+def paso_7_red(indice_red, porcentaje_z1, theta_escogido_deg, config_falla=None):
+    st.markdown("## Paso 7 – Coordinación de toda la red")
+    st.markdown(
+        "*Calcula Z1–Z4, Rₐᵣcₒ e Infeed para los relés de ambos extremos de todas las líneas, "
+        "usando el porcentaje de Zona 1 y el ángulo Theta escogidos arriba.*"
     )
-    theta_escogido_rad = math.radians(theta_escogido_deg)
-
-    # Función para calcular R_Arco (como impedancia compleja)
-    def calcular_r_arco(z_original, theta_ajuste_rad):
-        modulo = abs(z_original)
-        angulo_z = cmath.phase(z_original)
-        try:
-            nuevo_modulo = modulo / math.cos(angulo_z - theta_ajuste_rad)
-        except ZeroDivisionError:
-            nuevo_modulo = float("inf")
-        return cmath.rect(nuevo_modulo, theta_ajuste_rad)
-
-    # Calcular impedancias ajustadas
-    r_arco_z1 = calcular_r_arco(z_alcance_z1, theta_escogido_rad)
-    r_arco_z2 = calcular_r_arco(z_alcance_z2, theta_escogido_rad)
-    r_arco_z3 = calcular_r_arco(z_alcance_z3, theta_escogido_rad)
-    r_arco_z4 = calcular_r_arco(z_alcance_z4, theta_escogido_rad)
 
-    # Mostrar resultados
-    for i, z in enumerate([r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4], start=1):
-        mod = abs(z)
-        ang = math.degrees(cmath.phase(z))
-        st.latex(f"R_{{Arco\\_Z\\_alcance\\_z{i}}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
-
-# -----------------------
-# -----------------------
-# -----------------------
-# 🟨 Columna 2: Ajuste por Infeed – Zona 2
-with col2:
-    st.markdown("### Ajuste por Infeed – Zona 2")
-
-    st.markdown("*Este ajuste utiliza la corriente de cortocircuito del paso 4.*")
-
-    # Obtener origen y destino de la línea protegida
-    origen_lp = st.session_state.lineas_data[st.session_state.linea_protegida_idx]["origen"].strip()
-    destino_lp = st.session_state.lineas_data[st.session_state.linea_protegida_idx]["destino"].strip()
-    key_lp = f"{origen_lp}_{destino_lp}"
-
-    # Corriente del relé = corriente de la línea protegida
-    ir = st.session_state.param_lineas.get(key_lp, {}).get("i_mag", 1.0)
-
-    # Determinar qué impedancia fue usada para z_alcance_z2
-    if abs(z_alcance_z2 - z2_min) < 1e-6:
-        z_excluir = z_min_linea  # Línea más corta
-        tipo_excluir = "linea"
-    elif abs(z_alcance_z2 - z2_max) < 1e-6:
-        z_excluir = z_min_trafo  # Trafo más corto
-        tipo_excluir = "trafo"
-    else:
-        z_excluir = None
-        tipo_excluir = None
-
-    if_total = 0.0
-
-    # Líneas aguas abajo
-    for linea in st.session_state.lineas_data:
-        o = linea["origen"].strip()
-        d = linea["destino"].strip()
-        if o == destino_lp:
-            key = f"{o}_{d}"
-            if key in st.session_state.param_lineas:
-                z_mag = st.session_state.param_lineas[key]["z_mag"]
-                z_ang = math.radians(st.session_state.param_lineas[key]["z_ang"])
-                z_actual = cmath.rect(z_mag, z_ang)
-                if not (tipo_excluir == "linea" and abs(z_actual - z_excluir) < 1e-6):
-                    if_total += st.session_state.param_lineas[key]["i_mag"]
-
-    # Transformadores aguas abajo
-    for trafo in st.session_state.trafos_data:
-        o = trafo["origen"].strip()
-        d = trafo["destino"].strip()
-        if o == destino_lp:
-            key = f"{o}_{d}"
-            if key in st.session_state.param_trafos:
-                z_mag = st.session_state.param_trafos[key]["z_mag"]
-                z_ang = math.radians(st.session_state.param_trafos[key]["z_ang"])
-                z_actual = cmath.rect(z_mag, z_ang)
-                if not (tipo_excluir == "trafo" and abs(z_actual - z_excluir) < 1e-6):
-                    if_total += st.session_state.param_trafos[key]["i_mag"]
-
-    # Calcular K y Z2 corregida
-    k_infeed = if_total / ir if ir != 0 else 0
-    z2_infeed = z_alcance_z2 * (1 + k_infeed)
-
-    st.markdown("**Cálculos automáticos:**")
-    st.write(f"Corriente del relé (I_r): {ir:.2f} A")
-    st.write(f"Corrientes aguas abajo (I_f): {if_total:.2f} A")
-    st.write(f"Factor de Infeed (K): {k_infeed:.2f}")
-
-    st.markdown("**Resultado corregido por Infeed:**")
-    mod = abs(z2_infeed)
-    ang = math.degrees(cmath.phase(z2_infeed))
-    st.latex(f"Z_{{alcance\\_z2\\_infeed}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
-
-    st.markdown("### Ajuste por Infeed – Zona 3")
-
-    # Determinar qué impedancia fue usada para z_alcance_z3
-    if abs(z_alcance_z3 - z3_1) < 1e-6:
-        z_excluir = z_mayor_linea
-        tipo_excluir = "linea"
-    elif abs(z_alcance_z3 - z3_2) < 1e-6:
-        z_excluir = z_mayor_linea
-        tipo_excluir = "linea"
-    elif abs(z_alcance_z3 - z3_3) < 1e-6:
-        z_excluir = z_mayor_trafo
-        tipo_excluir = "trafo"
-    else:
-        z_excluir = None
-        tipo_excluir = None
-
-    if_total_z3 = 0.0
-
-    # Líneas aguas abajo desde el nodo destino
-    for linea in st.session_state.lineas_data:
-        o = linea["origen"].strip()
-        d = linea["destino"].strip()
-        if o == destino_lp:
-            key = f"{o}_{d}"
-            if key in st.session_state.param_lineas:
-                z_mag = st.session_state.param_lineas[key]["z_mag"]
-                z_ang = math.radians(st.session_state.param_lineas[key]["z_ang"])
-                z_actual = cmath.rect(z_mag, z_ang)
-                if not (tipo_excluir == "linea" and abs(z_actual - z_excluir) < 1e-6):
-                    if_total_z3 += st.session_state.param_lineas[key]["i_mag"]
-
-    # Transformadores aguas abajo desde el nodo destino
-    for trafo in st.session_state.trafos_data:
-        o = trafo["origen"].strip()
-        d = trafo["destino"].strip()
-        if o == destino_lp:
-            key = f"{o}_{d}"
-            if key in st.session_state.param_trafos:
-                z_mag = st.session_state.param_trafos[key]["z_mag"]
-                z_ang = math.radians(st.session_state.param_trafos[key]["z_ang"])
-                z_actual = cmath.rect(z_mag, z_ang)
-                if not (tipo_excluir == "trafo" and abs(z_actual - z_excluir) < 1e-6):
-                    if_total_z3 += st.session_state.param_trafos[key]["i_mag"]
-
-    # Calcular K y Z3 corregida
-    k_infeed_z3 = if_total_z3 / ir if ir != 0 else 0
-    z3_infeed = z_alcance_z3 * (1 + k_infeed_z3)
-
-    st.markdown("**Cálculos automáticos Zona 3:**")
-    st.write(f"Corriente del relé (I_r): {ir:.2f} A")
-    st.write(f"Corrientes aguas abajo (I_f): {if_total_z3:.2f} A")
-    st.write(f"Factor de Infeed (K): {k_infeed_z3:.2f}")
-
-    st.markdown("**Resultado corregido por Infeed:**")
-    mod = abs(z3_infeed)
-    ang = math.degrees(cmath.phase(z3_infeed))
-    st.latex(f"Z_{{alcance\\_z3\\_infeed}} = {mod:.4f} \\angle {ang:.2f}^\\circ \\, \\Omega")
+    # Último cambio aplicado por el motor incremental
+    motor = st.session_state.get("motor_zonas")
+    informe = motor.ultimo_informe if motor else None
+    if informe:
+        cambiados = informe["cambiados"]
+        st.caption(
+            f"🔄 Último cambio: {len(informe['ramas'])} ramas modificadas → "
+            + ("red reconstruida" if informe["completo"] else f"{informe['recalculados']} relés recalculados")
+            + f", {len(cambiados)} relés con ajustes distintos."
+        )
+        if len(cambiados):
+            with st.expander("Relés con ajustes distintos"):
+                st.write(", ".join(motor.describir(cambiados[:200])) + (" …" if len(cambiados) > 200 else ""))
+
+    col_calc, col_verif, col_selec, col_escal = st.columns(4)
+    with col_calc:
+        calcular = st.button("Calcular todos los relés")
+    with col_verif:
+        verificar = st.button("Verificar alcances (barrido de fallas)")
+    with col_selec:
+        selectiva = st.button("Verificar selectividad")
+    with col_escal:
+        escalonar = st.button("Escalonar tiempos y respaldos")
+    with st.expander("Opciones del barrido de fallas"):
+        paso_falla = st.select_slider("Paso de la falla a lo largo de la línea (%)", [0.5, 1, 2, 5, 10], value=1)
+        rf_max = st.number_input("Resistencia de arco máxima (Ω)", min_value=0.0, value=10.0, step=1.0)
+        n_rf = st.slider("Cantidad de valores de resistencia", min_value=1, max_value=20, value=5)
+    with st.expander("Opciones del escalonamiento"):
+        col_t2, col_t3, col_cti = st.columns(3)
+        with col_t2:
+            t_z2 = st.number_input("Tiempo de Z2 (s)", min_value=0.0, value=escalonamiento.TIEMPOS_ZONA["z2"], step=0.05)
+        with col_t3:
+            t_z3 = st.number_input("Tiempo de Z3 (s)", min_value=0.0, value=escalonamiento.TIEMPOS_ZONA["z3"], step=0.05)
+        with col_cti:
+            cti = st.number_input("CTI mínimo (s)", min_value=0.0, value=escalonamiento.CTI, step=0.05)
+        fracciones = st.multiselect(
+            "Puntos de falla en cada rama (% desde el origen)", [5, 10, 25, 50, 75, 90, 95],
+            default=[round(f * 100) for f in escalonamiento.FRACCIONES]
+        )
+
+    if not calcular and not verificar and not selectiva and not escalonar:
+        return
+
+    resultado = coordinacion.agregar_r_arco(zonas_de_red(indice_red, porcentaje_z1, config_falla), theta_escogido_deg)
+
+    if calcular:
+        tabla = coordinacion.tabla_coordinacion(resultado)
+
+        st.write(f"Relés calculados: {len(tabla['linea'])}")
+        st.dataframe(tabla, use_container_width=True)
+        st.download_button(
+            "Descargar ajustes (CSV)",
+            coordinacion.tabla_a_csv(tabla),
+            file_name="ajustes_red.csv",
+            mime="text/csv"
+        )
+
+    if verificar:
+        # Impedancia aparente de cada falla contra las características mho Z1–Z4 (con R_arco)
+        inicio = time.perf_counter()
+        tabla, puntos = verificacion.verificar_red(
+            resultado, indice_red, porcentaje_z1, paso_falla / 100, np.linspace(0, rf_max, n_rf)
+        )
+        duracion = time.perf_counter() - inicio
+
+        con_observaciones = sum(1 for o in tabla["observaciones"] if o)
+        st.write(f"Pares falla/relé evaluados: {puntos:,} en {duracion:.2f} s · relés con observaciones: {con_observaciones}")
+        if tabla["z1_sobrealcance"].any():
+            st.error(f"❌ Zona 1 alcanza la barra remota en {int(tabla['z1_sobrealcance'].sum())} relés.")
+        st.dataframe(tabla, use_container_width=True)
+        st.download_button(
+            "Descargar verificación (CSV)",
+            coordinacion.tabla_a_csv(tabla),
+            file_name="verificacion_alcances.csv",
+            mime="text/csv"
+        )
+
+    if selectiva:
+        # Zonas proyectadas sobre las ramas: relés que ven el mismo tramo en la misma zona
+        inicio = time.perf_counter()
+        tabla, tramos = selectividad.verificar_selectividad(resultado, indice_red)
+        duracion = time.perf_counter() - inicio
+
+        st.write(f"Tramos de cobertura indexados: {tramos:,} en {duracion:.2f} s · solapes: {len(tabla['zona'])}")
+        if tabla["zona"]:
+            por_zona = {z: tabla["zona"].count(z) for z in dict.fromkeys(tabla["zona"])}
+            st.warning(
+                "⚠️ Zonas con el mismo escalón de tiempo que se solapan con la de un relé más cercano: "
+                + ", ".join(f"{z}: {c}" for z, c in por_zona.items())
+            )
+        else:
+            st.success("✅ Ninguna zona se solapa con la misma zona de un relé más cercano.")
+        st.dataframe(tabla, use_container_width=True)
+        st.download_button(
+            "Descargar selectividad (CSV)",
+            coordinacion.tabla_a_csv(tabla),
+            file_name="selectividad.csv",
+            mime="text/csv"
+        )
+
+    if escalonar:
+        # Recorrido de la red memorizado por topología; solo se reevalúan los relés que cambiaron
+        if "escalonador" not in st.session_state:
+            st.session_state.escalonador = escalonamiento.Escalonador()
+        escalonador = st.session_state.escalonador
+        inicio = time.perf_counter()
+        graduacion = escalonador.calcular(
+            resultado, indice_red, {"z2": t_z2, "z3": t_z3}, cti, sorted(f / 100 for f in fracciones) or escalonamiento.FRACCIONES
+        )
+        duracion = time.perf_counter() - inicio
+
+        resumen = graduacion["resumen"]
+        informe = escalonador.ultimo_informe
+        st.write(
+            f"Puntos de falla: {resumen['puntos']:,} · pares relé/rama en falla: {informe['filas']:,} "
+            f"({informe['reevaluadas']:,} reevaluados) en {duracion:.2f} s · pares de respaldo: {resumen['pares']:,}"
+        )
+        if resumen["violaciones"]:
+            st.error(
+                f"❌ {resumen['pares_con_violacion']} pares de respaldo con margen menor que {cti:g} s "
+                f"({resumen['violaciones']} casos)."
+            )
+        else:
+            st.success(f"✅ Todos los respaldos operan al menos {cti:g} s después del relé que respaldan.")
+        if resumen["puntos_sin_primario"] or resumen["puntos_sin_respaldo"]:
+            st.warning(
+                f"⚠️ {resumen['puntos_sin_primario']} puntos sin despeje de los primarios, "
+                f"{resumen['puntos_sin_respaldo']} sin respaldo remoto."
+            )
+        st.markdown("**Mapa de respaldos** (peor margen primero)")
+        st.dataframe(graduacion["mapa"], use_container_width=True)
+        st.markdown("**Tiempos por punto de falla**")
+        st.dataframe(graduacion["fallas"], use_container_width=True)
+        col_mapa, col_fallas = st.columns(2)
+        with col_mapa:
+            st.download_button(
+                "Descargar mapa de respaldos (CSV)",
+                coordinacion.tabla_a_csv(graduacion["mapa"]),
+                file_name="mapa_respaldos.csv",
+                mime="text/csv"
+            )
+        with col_fallas:
+            st.download_button(
+                "Descargar tiempos por falla (CSV)",
+                coordinacion.tabla_a_csv(graduacion["fallas"]),
+                file_name="escalonamiento.csv",
+                mime="text/csv"
+            )
+
+
+import contingencias
+from cache_resultados import huella
+
+
+@st.fragment
+@perfilado("Paso 8")
+def paso_8_contingencias(indice_red, porcentaje_z1, config_falla=None):
+    st.markdown("## Paso 8 – Estudio de contingencias N-1")
+    st.markdown(
+        "*Saca de servicio cada línea y transformador por turno y recalcula los alcances de Z2/Z3 "
+        "y los factores de Infeed de los relés afectados. Muestra el peor caso de cada relé.*"
+    )
+    if not config_falla:
+        st.caption("Sin fuentes definidas en el Paso 4, el infeed usa las corrientes ingresadas a mano.")
+
+    # El barrido corre en segundo plano; un cambio en la red o en los ajustes suelta el trabajo
+    clave = huella(
+        "trabajo n1", indice_red["firma"], indice_red["z"], indice_red["i_mag"], indice_red["tiene_param"],
+        porcentaje_z1, config_falla
+    )
+    trabajo = trabajo_de_sesion("trabajo_n1", clave)
+    if st.button("Ejecutar estudio N-1") and trabajo is None:
+        trabajo = enviar_trabajo(
+            "trabajo_n1", clave, "Estudio N-1", contingencias.barrido_n1,
+            coordinacion.copiar_indice(indice_red), porcentaje_z1, config_falla,
+            progreso=lambda n, total: trabajos.avance(n, total, f"Lote {n} de {total}")
+        )
+    if trabajo is None:
+        return
+    if not trabajo.terminado():
+        seguir_trabajo("trabajo_n1", trabajo)
+        return
+    tabla = resultado_trabajo("trabajo_n1", trabajo)
+    if tabla is None:
+        return
+
+    st.write(f"Contingencias evaluadas: {int(indice_red['tiene_param'].sum())} · Relés: {len(tabla['rele'])}")
+    st.dataframe(tabla, use_container_width=True)
+    st.download_button(
+        "Descargar peor caso N-1 (CSV)",
+        coordinacion.tabla_a_csv(tabla),
+        file_name="contingencias_n1.csv",
+        mime="text/csv"
+    )
+
+
+import os
+import shutil
+import tempfile
+
+import comtrade
+import reproduccion
+
+# Directorio de registros COMTRADE que pueden leerse directamente del disco del servidor. Sin
+# configurar, solo se aceptan archivos subidos.
+DIRECTORIO_REGISTROS = os.environ.get("PROTEC21_REGISTROS_DIR") or None
+
+
+# Ruta real de un registro del directorio de registros (nombre sin extensión); None si no está
+# configurado o si la ruta (incluidos enlaces simbólicos) sale del directorio
+def _ruta_registro(nombre, extension):
+    if not DIRECTORIO_REGISTROS:
+        return None
+    base = os.path.realpath(DIRECTORIO_REGISTROS)
+    ruta = os.path.realpath(os.path.join(base, f"{nombre}{extension}"))
+    return ruta if os.path.commonpath([base, ruta]) == base and os.path.isfile(ruta) else None
+
+
+@st.fragment
+@perfilado("Paso 9")
+def paso_9_comtrade(ajustes_r_arco):
+    st.markdown("## Paso 9 – Reproducción de registros COMTRADE")
+    st.markdown(
+        "*Estima los fasores con un DFT deslizante, calcula la trayectoria de impedancia aparente y la "
+        "compara muestra a muestra con las zonas Z1–Z4 (ajustadas por Rₐᵣcₒ) del relé protegido.*"
+    )
+
+    col_cfg, col_dat = st.columns(2)
+    with col_cfg:
+        archivo_cfg = st.file_uploader("Archivo .cfg", type=["cfg"], key="comtrade_cfg")
+    with col_dat:
+        archivo_dat = st.file_uploader("Archivo .dat", type=["dat"], key="comtrade_dat")
+    ruta_servidor = ""
+    if DIRECTORIO_REGISTROS:
+        ruta_servidor = st.text_input(
+            "…o nombre del registro en el directorio de registros del servidor (sin extensión)",
+            key="comtrade_ruta",
+            help="Para registros de cientos de MB: se leen directamente del disco, por bloques."
+        ).strip()
+
+    if ruta_servidor:
+        ruta_cfg, ruta_dat = _ruta_registro(ruta_servidor, ".cfg"), _ruta_registro(ruta_servidor, ".dat")
+        if ruta_cfg is None or ruta_dat is None:
+            st.error("❌ El registro no está en el directorio de registros del servidor.")
+            return
+
+    try:
+        if ruta_servidor:
+            cfg = comtrade.leer_cfg(ruta_cfg)
+        elif archivo_cfg is not None and archivo_dat is not None:
+            cfg = comtrade.leer_cfg(io.TextIOWrapper(archivo_cfg, encoding="utf-8", errors="replace"))
+            archivo_cfg.seek(0)
+        else:
+            return
+    except (OSError, ValueError) as e:
+        st.error(f"❌ No se pudo leer el .cfg: {e}")
+        return
+
+    nombres = comtrade.nombres_analogicos(cfg)
+    if len(nombres) < 2:
+        st.error("❌ El registro necesita al menos un canal de tensión y uno de corriente.")
+        return
+    st.caption(f"{cfg['estacion']} · {len(nombres)} canales analógicos · {cfg['formato']} · {cfg['frecuencia']:g} Hz")
+
+    trifasico = st.radio(
+        "Lazo de medida", ["Trifásico (secuencia positiva)", "Monofásico"], horizontal=True, key="comtrade_lazo",
+        index=0 if len(nombres) >= 6 else 1
+    ).startswith("Trifásico")
+    n_fases = 3 if trifasico else 1
+    columnas = st.columns(2 * n_fases)
+    canales_v, canales_i = [], []
+    for f in range(n_fases):
+        with columnas[f]:
+            canales_v.append(st.selectbox(f"V{'ABC'[f] if trifasico else ''}", range(len(nombres)),
+                                          index=min(f, len(nombres) - 1), format_func=nombres.__getitem__,
+                                          key=f"comtrade_v{f}"))
+        with columnas[n_fases + f]:
+            canales_i.append(st.selectbox(f"I{'ABC'[f] if trifasico else ''}", range(len(nombres)),
+                                          index=min(n_fases + f, len(nombres) - 1), format_func=nombres.__getitem__,
+                                          key=f"comtrade_i{f}"))
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        t_z2 = st.number_input("Tiempo Z2 (s)", min_value=0.0, value=reproduccion.TIEMPOS_ZONA["z2"], step=0.05, key="comtrade_t2")
+    with col2:
+        t_z3 = st.number_input("Tiempo Z3 (s)", min_value=0.0, value=reproduccion.TIEMPOS_ZONA["z3"], step=0.05, key="comtrade_t3")
+    with col3:
+        t_z4 = st.number_input("Tiempo Z4 (s)", min_value=0.0, value=reproduccion.TIEMPOS_ZONA["z4"], step=0.05, key="comtrade_t4")
+    with col4:
+        i_minima = st.number_input("Corriente mínima (A)", min_value=0.0, value=0.0, key="comtrade_imin")
+    a_secundario = st.checkbox("Registro en valores primarios: referir Z al secundario con RTC/RTP", value=True,
+                               key="comtrade_secundario")
+
+    if not st.button("Reproducir registro"):
+        return
+
+    rtc, rtp = st.session_state.get("rtc", 1.0), st.session_state.get("rtp", 1.0)
+    factor_z = rtc / rtp if a_secundario and rtp != 0 else 1.0
+
+    temporal = None
+    try:
+        if not ruta_servidor:
+            # El .dat subido se copia a disco para leerlo mapeado en memoria
+            with tempfile.NamedTemporaryFile(suffix=".dat", delete=False) as f:
+                shutil.copyfileobj(archivo_dat, f, 1 << 20)
+                temporal = ruta_dat = f.name
+        resultado = reproduccion.reproducir(
+            cfg, ruta_dat, canales_v, canales_i, ajustes_r_arco,
+            tiempos={"z2": t_z2, "z3": t_z3, "z4": t_z4}, factor_z=factor_z, i_minima=i_minima
+        )
+    except (OSError, ValueError) as e:
+        st.error(f"❌ No se pudo reproducir el registro: {e}")
+        return
+    finally:
+        if temporal:
+            os.remove(temporal)
+
+    st.write(
+        f"Muestras procesadas: {resultado['muestras']:,} en {resultado['segundos']:.2f} s "
+        f"({resultado['muestras_por_s']:,.0f} muestras/s · {resultado['muestras_por_ciclo']} muestras por ciclo)"
+    )
+    st.dataframe(reproduccion.tabla_eventos(resultado), use_container_width=True)
+
+    # Trayectoria R-X sobre las características de las zonas
+    mostrar_vista(render_zonas.especificacion_zonas_con_circulos(*ajustes_r_arco, trayectoria=resultado["trayectoria_z"]))
 
 
 #------------------------------------------------------------------------------------------------
+# Ejecución de los Pasos 4 a 9 (anidados según sus dependencias)
+rtc = st.session_state.get("rtc", 1.0)
+rtp = st.session_state.get("rtp", 1.0)
+
+paso_4_parametros(st.session_state.modelo_red, rtc / rtp if rtp != 0 else 1.0, modo_tabla)
 
-# Función actualizada
-def graficar_zonas_con_circulos(z1, z2, z3, z4):
-    import matplotlib.pyplot as plt
-    import numpy as np
-
-    fig, ax = plt.subplots(figsize=(10, 8))
-
-    def graficar_z(z, color, etiqueta):
-        x = z.real
-        y = z.imag
-        radio = abs(z) / 2
-        angulo = np.angle(z)
-        centro_x = radio * np.cos(angulo)
-        centro_y = radio * np.sin(angulo)
-
-        circulo = plt.Circle((centro_x, centro_y), radio, color=color, fill=False, linestyle='--', linewidth=2, label=f"{etiqueta} (|Z|={abs(z):.2f})")
-        ax.add_patch(circulo)
-        ax.plot(x, y, 'o', color=color)
-        ax.plot([0, x], [0, y], color=color, linewidth=1, linestyle=':')
-
-    graficar_z(z1, 'blue', 'Zona 1 (R_arco)')
-    graficar_z(z2, 'green', 'Zona 2 (R_arco)')
-    graficar_z(z3, 'red', 'Zona 3 (R_arco)')
-    graficar_z(z4, 'orange', 'Zona 4 (R_arco)')
-
-    ax.set_xlabel('Parte Real (Ω)')
-    ax.set_ylabel('Parte Imaginaria (Ω)')
-    ax.set_title('Zonas de Protección con Ajuste por Rₐᵣcₒ')
-    ax.grid(True)
-    ax.legend()
-    ax.set_aspect('equal', adjustable='box')
-    ax.axhline(0, color='gray', linewidth=0.5)
-    ax.axvline(0, color='gray', linewidth=0.5)
-
-    return fig
-
-# Mostrar en Streamlit con los valores ajustados
-fig = graficar_zonas_con_circulos(r_arco_z1, r_arco_z2, r_arco_z3, r_arco_z4)
-st.pyplot(fig, use_container_width=True)
+# --- Memoria: figuras de matplotlib vivas (deben volver a 0 al terminar cada Paso) ---
+with st.sidebar:
+    st.markdown("### 🧠 Memoria")
+    st.metric("Figuras vivas (sesión)", figuras.POOL.vivas(st.session_state.id_sesion))
+    st.metric("Figuras vivas (servidor)", figuras.POOL.vivas_total())
+    st.caption(
+        f"Pool: {figuras.POOL.en_pool()}/{figuras.POOL.max_figuras} figuras libres · "
+        f"{figuras.POOL.creadas} creadas · {figuras.POOL.reutilizadas} reutilizadas"
+    )
+    resumen_trabajos = trabajos.POOL.resumen()
+    st.caption(
+        f"Trabajos: {resumen_trabajos[trabajos.EN_CURSO]} en curso · {resumen_trabajos[trabajos.PENDIENTE]} en cola · "
+        f"{trabajos.POOL.compartidos} compartidos entre sesiones"
+    )
+    st.metric("Ramas del modelo de red", modelo_red.cantidad(st.session_state.modelo_red))
+    st.caption(
+        f"{modelo_red.bytes_por_rama(st.session_state.modelo_red):.0f} bytes/rama · "
+        f"{len(st.session_state.modelo_red['nodos'])} nodos internados"
+    )
+
+perfilador.terminar(seccion_corrida)
+
+# --- Perfilador: tiempos por Paso y por sección crítica de la última corrida ---
+with st.sidebar:
+    st.markdown("### ⏱️ Perfilador")
+    st.checkbox("Medir tiempos de los Pasos", key="perfilador_activo")
+    registro = st.session_state.get("perfil")
+    if st.session_state.get("perfilador_activo") and registro is not None:
+        eventos = [e for e in registro.eventos if e["corrida"] == registro.corrida]
+        registro.memoria = {
+            "rss_proceso_bytes": perfilador.rss_proceso(),
+            "sesion_aprox_bytes": perfilador.tamano_aproximado(
+                {k: v for k, v in st.session_state.items() if k != "perfil"}
+            ),
+            "widgets_corrida": widgets_de_la_corrida(),
+        }
+        st.caption(
+            f"Corrida {registro.corrida} · {len(eventos)} secciones · "
+            f"{registro.memoria['widgets_corrida']} widgets"
+        )
+        st.dataframe(perfilador.resumen(eventos), use_container_width=True, hide_index=True)
+        col_rss, col_sesion = st.columns(2)
+        col_rss.metric("RSS proceso", f"{registro.memoria['rss_proceso_bytes'] / 2**20:.0f} MiB")
+        col_sesion.metric("Sesión (aprox.)", f"{registro.memoria['sesion_aprox_bytes'] / 2**20:.1f} MiB")
+        st.download_button("Descargar perfil (JSON)", perfilador.exportar_json(registro), "perfil.json", "application/json")
+        st.download_button(
+            "Descargar traza (Chrome / Perfetto)", perfilador.exportar_traza(registro), "traza.json", "application/json"
+        )
+        if st.button("Limpiar perfil"):
+            registro.limpiar()
+perfilador.fijar(None)
@@ -0,0 +1,228 @@
+import argparse
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+from matplotlib.figure import Figure
+
+import coordinacion
+import cortocircuito
+import escalonamiento
+import generador_red
+import grafo_red
+import layout_red
+import modelo_red
+import render_red
+import render_zonas
+import selectividad
+import validacion_red
+from cache_resultados import CacheLRU
+
+# ------------------------------------------------------------------------------------------------
+# Suite de rendimiento reproducible sobre redes sintéticas (generador_red). Mide por separado cada
+# etapa de la página, de 10 a 100k ramas, y escribe los tiempos en JSON:
+#   python benchmark.py --tamanos 10 1000 100000 --salida bench.json
+#   python benchmark.py --comparar bench_base.json --tolerancia 1.5   (código 1 si hay regresión)
+#
+# Etapas:
+#   modelo     filas -> modelo_red -> índice de coordinación
+#   validacion validación completa de la topología (validacion_red: índice hash + union-find)
+#   grafo      MultiGraph de NetworkX (grafo_red.construir_grafo)
+#   layout     disposición de los nodos (layout_red: spring_layout o multinivel)
+#   dibujo_red dibujo del Paso 3 con matplotlib (render_red.dibujar_red + render a PNG)
+#   vista_red  vista vectorial del Paso 3 (render_red.especificacion_red + JSON)
+#   zonas      Z1-Z4 de todos los relés (coordinacion.calcular_zonas)
+#   infeed     fallas con Zbus e infeed de todos los relés (cortocircuito)
+#   selectividad  solapes de zonas entre relés (selectividad: caminos acotados + índice de tramos)
+#   escalonamiento  primarios y respaldos de cada falla, tiempos y CTI (escalonamiento, sin caché)
+#   zonas_rx   gráfico R-X de las cuatro zonas con matplotlib (render_zonas.dibujar_zonas_con_circulos)
+#   vista_rx   vista vectorial R-X de las cuatro zonas (render_zonas.especificacion_zonas_con_circulos + JSON)
+# ------------------------------------------------------------------------------------------------
+ETAPAS = [
+    "modelo", "validacion", "grafo", "layout", "dibujo_red", "vista_red", "zonas", "infeed", "selectividad",
+    "escalonamiento", "zonas_rx", "vista_rx",
+]
+TAMANOS = [10, 100, 1000, 10000, 100000]
+# Ramas a partir de las cuales se omite una etapa (las de costo superlineal); "omitida" en el JSON
+LIMITES = {"layout": 20000, "dibujo_red": 20000, "zonas_rx": 20000, "infeed": 10000}
+
+
+def _medir(funcion, repeticiones):
+    tiempos = []
+    resultado = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, tiempos
+
+
+def _png(fig):
+    fig.savefig(io.BytesIO(), format="png")
+
+
+def _dibujar_red(G, pos):
+    fig = Figure(figsize=(8, 6))
+    render_red.dibujar_red(fig.subplots(), G, pos, 0)
+    _png(fig)
+
+
+def _r_arco(resultado):
+    return [complex(resultado[f"r_arco_z{k}"][0]) for k in range(1, 5)]
+
+
+def _dibujar_zonas_rx(resultado):
+    fig = Figure(figsize=(10, 8))
+    render_zonas.dibujar_zonas_con_circulos(fig.subplots(), *_r_arco(resultado))
+    _png(fig)
+
+
+# Tiempos de todas las etapas para una red; devuelve una fila por etapa
+def medir_red(topologia, n_ramas, repeticiones=3, semilla=0, limites=LIMITES):
+    filas = generador_red.generar_red(n_ramas, topologia, semilla=semilla)
+    fuentes = generador_red.fuentes_sinteticas(filas, semilla=semilla)
+    medir = lambda etapa: n_ramas <= limites.get(etapa, n_ramas)
+    medidas = {}
+
+    def modelo():
+        red = modelo_red.desde_filas(filas)
+        return red, coordinacion.indice_desde_modelo(red)
+
+    (red, indice), medidas["modelo"] = _medir(modelo, repeticiones)
+    _, medidas["validacion"] = _medir(lambda: validacion_red.validar_red(red), repeticiones)
+    lineas, trafos = modelo_red.listas(red)
+    (G, _, _), medidas["grafo"] = _medir(lambda: grafo_red.construir_grafo(lineas, trafos), repeticiones)
+
+    if medir("layout"):
+        (pos, _), medidas["layout"] = _medir(lambda: layout_red.calcular_layout(G), repeticiones)
+        if medir("dibujo_red"):
+            _, medidas["dibujo_red"] = _medir(lambda: _dibujar_red(G, pos), repeticiones)
+        if medir("vista_red"):
+            _, medidas["vista_red"] = _medir(lambda: json.dumps(render_red.especificacion_red(G, pos, 0)), repeticiones)
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        zonas, medidas["zonas"] = _medir(lambda: coordinacion.calcular_zonas(indice), repeticiones)
+
+        def infeed():
+            fallas = cortocircuito.fallas_trifasicas(indice, fuentes, 115.0)
+            return cortocircuito.aplicar_infeed(zonas, indice, fallas)
+
+        if medir("infeed"):
+            _, medidas["infeed"] = _medir(infeed, repeticiones)
+        if medir("selectividad"):
+            _, medidas["selectividad"] = _medir(lambda: selectividad.verificar_selectividad(zonas, indice), repeticiones)
+        if medir("escalonamiento"):
+            escalonar = lambda: escalonamiento.Escalonador(CacheLRU(max_elementos=1)).calcular(zonas, indice)
+            _, medidas["escalonamiento"] = _medir(escalonar, repeticiones)
+
+    if len(zonas["z1"]):
+        resultado = coordinacion.agregar_r_arco(zonas, 60)
+        if medir("zonas_rx"):
+            _, medidas["zonas_rx"] = _medir(lambda: _dibujar_zonas_rx(resultado), repeticiones)
+        if medir("vista_rx"):
+            especificacion = lambda: render_zonas.especificacion_zonas_con_circulos(*_r_arco(resultado))
+            _, medidas["vista_rx"] = _medir(lambda: json.dumps(especificacion()), repeticiones)
+
+    return [
+        {
+            "topologia": topologia, "ramas": len(filas), "nodos": len(red["nodos"]), "reles": len(zonas["z1"]),
+            "etapa": etapa,
+            "segundos_min": min(medidas[etapa]) if etapa in medidas else None,
+            "segundos_mediana": statistics.median(medidas[etapa]) if etapa in medidas else None,
+            "repeticiones": len(medidas.get(etapa, [])),
+        }
+        for etapa in ETAPAS
+    ]
+
+
+def ejecutar(topologias, tamanos, repeticiones=3, semilla=0, limites=LIMITES, progreso=None):
+    resultados = []
+    for topologia in topologias:
+        for n_ramas in tamanos:
+            filas = medir_red(topologia, n_ramas, repeticiones, semilla, limites)
+            resultados.extend(filas)
+            if progreso:
+                progreso(filas)
+    return {
+        "entorno": {
+            "python": platform.python_version(), "numpy": np.__version__,
+            "plataforma": platform.platform(), "procesador": platform.processor(),
+        },
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "semilla": semilla,
+        "limites": limites,
+        "resultados": resultados,
+    }
+
+
+# Etapas más lentas que la base en más de "tolerancia" veces (se compara la mediana)
+def regresiones(actual, base, tolerancia=1.5, minimo_s=1e-3):
+    clave = lambda r: (r["topologia"], r["ramas"], r["etapa"])
+    previos = {clave(r): r for r in base["resultados"]}
+    lentas = []
+    for r in actual["resultados"]:
+        p = previos.get(clave(r))
+        if p is None or r["segundos_mediana"] is None or p["segundos_mediana"] is None:
+            continue
+        if r["segundos_mediana"] > max(p["segundos_mediana"], minimo_s) * tolerancia:
+            lentas.append({**r, "base_mediana": p["segundos_mediana"], "factor": r["segundos_mediana"] / p["segundos_mediana"]})
+    return lentas
+
+
+def _imprimir(filas):
+    for r in filas:
+        tiempo = "omitida" if r["segundos_mediana"] is None else f"{r['segundos_mediana'] * 1000:10.2f} ms"
+        print(f"{r['topologia']:8} {r['ramas']:>7} ramas  {r['etapa']:14} {tiempo}", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Suite de rendimiento sobre redes sintéticas.")
+    parser.add_argument("--topologias", nargs="+", choices=generador_red.TOPOLOGIAS, default=generador_red.TOPOLOGIAS)
+    parser.add_argument("--tamanos", nargs="+", type=int, default=TAMANOS, help="cantidades de ramas")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument(
+        "--limite", nargs="*", default=[], metavar="ETAPA=RAMAS",
+        help="omite la etapa por encima de RAMAS ramas (p. ej. infeed=100000 para medirla siempre)"
+    )
+    parser.add_argument("--salida", help="archivo JSON de resultados (predeterminado: salida estándar)")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=1.5)
+    args = parser.parse_args(argv)
+    limites = dict(LIMITES)
+    for limite in args.limite:
+        etapa, _, ramas = limite.partition("=")
+        if etapa not in ETAPAS or not ramas.isdigit():
+            parser.error(f"límite inválido ({limite!r}); use ETAPA=RAMAS con ETAPA en {ETAPAS}")
+        limites[etapa] = int(ramas)
+
+    resultado = ejecutar(
+        args.topologias, args.tamanos, args.repeticiones, args.semilla, limites,
+        progreso=_imprimir if args.salida else None
+    )
+    texto = json.dumps(resultado, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as flujo:
+            flujo.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as flujo:
+            lentas = regresiones(resultado, json.load(flujo), args.tolerancia)
+        for r in lentas:
+            print(
+                f"REGRESIÓN {r['topologia']} {r['ramas']} ramas {r['etapa']}: "
+                f"{r['base_mediana'] * 1000:.2f} -> {r['segundos_mediana'] * 1000:.2f} ms (x{r['factor']:.2f})",
+                file=sys.stderr
+            )
+        return 1 if lentas else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
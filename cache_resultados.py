@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# ------------------------------------------------------------------------------------------------
+# Huella canónica (sha256) de topología y parámetros eléctricos
+# ------------------------------------------------------------------------------------------------
+def _canonico(valor):
+    if isinstance(valor, complex):
+        return ["__c", valor.real, valor.imag]
+    if isinstance(valor, (set, frozenset)):
+        return sorted((_canonico(v) for v in valor), key=repr)
+    if isinstance(valor, np.generic):
+        return _canonico(valor.item())
+    raise TypeError(f"Tipo no soportado en la huella: {type(valor).__name__}")
+
+
+def huella(*partes):
+    h = hashlib.sha256()
+    for parte in partes:
+        if isinstance(parte, np.ndarray):
+            h.update(str((parte.dtype.str, parte.shape)).encode())
+            h.update(np.ascontiguousarray(parte).tobytes())
+        else:
+            h.update(json.dumps(parte, sort_keys=True, separators=(",", ":"), default=_canonico).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# ------------------------------------------------------------------------------------------------
+# Caché LRU acotada, segura entre hilos (sesiones de Streamlit), con nivel opcional en disco
+# ------------------------------------------------------------------------------------------------
+class CacheLRU:
+    def __init__(self, max_elementos=128, directorio=None, max_archivos=1024):
+        self.max_elementos = max_elementos
+        self.directorio = directorio
+        self.max_archivos = max_archivos
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self._archivos = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._archivos = len(self._listar_disco())
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.pkl")
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return self._datos[clave]
+
+        if self.directorio:
+            ruta = self._ruta(clave)
+            try:
+                with open(ruta, "rb") as f:
+                    valor = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                # La fecha de modificación marca el último uso (orden de la poda)
+                try:
+                    os.utime(ruta)
+                except OSError:
+                    pass
+                # Promover al nivel en memoria
+                self._guardar_memoria(clave, valor)
+                with self._lock:
+                    self.aciertos += 1
+                return valor
+
+        with self._lock:
+            self.fallos += 1
+        return defecto
+
+    def guardar(self, clave, valor):
+        self._guardar_memoria(clave, valor)
+        if self.directorio:
+            self._guardar_disco(clave, valor)
+
+    def _guardar_memoria(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_elementos:
+                self._datos.popitem(last=False)
+
+    def _guardar_disco(self, clave, valor):
+        # Escritura atómica: otro proceso nunca ve un archivo a medio escribir
+        ruta = self._ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        nuevo = not os.path.exists(ruta)
+        try:
+            with open(temporal, "wb") as f:
+                pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, ruta)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        with self._lock:
+            self._archivos += nuevo
+            podar = self._archivos > self.max_archivos
+        if podar:
+            self._podar_disco()
+
+    def _listar_disco(self):
+        try:
+            return [e for e in os.scandir(self.directorio) if e.name.endswith(".pkl")]
+        except OSError:
+            return []
+
+    # Elimina los archivos menos usados recientemente (por fecha de modificación, que obtener()
+    # actualiza en cada acierto). Solo se recorre el directorio cuando la cuenta de archivos supera
+    # max_archivos, y se deja un 10 % de holgura para no volver a recorrerlo en cada escritura.
+    def _podar_disco(self):
+        archivos = []
+        for entrada in self._listar_disco():
+            try:
+                archivos.append((entrada.stat().st_mtime, entrada.path))
+            except OSError:
+                pass
+        conservar = self.max_archivos - max(1, self.max_archivos // 10)
+        archivos.sort()
+        borrados = 0
+        for _, ruta in archivos[:max(0, len(archivos) - conservar)]:
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._archivos = len(archivos) - borrados
+
+    def obtener_o_calcular(self, clave, funcion, *args, **kwargs):
+        centinela = object()
+        valor = self.obtener(clave, centinela)
+        if valor is centinela:
+            valor = funcion(*args, **kwargs)
+            self.guardar(clave, valor)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+# Caché compartida por todas las sesiones del proceso. El nivel en disco se activa con
+# la variable de entorno PROTEC21_CACHE_DIR.
+CACHE = CacheLRU(
+    max_elementos=int(os.environ.get("PROTEC21_CACHE_MAX", "256")),
+    directorio=os.environ.get("PROTEC21_CACHE_DIR") or None,
+)
@@ -0,0 +1,199 @@
+import mmap
+import os
+
+import numpy as np
+
+# Muestras por bloque entregado por los lectores
+TAM_BLOQUE = 65536
+
+# Tipo de dato de los valores analógicos según el formato del archivo .dat
+TIPOS_BINARIOS = {"BINARY": "<i2", "BINARY32": "<i4", "FLOAT32": "<f4"}
+
+
+# ------------------------------------------------------------------------------------------------
+# Archivo de configuración (.cfg), revisiones 1991 y 1999/2013
+# ------------------------------------------------------------------------------------------------
+def _campos(linea):
+    return [c.strip() for c in linea.split(",")]
+
+
+def _numero(texto, defecto=0.0):
+    try:
+        return float(texto)
+    except (TypeError, ValueError):
+        return defecto
+
+
+def leer_cfg(flujo):
+    if isinstance(flujo, (str, os.PathLike)):
+        with open(flujo, encoding="utf-8", errors="replace") as f:
+            return leer_cfg(f)
+
+    lineas = [l.rstrip("\r\n") for l in flujo if l.strip()]
+    if len(lineas) < 2:
+        raise ValueError("archivo .cfg incompleto")
+    try:
+        cabecera = _campos(lineas[0])
+        revision = cabecera[2] if len(cabecera) > 2 else "1991"
+        totales = _campos(lineas[1])
+        n_analogicos = int(totales[1].rstrip("Aa"))
+        n_digitales = int(totales[2].rstrip("Dd"))
+
+        analogicos = []
+        for linea in lineas[2:2 + n_analogicos]:
+            c = _campos(linea) + [""] * 13
+            analogicos.append({
+                "indice": int(c[0]), "nombre": c[1], "fase": c[2], "circuito": c[3], "unidad": c[4],
+                "a": _numero(c[5], 1.0), "b": _numero(c[6]), "desfase": _numero(c[7]),
+                "primario": _numero(c[10], 1.0), "secundario": _numero(c[11], 1.0), "ps": (c[12] or "P").upper(),
+            })
+        pos = 2 + n_analogicos
+        digitales = [_campos(l)[1] for l in lineas[pos:pos + n_digitales]]
+        pos += n_digitales
+
+        frecuencia = _numero(lineas[pos], 60.0)
+        n_tasas = int(_numero(lineas[pos + 1]))
+        tasas = []
+        for linea in lineas[pos + 2:pos + 2 + max(n_tasas, 1)]:
+            c = _campos(linea)
+            tasas.append((_numero(c[0]), int(_numero(c[1]))))
+        pos += 2 + max(n_tasas, 1)
+        inicio, disparo = lineas[pos], lineas[pos + 1]
+        formato = lineas[pos + 2].strip().upper() if len(lineas) > pos + 2 else "ASCII"
+        multiplicador = _numero(lineas[pos + 3], 1.0) if len(lineas) > pos + 3 else 1.0
+    except (IndexError, ValueError) as e:
+        raise ValueError(f"archivo .cfg inválido: {e}")
+
+    if formato not in ("ASCII", *TIPOS_BINARIOS):
+        raise ValueError(f"formato de datos no soportado ({formato})")
+    return {
+        "estacion": cabecera[0],
+        "revision": revision,
+        "analogicos": analogicos,
+        "digitales": digitales,
+        "frecuencia": frecuencia,
+        "tasas": tasas,
+        "inicio": inicio,
+        "disparo": disparo,
+        "formato": formato,
+        "multiplicador_tiempo": multiplicador,
+    }
+
+
+def nombres_analogicos(cfg):
+    return [c["nombre"] or f"A{c['indice']}" for c in cfg["analogicos"]]
+
+
+# Frecuencia de muestreo (Hz) del registro; se exige una tasa única para el DFT
+def frecuencia_muestreo(cfg):
+    tasas = [t for t, _ in cfg["tasas"] if t > 0]
+    if not tasas:
+        raise ValueError("el registro no declara la frecuencia de muestreo")
+    if len(set(tasas)) > 1:
+        raise ValueError("registros con varias tasas de muestreo no están soportados")
+    return tasas[0]
+
+
+def _escala(cfg, canales):
+    a = np.array([cfg["analogicos"][c]["a"] for c in canales])
+    b = np.array([cfg["analogicos"][c]["b"] for c in canales])
+    return a, b
+
+
+# ------------------------------------------------------------------------------------------------
+# Lectura del archivo de datos (.dat) por bloques, mapeado en memoria.
+# Cada bloque es (t, valores): t en segundos (n,) y valores escalados (n, len(canales)).
+# ------------------------------------------------------------------------------------------------
+def bloques(cfg, ruta_dat, canales=None, tam_bloque=TAM_BLOQUE):
+    canales = list(range(len(cfg["analogicos"]))) if canales is None else list(canales)
+    if cfg["formato"] == "ASCII":
+        yield from _bloques_ascii(cfg, ruta_dat, canales, tam_bloque)
+    else:
+        yield from _bloques_binarios(cfg, ruta_dat, canales, tam_bloque)
+
+
+def _tiempo(cfg, n_muestra, marca):
+    tasas = [t for t, _ in cfg["tasas"] if t > 0]
+    if tasas:
+        return (n_muestra - 1) / tasas[0]
+    return marca * cfg["multiplicador_tiempo"] * 1e-6
+
+
+def _bloques_binarios(cfg, ruta_dat, canales, tam_bloque):
+    n_a = len(cfg["analogicos"])
+    n_palabras = -(-len(cfg["digitales"]) // 16)
+    tipo = np.dtype([
+        ("n", "<u4"), ("marca", "<u4"),
+        ("analogicos", TIPOS_BINARIOS[cfg["formato"]], (n_a,)),
+        ("digitales", "<u2", (n_palabras,)),
+    ])
+    if os.path.getsize(ruta_dat) < tipo.itemsize:
+        return
+    datos = np.memmap(ruta_dat, dtype=tipo, mode="r", shape=(os.path.getsize(ruta_dat) // tipo.itemsize,))
+    a, b = _escala(cfg, canales)
+    for inicio in range(0, len(datos), tam_bloque):
+        bloque = datos[inicio:inicio + tam_bloque]
+        valores = bloque["analogicos"][:, canales].astype(np.float64) * a + b
+        yield _tiempo(cfg, bloque["n"].astype(np.float64), bloque["marca"].astype(np.float64)), valores
+    del datos
+
+
+def _bloques_ascii(cfg, ruta_dat, canales, tam_bloque):
+    n_columnas = 2 + len(cfg["analogicos"]) + len(cfg["digitales"])
+    columnas = [2 + c for c in canales]
+    a, b = _escala(cfg, canales)
+    with open(ruta_dat, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            # Bloques de bytes cortados en fin de línea (~tam_bloque muestras cada uno)
+            ancho_linea = max(1, datos.find(b"\n") + 1)
+            pos = 0
+            while pos < len(datos):
+                fin = datos.find(b"\n", min(pos + tam_bloque * ancho_linea, len(datos)) - 1)
+                fin = len(datos) if fin < 0 else fin + 1
+                texto = datos[pos:fin].replace(b"\r", b"").strip()
+                pos = fin
+                if not texto:
+                    continue
+                valores = np.array(texto.replace(b"\n", b",").split(b","), dtype=np.float64)
+                if valores.size % n_columnas:
+                    raise ValueError("cantidad de columnas del .dat distinta a la declarada en el .cfg")
+                valores = valores.reshape(-1, n_columnas)
+                yield _tiempo(cfg, valores[:, 0], valores[:, 1]), valores[:, columnas] * a + b
+
+
+# ------------------------------------------------------------------------------------------------
+# Escritura (registros sintéticos y pruebas)
+# ------------------------------------------------------------------------------------------------
+def escribir_comtrade(ruta_base, t, valores, nombres, unidades, frecuencia=60.0, formato="BINARY",
+                      estacion="PROTEC21"):
+    valores = np.asarray(valores, dtype=np.float64)
+    n, n_a = valores.shape
+    fs = (n - 1) / (t[-1] - t[0]) if n > 1 else 0.0
+    if formato == "FLOAT32":
+        a = np.ones(n_a)
+    else:
+        rango = np.abs(valores).max(axis=0)
+        a = np.where(rango > 0, rango / (32767 if formato in ("BINARY", "ASCII") else 2 ** 31 - 1), 1.0)
+
+    with open(f"{ruta_base}.cfg", "w", encoding="utf-8") as f:
+        f.write(f"{estacion},1,1999\n{n_a},{n_a}A,0D\n")
+        for i, (nombre, unidad) in enumerate(zip(nombres, unidades), start=1):
+            f.write(f"{i},{nombre},,,{unidad},{a[i - 1]:.9g},0,0,-32767,32767,1,1,P\n")
+        f.write(f"{frecuencia:g}\n1\n{fs:.6f},{n}\n01/01/2000,00:00:00.000000\n01/01/2000,00:00:00.000000\n")
+        f.write(f"{formato}\n1\n")
+
+    marcas = np.round((np.asarray(t) - t[0]) * 1e6).astype(np.int64)
+    crudos = valores / a if formato != "FLOAT32" else valores
+    if formato == "ASCII":
+        with open(f"{ruta_base}.dat", "w", encoding="ascii") as f:
+            for i in range(n):
+                f.write(f"{i + 1},{marcas[i]}," + ",".join(str(int(round(v))) for v in crudos[i]) + "\n")
+        return
+    tipo = np.dtype([("n", "<u4"), ("marca", "<u4"), ("analogicos", TIPOS_BINARIOS[formato], (n_a,))])
+    registros = np.zeros(n, dtype=tipo)
+    registros["n"] = np.arange(1, n + 1)
+    registros["marca"] = marcas
+    registros["analogicos"] = np.round(crudos) if formato != "FLOAT32" else crudos
+    registros.tofile(f"{ruta_base}.dat")
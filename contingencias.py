@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import coordinacion
+import cortocircuito
+
+# Magnitudes que se siguen en el barrido (módulo de los alcances y factores de infeed)
+METRICAS = ["z2", "z3", "k_infeed", "k_infeed_z3"]
+# Contingencias por tarea enviada a un proceso
+TAM_LOTE = 64
+
+
+# ------------------------------------------------------------------------------------------------
+# Estado de trabajo del barrido N-1. Se construye una vez por proceso (inicializador del pool):
+# la red base, sus zonas y, si hay fuentes, la factorización LU de Ybus y las fallas base.
+# ------------------------------------------------------------------------------------------------
+_ESTADO = None
+
+
+def _preparar(indice, porcentaje_z1, config_falla):
+    rama_rele, sentido = coordinacion.reles_de_red(indice)
+    base = coordinacion.calcular_zonas(indice, porcentaje_z1, rama_rele, sentido)
+    estado = {
+        "indice": indice,
+        "porcentaje_z1": porcentaje_z1,
+        "rama_rele": rama_rele,
+        "sentido": sentido,
+        "base": base,
+        "fallas": None,
+    }
+    if config_falla:
+        fallas = cortocircuito.fallas_trifasicas(indice, **config_falla)
+        Y, posicion, y, activa = cortocircuito.matriz_admitancia(
+            indice, config_falla["fuentes"], config_falla.get("ajuste_impedancia", 1.0)
+        )
+        estado.update({
+            "fallas": fallas,
+            "lu": cortocircuito.factorizar(Y) if Y.shape[0] else None,
+            "posicion": posicion,
+            "y": y,
+            "activa": activa,
+            "e": config_falla["tension_kv"] * 1e3 / np.sqrt(3),
+        })
+        estado["base"] = cortocircuito.aplicar_infeed(base, indice, fallas)
+    return estado
+
+
+def _inicializar(indice, porcentaje_z1, config_falla):
+    global _ESTADO
+    _ESTADO = _preparar(indice, porcentaje_z1, config_falla)
+
+
+# ------------------------------------------------------------------------------------------------
+# Fallas con la rama c fuera de servicio, sin refactorizar (Sherman-Morrison):
+#   Y' = Y - y_c a aᵀ,  a = e_o - e_d,  w = Zbus a
+#   Zbus' = Zbus + f w wᵀ,  f = y_c / (1 - y_c (w_o - w_d))
+# Si la rama deja una isla sin fuente (denominador nulo), la isla queda desenergizada y el resto
+# de Zbus no cambia.
+# ------------------------------------------------------------------------------------------------
+def _fallas_sin_rama(estado, c):
+    indice, fallas = estado["indice"], estado["fallas"]
+    o, d = indice["origen"], indice["destino"]
+    posicion, y, e = estado["posicion"], estado["y"], estado["e"]
+    if not estado["activa"][c]:
+        return fallas
+
+    po, pd = posicion[o[c]], posicion[d[c]]
+    rhs = np.zeros(estado["lu"].shape[0], dtype=np.complex128)
+    rhs[po] = 1
+    rhs[pd] -= 1
+    w_energizado = estado["lu"].solve(rhs)
+    w = np.zeros(len(posicion), dtype=np.complex128)
+    w[posicion >= 0] = w_energizado
+
+    y_rama = y * estado["activa"]
+    y_rama[c] = 0
+    energizado = fallas["energizado"].copy()
+    aw = y[c] * (w[o[c]] - w[d[c]])
+    den = 1 - aw
+    if abs(den) <= 1e-9 * max(1.0, abs(aw)):
+        isla = np.abs(w) > 1e-9 * np.abs(w).max()
+        energizado &= ~isla
+        zth = np.where(energizado, fallas["zth"], 0)
+        z_rama = fallas["z_rama"]
+        y_rama = y_rama * (energizado[o] & energizado[d])
+    else:
+        f = y[c] / den
+        zth = fallas["zth"] + f * w * w
+        z_rama = fallas["z_rama"] + f * w[o] * w[d]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        i_en_destino = np.where(y_rama != 0, e * (1 - z_rama / zth[d]) * y_rama, 0)
+        i_en_origen = np.where(y_rama != 0, e * (1 - z_rama / zth[o]) * y_rama, 0)
+        i_falla = np.where(zth != 0, e / zth, 0)
+    return {
+        "zth": zth,
+        "z_rama": z_rama,
+        "i_falla": i_falla,
+        "i_en_origen": i_en_origen,
+        "i_en_destino": i_en_destino,
+        "energizado": energizado,
+    }
+
+
+# Zonas de todos los relés con la rama c fuera de servicio.
+# Solo se recalculan los relés con un extremo en los nodos de c; el infeed (si hay fuentes) cambia
+# en toda la red y se recalcula para todos con las fallas actualizadas.
+def zonas_sin_rama(estado, c):
+    indice, base = estado["indice"], estado["base"]
+    o, d = indice["origen"], indice["destino"]
+    tiene_param = indice["tiene_param"].copy()
+    tiene_param[c] = False
+    indice_c = dict(indice, tiene_param=tiene_param)
+
+    extremos = (o[c], d[c])
+    afectado = np.isin(base["nodo_rele"], extremos) | np.isin(base["nodo_remoto"], extremos)
+    afectado &= estado["rama_rele"] != c
+    resultado = dict(base)
+    sel = np.flatnonzero(afectado)
+    if sel.size:
+        parcial = coordinacion.calcular_zonas(
+            indice_c, estado["porcentaje_z1"], estado["rama_rele"][sel], estado["sentido"][sel]
+        )
+        for clave, valor in parcial.items():
+            if isinstance(valor, np.ndarray) and clave in base:
+                completo = np.array(base[clave], copy=True)
+                completo[sel] = valor
+                resultado[clave] = completo
+
+    if estado["fallas"] is not None:
+        resultado = cortocircuito.aplicar_infeed(resultado, indice_c, _fallas_sin_rama(estado, c))
+    return resultado, afectado
+
+
+def _metricas(resultado):
+    return np.stack([np.abs(resultado[m]) for m in METRICAS])
+
+
+# Extremos por relé (mínimo, máximo y contingencia de mayor desviación) de un lote de contingencias
+def _evaluar_lote(contingencias, estado=None):
+    estado = estado or _ESTADO
+    base = _metricas(estado["base"])
+    minimo, maximo = base.copy(), base.copy()
+    peor_desvio = np.zeros_like(base)
+    peor_caso = np.full(base.shape, -1, dtype=np.int64)
+    casos = np.zeros(base.shape[1], dtype=np.int64)
+
+    with np.errstate(invalid="ignore"):
+        for c in contingencias:
+            resultado, _ = zonas_sin_rama(estado, c)
+            valores = _metricas(resultado)
+            valido = estado["rama_rele"] != c
+            casos += valido
+            valores = np.where(valido, valores, base)
+            minimo = np.fmin(minimo, valores)
+            maximo = np.fmax(maximo, valores)
+            desvio = np.abs(valores - base)
+            desvio = np.where(np.isfinite(desvio), desvio, np.where(valores != base, np.inf, 0))
+            mejora = desvio > peor_desvio
+            peor_desvio = np.where(mejora, desvio, peor_desvio)
+            peor_caso = np.where(mejora, c, peor_caso)
+    return minimo, maximo, peor_desvio, peor_caso, casos
+
+
+def _combinar(acumulado, parcial):
+    if acumulado is None:
+        return parcial
+    minimo, maximo, desvio, caso, casos = acumulado
+    p_min, p_max, p_desvio, p_caso, p_casos = parcial
+    mejora = p_desvio > desvio
+    return (
+        np.fmin(minimo, p_min), np.fmax(maximo, p_max),
+        np.where(mejora, p_desvio, desvio), np.where(mejora, p_caso, caso), casos + p_casos,
+    )
+
+
+# ------------------------------------------------------------------------------------------------
+# Barrido N-1: cada línea o transformador con parámetros sale de servicio por turno.
+# Con procesos > 1 los lotes se reparten en un pool; cada proceso factoriza la red una sola vez.
+# ------------------------------------------------------------------------------------------------
+def barrido_n1(indice, porcentaje_z1=85, config_falla=None, procesos=None, tam_lote=TAM_LOTE,
+               contingencias=None, progreso=None):
+    if contingencias is None:
+        contingencias = np.flatnonzero(indice["tiene_param"])
+    contingencias = np.asarray(contingencias, dtype=np.int64)
+    lotes = [contingencias[i:i + tam_lote] for i in range(0, len(contingencias), tam_lote)]
+    procesos = procesos or min(os.cpu_count() or 1, max(1, len(lotes)))
+
+    estado = _preparar(indice, porcentaje_z1, config_falla)
+    acumulado = None
+    if procesos <= 1 or len(lotes) <= 1:
+        for n, lote in enumerate(lotes, start=1):
+            acumulado = _combinar(acumulado, _evaluar_lote(lote, estado))
+            if progreso:
+                progreso(n, len(lotes))
+    else:
+        # "spawn": no se heredan hilos ni estado del servidor de Streamlit
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_inicializar,
+            initargs=(indice, porcentaje_z1, config_falla),
+        ) as pool:
+            try:
+                for n, parcial in enumerate(pool.map(_evaluar_lote, lotes), start=1):
+                    acumulado = _combinar(acumulado, parcial)
+                    if progreso:
+                        progreso(n, len(lotes))
+            except BaseException:
+                # Interrupción (p. ej. trabajo cancelado desde progreso): los lotes en cola no se ejecutan
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    return tabla_peor_caso(estado, acumulado)
+
+
+def tabla_peor_caso(estado, acumulado):
+    indice, base = estado["indice"], estado["base"]
+    nodos = indice["nodos"]
+    rama = estado["rama_rele"]
+    tabla = {
+        "rele": [indice["clave"][r] for r in rama],
+        "extremo": list(base["extremo"]),
+        "nodo_rele": [nodos[n] for n in base["nodo_rele"]],
+        "nodo_remoto": [nodos[n] for n in base["nodo_remoto"]],
+    }
+    valores_base = _metricas(base)
+    if acumulado is None:
+        minimo = maximo = valores_base
+        caso = np.full(valores_base.shape, -1)
+        casos = np.zeros(len(rama), dtype=np.int64)
+    else:
+        minimo, maximo, _, caso, casos = acumulado
+    tabla["casos"] = casos
+    for i, metrica in enumerate(METRICAS):
+        tabla[f"{metrica}_base"] = valores_base[i]
+        tabla[f"{metrica}_min"] = minimo[i]
+        tabla[f"{metrica}_max"] = maximo[i]
+        tabla[f"{metrica}_peor_caso"] = [
+            f"{indice['clave'][c]} ({'trafo' if indice['tipo'][c] == coordinacion.TRAFO else 'línea'})" if c >= 0 else ""
+            for c in caso[i]
+        ]
+    return tabla
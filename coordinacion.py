@@ -0,0 +1,385 @@
+import csv
+import io
+
+import numpy as np
+
+import modelo_red
+import perfilador
+import zonas
+from cache_resultados import CACHE, huella
+
+# Códigos de tipo de rama (los del modelo de red)
+LINEA = modelo_red.LINEA
+TRAFO = modelo_red.TRAFO
+
+
+# ------------------------------------------------------------------------------------------------
+# Índice de adyacencia de la red: nodo -> ramas incidentes (líneas y transformadores)
+# Se construye una sola vez por topología del modelo; los parámetros se copian aparte.
+# Las ramas incompletas y las líneas que coinciden con un trafo (igual que en el Paso 4) se
+# omiten; las ramas paralelas se distinguen en "clave" con un sufijo #2, #3...
+# ------------------------------------------------------------------------------------------------
+def indice_desde_modelo(red):
+    o_m, d_m, t_m = red["origen"], red["destino"], red["tipo"]
+    n_nodos = len(red["nodos"])
+    completa = (o_m >= 0) & (d_m >= 0)
+    es_linea = t_m == LINEA
+    par = np.minimum(o_m, d_m).astype(np.int64) * max(n_nodos, 1) + np.maximum(o_m, d_m)
+    con_trafo = np.isin(par, par[completa & ~es_linea])
+    incluida = completa & ~(es_linea & con_trafo)
+    filas = np.concatenate([np.flatnonzero(incluida & es_linea), np.flatnonzero(incluida & ~es_linea)])
+
+    # Nodos compactados en orden de aparición (origen, destino de cada rama)
+    extremos = np.column_stack([o_m[filas], d_m[filas]]).ravel()
+    unicos, primera = np.unique(extremos, return_index=True)
+    usados = unicos[np.argsort(primera)]
+    mapa = np.full(n_nodos, -1, dtype=np.int64)
+    mapa[usados] = np.arange(len(usados))
+    nodos = [red["nodos"][n] for n in usados]
+
+    origen, destino = mapa[o_m[filas]], mapa[d_m[filas]]
+    vistas = {}
+    claves = []
+    for o, d in zip(origen, destino):
+        clave = f"{nodos[o]}_{nodos[d]}"
+        vistas[clave] = vistas.get(clave, 0) + 1
+        claves.append(clave if vistas[clave] == 1 else f"{clave}#{vistas[clave]}")
+
+    posicion_linea = np.cumsum(es_linea) - 1
+    rama_de_linea = np.full(int(es_linea.sum()), -1, dtype=np.int64)
+    n_lineas_incluidas = int((incluida & es_linea).sum())
+    rama_de_linea[posicion_linea[filas[:n_lineas_incluidas]]] = np.arange(n_lineas_incluidas)
+
+    n_ramas = len(filas)
+    indice = {
+        "firma": huella("topologia", red["id"][filas], origen, destino, t_m[filas], nodos),
+        "version": red["version"],
+        "nodos": nodos,
+        "nodo_id": {n: i for i, n in enumerate(nodos)},
+        "origen": origen,
+        "destino": destino,
+        "tipo": t_m[filas].astype(np.int8),
+        "linea_idx": np.where(es_linea[filas], posicion_linea[filas], -1).astype(np.int64),
+        "clave": claves,
+        "rama_de_linea": rama_de_linea,
+        # Rama del modelo (posición e id estable) de cada rama del índice
+        "fila_modelo": filas,
+        "id": red["id"][filas],
+        # Parámetros eléctricos precalculados (se copian con parametros_desde_modelo)
+        "z": np.zeros(n_ramas, dtype=np.complex128),
+        "i_mag": np.zeros(n_ramas, dtype=np.float64),
+        "i_ang": np.zeros(n_ramas, dtype=np.float64),
+        "tiene_param": np.zeros(n_ramas, dtype=bool),
+    }
+    indice["ptr"], indice["inc"] = _incidencia(indice)
+    return parametros_desde_modelo(indice, red)
+
+
+# Copia Z e I de cortocircuito del modelo al índice, en el lugar y sin tocar la topología
+def parametros_desde_modelo(indice, red):
+    filas = indice["fila_modelo"]
+    indice["z"][:] = red["z"][filas]
+    indice["i_mag"][:] = np.abs(red["icc"][filas])
+    indice["i_ang"][:] = np.degrees(np.angle(red["icc"][filas]))
+    indice["tiene_param"][:] = red["tiene_param"][filas]
+    return indice
+
+
+# Incidencia nodo -> ramas en formato CSR (los lazos propios se cuentan una sola vez)
+def _incidencia(indice):
+    n_nodos = len(indice["nodos"])
+    o = indice["origen"]
+    d = indice["destino"]
+    b = np.arange(len(o))
+    distinto = o != d
+    extremos = np.concatenate([o, d[distinto]])
+    rama_de = np.concatenate([b, b[distinto]])
+    orden = np.argsort(extremos, kind="stable")
+    ptr = np.zeros(n_nodos + 1, dtype=np.int64)
+    np.cumsum(np.bincount(extremos, minlength=n_nodos), out=ptr[1:])
+    return ptr, rama_de[orden]
+
+
+# Expande cada relé en los pares (relé, rama incidente al nodo indicado)
+def _pares(ptr, inc, nodo_rele):
+    cuentas = ptr[nodo_rele + 1] - ptr[nodo_rele]
+    rele = np.repeat(np.arange(len(nodo_rele)), cuentas)
+    inicio = np.repeat(ptr[nodo_rele] - np.cumsum(cuentas) + cuentas, cuentas)
+    return rele, inc[inicio + np.arange(cuentas.sum())]
+
+
+# Índice del par con menor valor en cada grupo (-1 si el grupo queda vacío).
+# El orden estable reproduce el desempate de min()/max() de Python.
+def _argmin_por_grupo(grupo, valores, mascara, n_grupos):
+    sel = np.flatnonzero(mascara)
+    mejor = np.full(n_grupos, -1, dtype=np.int64)
+    if sel.size:
+        orden = sel[np.lexsort((valores[sel], grupo[sel]))]
+        grupos, primero = np.unique(grupo[orden], return_index=True)
+        mejor[grupos] = orden[primero]
+    return mejor
+
+
+def _tomar(valores, idx, defecto):
+    out = np.full(idx.shape, defecto, dtype=valores.dtype)
+    ok = idx >= 0
+    out[ok] = valores[idx[ok]]
+    return out
+
+
+# R_Arco para un arreglo de impedancias: alcance del mho con ángulo theta cuyo borde pasa por z
+def calcular_r_arco(z, theta_rad):
+    return zonas.mho_por_punto(z, theta_rad)["alcance"]
+
+
+# ------------------------------------------------------------------------------------------------
+# Coordinación de relés (uno en cada extremo de cada línea) en una sola pasada vectorizada
+# ------------------------------------------------------------------------------------------------
+# Relés de toda la red: sentido 0 = extremo origen (mira al destino), 1 = extremo destino
+def reles_de_red(indice):
+    lineas = np.flatnonzero((indice["tipo"] == LINEA) & indice["tiene_param"])
+    return np.concatenate([lineas, lineas]), np.repeat(np.array([0, 1], dtype=np.int8), len(lineas))
+
+
+def agregar_r_arco(resultado, theta_deg):
+    resultado = dict(resultado)
+    r_arco = calcular_r_arco(
+        np.stack([resultado["z1"], resultado["z2"], resultado["z3"], resultado["z4"]]), np.radians(theta_deg)
+    )
+    for i in range(4):
+        resultado[f"r_arco_z{i + 1}"] = r_arco[i]
+    return resultado
+
+
+@perfilador.medido("zonas")
+def calcular_zonas(indice, porcentaje_z1=85, rama_rele=None, sentido=None, factores=None):
+    if rama_rele is None:
+        rama_rele, sentido = reles_de_red(indice)
+    rama_rele = np.asarray(rama_rele, dtype=np.int64)
+    sentido = np.asarray(sentido, dtype=np.int8)
+    # Los alcances "infinitos" (sin trafo) generan inf/nan al operar; se toleran igual que en el Paso 5
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        return _calcular_zonas(indice, porcentaje_z1, rama_rele, sentido, factores)
+
+
+# Factores de ajuste de los alcances (criterios del Paso 5)
+FACTORES_ZONA = {
+    "z2": 1.2,            # Z2 mínima: factor sobre la línea protegida
+    "z2_adyacente": 0.5,  # Z2 media/máxima: fracción de la línea o trafo adyacente más corto
+    "z3": 1.2,            # Z3_1: factor sobre línea protegida + línea adyacente más larga
+    "z3_siguiente": 1.25, # Z3_2: factor sobre la línea adyacente más larga
+    "z3_trafo": 0.8,      # Z3_3: factor sobre el trafo adyacente de mayor impedancia
+    "z4": 0.2,            # Z4 (reversa): fracción de la rama local más corta
+}
+
+
+# ------------------------------------------------------------------------------------------------
+# Etapa topológica: ramas de referencia de cada relé (no depende de porcentajes ni factores)
+# ------------------------------------------------------------------------------------------------
+def _ramas_de_alcance(indice, rama_rele, sentido):
+    o_r, d_r, tipo, z = indice["origen"], indice["destino"], indice["tipo"], indice["z"]
+    con_param = indice["tiene_param"]
+    n = len(rama_rele)
+
+    nodo_a = np.where(sentido == 0, o_r[rama_rele], d_r[rama_rele])
+    nodo_b = np.where(sentido == 0, d_r[rama_rele], o_r[rama_rele])
+    ptr, inc = indice["ptr"], indice["inc"]
+
+    # --- Ramas incidentes al nodo remoto B ---
+    rel_b, ram_b = _pares(ptr, inc, nodo_b)
+    a_b, b_b = nodo_a[rel_b], nodo_b[rel_b]
+    misma_linea_b = ((o_r[ram_b] == a_b) & (d_r[ram_b] == b_b)) | ((o_r[ram_b] == b_b) & (d_r[ram_b] == a_b))
+    es_linea_b = (tipo[ram_b] == LINEA) & ~misma_linea_b & con_param[ram_b]
+    es_trafo_b = (tipo[ram_b] == TRAFO) & con_param[ram_b]
+    sale_de_b = (o_r[ram_b] == b_b) & con_param[ram_b]
+    mod_b = np.abs(z[ram_b])
+
+    # --- Ramas incidentes al nodo local A ---
+    rel_a, ram_a = _pares(ptr, inc, nodo_a)
+    a_a, b_a = nodo_a[rel_a], nodo_b[rel_a]
+    misma_linea_a = ((o_r[ram_a] == a_a) & (d_r[ram_a] == b_a)) | ((o_r[ram_a] == b_a) & (d_r[ram_a] == a_a))
+    mod_a = np.abs(z[ram_a])
+    es_linea_a = (tipo[ram_a] == LINEA) & ~misma_linea_a & (o_r[ram_a] == a_a) & con_param[ram_a]
+    es_trafo_a = (tipo[ram_a] == TRAFO) & con_param[ram_a]
+
+    return {
+        "nodo_a": nodo_a,
+        "nodo_b": nodo_b,
+        "z_linea": z[rama_rele],
+        "rel_b": rel_b,
+        "ram_b": ram_b,
+        "sale_de_b": sale_de_b,
+        # Z2: línea y trafo adyacentes más cortos; Z3: línea (que sale de B) y trafo más largos
+        "rama_min_linea": _tomar(ram_b, _argmin_por_grupo(rel_b, mod_b, es_linea_b, n), -1),
+        "rama_min_trafo": _tomar(ram_b, _argmin_por_grupo(rel_b, mod_b, es_trafo_b, n), -1),
+        "rama_may_linea": _tomar(ram_b, _argmin_por_grupo(rel_b, -mod_b, es_linea_b & sale_de_b, n), -1),
+        "rama_may_trafo": _tomar(ram_b, _argmin_por_grupo(rel_b, -mod_b, es_trafo_b, n), -1),
+        # Z4: línea y trafo locales más cortos
+        "rama_local_linea": _tomar(ram_a, _argmin_por_grupo(rel_a, mod_a, es_linea_a, n), -1),
+        "rama_local_trafo": _tomar(ram_a, _argmin_por_grupo(rel_a, mod_a, es_trafo_a, n), -1),
+    }
+
+
+# Menor módulo entre candidatos (a lo largo del eje 0), con el mismo desempate que np.argmin
+def _menor(candidatos):
+    candidatos = np.stack(np.broadcast_arrays(*candidatos))
+    eleccion = np.argmin(np.abs(candidatos), axis=0)
+    return np.take_along_axis(candidatos, eleccion[None], axis=0)[0], eleccion
+
+
+# ------------------------------------------------------------------------------------------------
+# Etapa de alcances: solo operaciones elemento a elemento. porcentaje_z1 y los factores pueden ser
+# arreglos con ejes extra delante del eje de relés (barridos de sensibilidad por broadcasting).
+# ------------------------------------------------------------------------------------------------
+def _alcances(indice, ramas, porcentaje_z1, factores=None):
+    f = {**FACTORES_ZONA, **(factores or {})}
+    z = indice["z"]
+    z_linea = ramas["z_linea"]
+
+    # Zona 1
+    z1 = (np.asarray(porcentaje_z1) / 100) * z_linea
+
+    # Zona 2
+    rama_min_linea, rama_min_trafo = ramas["rama_min_linea"], ramas["rama_min_trafo"]
+    z2_min = f["z2"] * z_linea
+    z2_med = np.where(rama_min_linea >= 0, z_linea + f["z2_adyacente"] * _tomar(z, rama_min_linea, 0), 0)
+    z2_max = np.where(rama_min_trafo >= 0, z_linea + f["z2_adyacente"] * _tomar(z, rama_min_trafo, 0), np.inf)
+    z2 = np.where(np.abs(z2_med) < np.abs(z2_min), z2_med,
+                  np.where(np.abs(z2_med) > np.abs(z2_max), z2_max, z2_min))
+
+    # Zona 3
+    z_mayor_linea = _tomar(z, ramas["rama_may_linea"], 0)
+    z_mayor_trafo = _tomar(z, ramas["rama_may_trafo"], 0)
+
+    z3_1 = f["z3"] * (z_linea + z_mayor_linea)
+    z3_2 = z_linea + f["z3_siguiente"] * z_mayor_linea
+    z3_3 = np.where(z_mayor_trafo != 0, z_linea + f["z3_trafo"] * z_mayor_trafo, np.inf)
+    z3, eleccion_z3 = _menor([z3_1, z3_2, z3_3])
+
+    # Zona 4
+    z4_1 = f["z4"] * _tomar(z, ramas["rama_local_linea"], 0)
+    z4_2 = f["z4"] * z_linea
+    z4_3 = f["z4"] * _tomar(z, ramas["rama_local_trafo"], 0)
+    candidatos_z4 = np.stack(np.broadcast_arrays(z4_1, z4_2, z4_3))
+    mod_z4 = np.where(candidatos_z4 != 0, np.abs(candidatos_z4), np.inf)
+    z4 = np.take_along_axis(candidatos_z4, np.argmin(mod_z4, axis=0)[None], axis=0)[0]
+
+    return {
+        "z1": z1,
+        "z2_min": z2_min,
+        "z2_med": z2_med,
+        "z2_max": z2_max,
+        "z2": z2,
+        "z3_1": z3_1,
+        "z3_2": z3_2,
+        "z3_3": z3_3,
+        "z3": z3,
+        "eleccion_z3": eleccion_z3,
+        "z4_1": z4_1,
+        "z4_2": z4_2,
+        "z4_3": z4_3,
+        "z4": z4,
+    }
+
+
+def _calcular_zonas(indice, porcentaje_z1, rama_rele, sentido, factores=None):
+    i_mag = indice["i_mag"]
+    n = len(rama_rele)
+    ramas = _ramas_de_alcance(indice, rama_rele, sentido)
+    alcances = _alcances(indice, ramas, porcentaje_z1, factores)
+    nodo_a, nodo_b, z_linea = ramas["nodo_a"], ramas["nodo_b"], ramas["z_linea"]
+    rel_b, ram_b, sale_de_b = ramas["rel_b"], ramas["ram_b"], ramas["sale_de_b"]
+    rama_min_linea, rama_min_trafo = ramas["rama_min_linea"], ramas["rama_min_trafo"]
+    rama_may_linea, rama_may_trafo = ramas["rama_may_linea"], ramas["rama_may_trafo"]
+    z2, z2_min, z2_max = alcances["z2"], alcances["z2_min"], alcances["z2_max"]
+    z3, eleccion_z3 = alcances["z3"], alcances["eleccion_z3"]
+
+    # Infeed: corrientes de las ramas que salen de B, excluyendo la rama usada en el alcance
+    ir = i_mag[rama_rele]
+    excl_z2 = np.where(z2 == z2_min, rama_min_linea, np.where(z2 == z2_max, rama_min_trafo, -1))
+    excl_z3 = np.where(eleccion_z3 == 2, rama_may_trafo, rama_may_linea)
+    aguas_abajo = sale_de_b & (ram_b != rama_rele[rel_b])
+    corriente_b = np.where(aguas_abajo, i_mag[ram_b], 0.0)
+    if_z2 = np.bincount(rel_b, weights=np.where(ram_b != excl_z2[rel_b], corriente_b, 0.0), minlength=n)
+    if_z3 = np.bincount(rel_b, weights=np.where(ram_b != excl_z3[rel_b], corriente_b, 0.0), minlength=n)
+    k_infeed = np.where(ir != 0, if_z2 / ir, 0.0)
+    k_infeed_z3 = np.where(ir != 0, if_z3 / ir, 0.0)
+
+    return {
+        "nodos": indice["nodos"],
+        "rama": rama_rele,
+        "linea_idx": indice["linea_idx"][rama_rele],
+        "sentido": sentido,
+        "extremo": np.where(sentido == 0, "origen", "destino"),
+        "nodo_rele": nodo_a,
+        "nodo_remoto": nodo_b,
+        "z_linea": z_linea,
+        **{k: v for k, v in alcances.items() if k != "eleccion_z3"},
+        # Ramas usadas en los alcances de Z2/Z3 (-1 si ninguna); se excluyen del infeed
+        "rama_z2": excl_z2,
+        "rama_z3": excl_z3,
+        "ir": ir,
+        "if_z2": if_z2,
+        "if_z3": if_z3,
+        "k_infeed": k_infeed,
+        "k_infeed_z3": k_infeed_z3,
+        "z2_infeed": z2 * (1 + k_infeed),
+        "z3_infeed": z3 * (1 + k_infeed_z3),
+    }
+
+
+# Copia independiente del índice: los cálculos en segundo plano no ven los cambios que la sesión
+# sigue haciendo sobre el original (parametros_desde_modelo lo actualiza en el lugar)
+def copiar_indice(indice):
+    return {k: v.copy() if isinstance(v, np.ndarray) else v for k, v in indice.items()}
+
+
+# Zonas de todos los relés memorizadas por la huella de topología + parámetros eléctricos.
+# El resultado se comparte (entre reruns y sesiones): no debe modificarse en el lugar.
+def zonas_red(indice, porcentaje_z1=85, cache=CACHE):
+    clave = huella(
+        "zonas", indice["firma"], indice["z"], indice["i_mag"], indice["tiene_param"], porcentaje_z1
+    )
+    return cache.obtener_o_calcular(clave, calcular_zonas, indice, porcentaje_z1)
+
+
+# Valores escalares de un relé dentro de un resultado por lotes
+def seleccionar_rele(resultado, rama, sentido=0):
+    fila = np.flatnonzero((resultado["rama"] == rama) & (resultado["sentido"] == sentido))
+    if not fila.size:
+        return None
+    i = fila[0]
+    return {k: (v[i] if isinstance(v, np.ndarray) else v) for k, v in resultado.items()}
+
+
+# Columnas complejas que se muestran como módulo/ángulo en la tabla
+COLUMNAS_TABLA = [
+    "z_linea", "z1", "z2_min", "z2_med", "z2_max", "z2", "z3", "z4",
+    "r_arco_z1", "r_arco_z2", "r_arco_z3", "r_arco_z4", "z2_infeed", "z3_infeed",
+]
+
+
+# Tabla por columnas (módulo en Ω y ángulo en grados) lista para st.dataframe o CSV
+def tabla_coordinacion(resultado):
+    nodos = np.array(resultado["nodos"], dtype=object)
+    tabla = {
+        "linea": resultado["linea_idx"] + 1,
+        "extremo": resultado["extremo"],
+        "rele_en": nodos[resultado["nodo_rele"]] if len(nodos) else resultado["nodo_rele"],
+        "hacia": nodos[resultado["nodo_remoto"]] if len(nodos) else resultado["nodo_remoto"],
+    }
+    for col in COLUMNAS_TABLA:
+        tabla[f"{col}_mod"] = np.abs(resultado[col])
+        tabla[f"{col}_ang"] = np.degrees(np.angle(resultado[col]))
+    tabla["k_infeed"] = resultado["k_infeed"]
+    tabla["k_infeed_z3"] = resultado["k_infeed_z3"]
+    return tabla
+
+
+def tabla_a_csv(tabla):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    columnas = list(tabla)
+    escritor.writerow(columnas)
+    escritor.writerows(zip(*(tabla[c] for c in columnas)))
+    return salida.getvalue()
@@ -0,0 +1,163 @@
+import numpy as np
+from scipy.sparse import coo_matrix, csc_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+import perfilador
+from cache_resultados import CACHE, huella
+
+# Columnas de Zbus resueltas por bloque (memoria ~ n_nodos * TAM_BLOQUE complejos)
+TAM_BLOQUE = 256
+
+
+# ------------------------------------------------------------------------------------------------
+# Matriz de admitancia nodal (Ybus) dispersa a partir de las impedancias de rama del índice.
+# Las fuentes se modelan como impedancias de Thévenin a tierra en su nodo.
+# Solo se incluyen los nodos conectados a alguna fuente (las islas sin fuente no aportan falla).
+# ------------------------------------------------------------------------------------------------
+def matriz_admitancia(indice, fuentes, ajuste_impedancia=1.0):
+    n = len(indice["nodos"])
+    o, d = indice["origen"], indice["destino"]
+    z = indice["z"] / (ajuste_impedancia or 1.0)
+
+    activa = indice["tiene_param"] & (z != 0) & (o != d)
+    y = np.zeros(len(z), dtype=np.complex128)
+    y[activa] = 1 / z[activa]
+
+    nodo_fuente = np.array(
+        [indice["nodo_id"][nodo] for nodo, zf in fuentes.items() if nodo in indice["nodo_id"] and zf != 0],
+        dtype=np.int64
+    )
+    y_fuente = np.array(
+        [1 / zf for nodo, zf in fuentes.items() if nodo in indice["nodo_id"] and zf != 0], dtype=np.complex128
+    )
+
+    # Nodos energizados: componentes conexos (por ramas activas) que contienen una fuente
+    conexion = coo_matrix((np.ones(activa.sum()), (o[activa], d[activa])), shape=(n, n))
+    _, componente = connected_components(conexion, directed=False)
+    energizado = np.isin(componente, componente[nodo_fuente])
+    seleccion = np.flatnonzero(energizado)
+    posicion = np.full(n, -1, dtype=np.int64)
+    posicion[seleccion] = np.arange(len(seleccion))
+
+    activa &= energizado[o]
+    oa, da, ya = posicion[o[activa]], posicion[d[activa]], y[activa]
+    filas = np.concatenate([oa, da, oa, da, posicion[nodo_fuente]])
+    columnas = np.concatenate([oa, da, da, oa, posicion[nodo_fuente]])
+    valores = np.concatenate([ya, ya, -ya, -ya, y_fuente])
+    k = len(seleccion)
+    Y = csc_matrix((valores, (filas, columnas)), shape=(k, k))
+    return Y, posicion, y, activa
+
+
+# Y es simétrica: ordenamiento de grado mínimo sobre A+Aᵀ y sin pivoteo fuera de la diagonal
+def factorizar(Y):
+    return splu(Y, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0, options={"SymmetricMode": True})
+
+
+# ------------------------------------------------------------------------------------------------
+# Falla trifásica franca en cada nodo con una sola factorización LU de Ybus.
+#   Zth[F] = Zbus[F, F],  I_falla[F] = E / Zth[F]
+#   Aporte de la rama x-F al nodo fallado: I = E * (1 - Zbus[x, F] / Zbus[F, F]) / z_b
+# fuentes: {nodo: Z de Thévenin (Ω primarios)}; tension_kv: tensión de línea prefalla.
+# ------------------------------------------------------------------------------------------------
+@perfilador.medido("fallas Zbus")
+def fallas_trifasicas(indice, fuentes, tension_kv, ajuste_impedancia=1.0, tam_bloque=TAM_BLOQUE):
+    n = len(indice["nodos"])
+    m = len(indice["origen"])
+    o, d = indice["origen"], indice["destino"]
+    e = tension_kv * 1e3 / np.sqrt(3)
+
+    zth = np.zeros(n, dtype=np.complex128)
+    z_rama = np.zeros(m, dtype=np.complex128)
+    i_en_origen = np.zeros(m, dtype=np.complex128)
+    i_en_destino = np.zeros(m, dtype=np.complex128)
+
+    Y, posicion, y, activa = matriz_admitancia(indice, fuentes, ajuste_impedancia)
+    k = Y.shape[0]
+    if k:
+        lu = factorizar(Y)
+        ramas = np.flatnonzero(activa)
+        po, pd = posicion[o[ramas]], posicion[d[ramas]]
+        seleccion = np.flatnonzero(posicion >= 0)
+
+        for inicio in range(0, k, tam_bloque):
+            fin = min(inicio + tam_bloque, k)
+            rhs = np.zeros((k, fin - inicio), dtype=np.complex128)
+            rhs[np.arange(inicio, fin), np.arange(fin - inicio)] = 1
+            Z = lu.solve(rhs)
+            zff = Z[np.arange(inicio, fin), np.arange(fin - inicio)]
+            zth[seleccion[inicio:fin]] = zff
+
+            # Aportes a fallas en el destino y en el origen de cada rama del bloque
+            en_d = (pd >= inicio) & (pd < fin)
+            col = pd[en_d] - inicio
+            z_rama[ramas[en_d]] = Z[po[en_d], col]
+            i_en_destino[ramas[en_d]] = e * (1 - Z[po[en_d], col] / zff[col]) * y[ramas[en_d]]
+            en_o = (po >= inicio) & (po < fin)
+            col = po[en_o] - inicio
+            i_en_origen[ramas[en_o]] = e * (1 - Z[pd[en_o], col] / zff[col]) * y[ramas[en_o]]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        i_falla = np.where(zth != 0, e / zth, 0)
+
+    # Las corrientes se expresan en A primarios (z del índice puede estar referida al secundario)
+    return {
+        "zth": zth,
+        # Zbus[origen, destino] de cada rama activa (para actualizaciones de rango 1)
+        "z_rama": z_rama,
+        "i_falla": i_falla,
+        "i_en_origen": i_en_origen,
+        "i_en_destino": i_en_destino,
+        "energizado": posicion >= 0,
+    }
+
+
+# Resultado memorizado por topología + impedancias + fuentes (compartido, de solo lectura)
+def fallas_red(indice, fuentes, tension_kv, ajuste_impedancia=1.0, cache=CACHE):
+    clave = huella(
+        "fallas", indice["firma"], indice["z"], indice["tiene_param"],
+        sorted((nodo, complex(zf)) for nodo, zf in fuentes.items()), tension_kv, ajuste_impedancia
+    )
+    return cache.obtener_o_calcular(clave, fallas_trifasicas, indice, fuentes, tension_kv, ajuste_impedancia)
+
+
+# ------------------------------------------------------------------------------------------------
+# Infeed de todos los relés a partir de las fallas en el nodo remoto B:
+#   I_r = aporte de la línea protegida a la falla en B
+#   I_f = I_falla(B) - I_r - aporte de la rama usada en el alcance (Z2 o Z3)
+# ------------------------------------------------------------------------------------------------
+def _aporte(indice, fallas, ramas, nodo):
+    aporte = np.zeros(len(ramas), dtype=np.complex128)
+    ok = ramas >= 0
+    r = ramas[ok]
+    aporte[ok] = np.where(
+        indice["destino"][r] == nodo[ok], fallas["i_en_destino"][r], fallas["i_en_origen"][r]
+    )
+    return aporte
+
+
+@perfilador.medido("infeed")
+def aplicar_infeed(resultado, indice, fallas):
+    remoto = resultado["nodo_remoto"]
+    ir = _aporte(indice, fallas, resultado["rama"], remoto)
+    total = fallas["i_falla"][remoto]
+    if_z2 = np.abs(total - ir - _aporte(indice, fallas, resultado["rama_z2"], remoto))
+    if_z3 = np.abs(total - ir - _aporte(indice, fallas, resultado["rama_z3"], remoto))
+    # Aportes numéricamente nulos (rama radial sin fuente detrás) se tratan como cero
+    ir = np.where(np.abs(ir) > 1e-9 * np.abs(total), np.abs(ir), 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        k_infeed = np.where(ir != 0, if_z2 / ir, 0.0)
+        k_infeed_z3 = np.where(ir != 0, if_z3 / ir, 0.0)
+        resultado = dict(resultado)
+        resultado.update({
+            "ir": ir,
+            "if_z2": if_z2,
+            "if_z3": if_z3,
+            "k_infeed": k_infeed,
+            "k_infeed_z3": k_infeed_z3,
+            "z2_infeed": resultado["z2"] * (1 + k_infeed),
+            "z3_infeed": resultado["z3"] * (1 + k_infeed_z3),
+        })
+    return resultado
@@ -0,0 +1,282 @@
+import numpy as np
+
+import coordinacion
+import motor_zonas
+import perfilador
+import zonas
+from cache_resultados import CACHE, huella
+
+ZONAS = ["z1", "z2", "z3"]
+# Tiempos de operación por zona (s): límite inferior de las bandas del Paso 5
+TIEMPOS_ZONA = {"z1": 0.0, "z2": 0.3, "z3": 0.8}
+# Intervalo de coordinación mínimo entre un relé de respaldo y el relé que respalda (s)
+CTI = 0.2
+# Puntos de falla a lo largo de cada rama (fracción desde el origen)
+FRACCIONES = (0.1, 0.5, 0.9)
+NIVELES = ["primario", "respaldo 1", "respaldo 2"]
+# Celdas (fila, punto) por bloque al evaluar las zonas (acota la memoria)
+MAX_PUNTOS_BLOQUE = 2_000_000
+
+
+# ------------------------------------------------------------------------------------------------
+# Recorrido de la red: relés que ven cada rama en falla (solo depende de la topología)
+#
+# Búsqueda en anchura acotada a dos saltos sobre la incidencia CSR del índice (el mismo multigrafo
+# que grafo_red, con las ramas paralelas), para todas las ramas a la vez:
+#   nivel 0  primarios: los relés de la propia rama
+#   nivel 1  respaldos: relés de otras ramas cuyo nodo remoto es un extremo S de la rama en falla
+#            (miran hacia la falla); respaldan al primario ubicado en S
+#   nivel 2  respaldos de los respaldos: relés cuyo nodo remoto es el nodo de un relé de nivel 1
+# Un relé se visita una sola vez por rama (en el menor nivel), como en una BFS.
+# Cada fila guarda la rama en falla, el extremo S por el que se llega, el relé, el relé
+# intermedio (nivel 2) y la fila del relé respaldado (-1 si no hay).
+# ------------------------------------------------------------------------------------------------
+def recorrer(indice, resultado):
+    o_r, d_r = indice["origen"], indice["destino"]
+    n_ramas, n_nodos = len(o_r), len(indice["nodos"])
+    rama = np.asarray(resultado["rama"], dtype=np.int64)
+    sentido = np.asarray(resultado["sentido"], dtype=np.int64)
+    nodo_rele, nodo_remoto = resultado["nodo_rele"], resultado["nodo_remoto"]
+    n = len(rama)
+    ramas_falla = np.flatnonzero(indice["tiene_param"] & (o_r != d_r))
+    en_falla = np.zeros(n_ramas, dtype=bool)
+    en_falla[ramas_falla] = True
+
+    # --- Nivel 0 ---
+    prim = np.flatnonzero(en_falla[rama])
+    fila_primaria = np.full((n_ramas, 2), -1, dtype=np.int64)
+    fila_primaria[rama[prim], sentido[prim]] = np.arange(len(prim))
+    niveles = [{
+        "falla": rama[prim], "lado": sentido[prim], "rele": prim,
+        "intermedio": np.full(len(prim), -1, dtype=np.int64), "respaldada": np.full(len(prim), -1, dtype=np.int64),
+    }]
+
+    # --- Nivel 1: relés que miran hacia cada extremo de cada rama en falla ---
+    ptr_b, reles_b = motor_zonas._por_nodo(nodo_remoto, n_nodos)
+    falla = np.repeat(ramas_falla, 2)
+    lado = np.tile(np.array([0, 1], dtype=np.int64), len(ramas_falla))
+    par, r1 = coordinacion._pares(ptr_b, reles_b, np.where(lado == 0, o_r[falla], d_r[falla]))
+    ok = rama[r1] != falla[par]
+    par, r1 = par[ok], r1[ok]
+    niveles.append({
+        "falla": falla[par], "lado": lado[par], "rele": r1,
+        "intermedio": np.full(len(r1), -1, dtype=np.int64), "respaldada": fila_primaria[falla[par], lado[par]],
+    })
+
+    # --- Nivel 2: relés que miran hacia el nodo de cada relé de nivel 1 ---
+    uno = niveles[1]
+    par, r2 = coordinacion._pares(ptr_b, reles_b, nodo_rele[uno["rele"]])
+    falla = uno["falla"][par]
+    vistos = np.concatenate([niveles[0]["falla"] * n + niveles[0]["rele"], uno["falla"] * n + uno["rele"]])
+    ok = (rama[r2] != rama[uno["rele"][par]]) & (rama[r2] != falla) & ~np.isin(falla * n + r2, vistos)
+    par, r2 = par[ok], r2[ok]
+    niveles.append({
+        "falla": uno["falla"][par], "lado": uno["lado"][par], "rele": r2,
+        "intermedio": uno["rele"][par], "respaldada": len(prim) + par,
+    })
+
+    recorrido = {c: np.concatenate([nivel[c] for nivel in niveles]) for c in niveles[0]}
+    recorrido["nivel"] = np.repeat(np.arange(3, dtype=np.int8), [len(nivel["rele"]) for nivel in niveles])
+
+    # Filas ordenadas por (rama en falla, nivel): cada grupo queda contiguo (ptr) y se reduce con
+    # reduceat; lo mismo para los pares (respaldo, respaldado) del mapa (filas_pares, ptr_pares)
+    orden = np.lexsort((recorrido["nivel"], recorrido["falla"]))
+    recorrido = {c: v[orden] for c, v in recorrido.items()}
+    nueva = np.empty_like(orden)
+    nueva[orden] = np.arange(len(orden))
+    respaldada = np.where(recorrido["respaldada"] >= 0, nueva[np.maximum(recorrido["respaldada"], 0)], -1)
+    recorrido["respaldada"] = respaldada
+    posicion = np.full(n_ramas, -1, dtype=np.int64)
+    posicion[ramas_falla] = np.arange(len(ramas_falla))
+    grupo = posicion[recorrido["falla"]] * 3 + recorrido["nivel"]
+    recorrido["ptr"] = np.searchsorted(grupo, np.arange(3 * len(ramas_falla) + 1))
+    recorrido["ramas_falla"] = ramas_falla
+
+    filas = np.flatnonzero(respaldada >= 0)
+    par = recorrido["rele"][filas] * n + recorrido["rele"][respaldada[filas]]
+    orden = np.argsort(par, kind="stable")
+    filas, par = filas[orden], par[orden]
+    recorrido["filas_pares"] = filas
+    recorrido["ptr_pares"] = np.append(np.flatnonzero(np.diff(par, prepend=-1) != 0), len(filas))
+
+    nodos, claves = indice["nodos"], indice["clave"]
+    recorrido["etiquetas"] = np.array([
+        f"{claves[b]} ({nodos[a]} → {nodos[r]})" for b, a, r in zip(rama.tolist(), nodo_rele.tolist(), nodo_remoto.tolist())
+    ], dtype=object)
+    return recorrido
+
+
+# ------------------------------------------------------------------------------------------------
+# Zona que opera en cada (fila, punto de falla). Impedancia aparente (como en el barrido del Paso 7):
+#   nivel 0:  Z = q·Zf
+#   nivel 1:  Z = ZL + (1 + K)·q·Zf
+#   nivel 2:  Z = ZL + (1 + K)·(ZL_intermedio + q·Zf)
+# con q la fracción de la rama en falla medida desde el extremo S y K el infeed del relé.
+# Devuelve el índice de la zona (0 = Z1, ...) o -1 si ninguna ve la falla.
+# ------------------------------------------------------------------------------------------------
+def _zona_que_opera(ajustes, resultado, indice, recorrido, filas, fracciones):
+    r, f = recorrido["rele"][filas], recorrido["falla"][filas]
+    intermedio, nivel = recorrido["intermedio"][filas], recorrido["nivel"][filas]
+    q = np.where(recorrido["lado"][filas, None] == 0, fracciones[None, :], 1 - fracciones[None, :])
+    k = np.nan_to_num(resultado["k_infeed"][r], nan=0.0, posinf=0.0, neginf=0.0)
+    z_cerca = np.where(intermedio >= 0, resultado["z_linea"][np.maximum(intermedio, 0)], 0)
+    z_falla = z_cerca[:, None] + q * indice["z"][f][:, None]
+    z_app = np.where(nivel[:, None] == 0, z_falla, resultado["z_linea"][r][:, None] + (1 + k)[:, None] * z_falla)
+
+    zona = np.full(z_app.shape, -1, dtype=np.int8)
+    for i in reversed(range(len(ajustes))):
+        dentro = zonas.contiene(zonas.mho(ajustes[i][r][:, None]), z_app)
+        zona[dentro] = i
+    return zona
+
+
+# ------------------------------------------------------------------------------------------------
+# Escalonamiento de tiempos de toda la red con recálculo incremental.
+#
+# El recorrido se memoriza por topología (caché compartida entre sesiones). Se guarda la zona que
+# opera en cada (fila, punto): tras un cambio de ajustes solo se reevalúan las filas cuyo relé,
+# relé intermedio o rama en falla cambió. Cambiar los tiempos por zona o el CTI no reevalúa
+# ninguna zona: los tiempos salen de la zona con una indexación.
+# ------------------------------------------------------------------------------------------------
+class Escalonador:
+    def __init__(self, cache=CACHE):
+        self.cache = cache
+        self.recorrido = None
+        self.ultimo_informe = None
+        self._clave = None
+        self._entradas = None
+        self._zona = None
+        self._fracciones = None
+
+    @perfilador.medido("escalonamiento")
+    def calcular(self, resultado, indice, tiempos=None, cti=CTI, fracciones=FRACCIONES, usar_r_arco=True):
+        fracciones = np.asarray(fracciones, dtype=np.float64)
+        clave = huella(
+            "recorrido", indice["firma"], indice["tiene_param"], np.asarray(resultado["rama"]),
+            np.asarray(resultado["sentido"])
+        )
+        if clave != self._clave:
+            self.recorrido = self.cache.obtener_o_calcular(clave, recorrer, indice, resultado)
+            self._clave, self._entradas = clave, None
+        if self._fracciones is None or not np.array_equal(fracciones, self._fracciones):
+            self._fracciones, self._entradas = fracciones, None
+        recorrido = self.recorrido
+
+        ajustes = np.stack([
+            resultado[f"r_arco_{z}" if usar_r_arco and f"r_arco_{z}" in resultado else z] for z in ZONAS
+        ])
+        entradas = {
+            "ajustes": ajustes, "z_linea": np.asarray(resultado["z_linea"]),
+            "k_infeed": np.asarray(resultado["k_infeed"]), "z": indice["z"].copy(),
+        }
+        n_filas = len(recorrido["rele"])
+        if self._entradas is None:
+            filas = np.arange(n_filas)
+            zona = np.full((n_filas, len(fracciones)), -1, dtype=np.int8)
+        else:
+            previas = self._entradas
+            rele_cambiado = ~motor_zonas._iguales(ajustes, previas["ajustes"]).all(axis=0)
+            rele_cambiado |= ~motor_zonas._iguales(entradas["z_linea"], previas["z_linea"])
+            rele_cambiado |= ~motor_zonas._iguales(entradas["k_infeed"], previas["k_infeed"])
+            rama_cambiada = ~motor_zonas._iguales(entradas["z"], previas["z"])
+            intermedio = recorrido["intermedio"]
+            filas = np.flatnonzero(
+                rele_cambiado[recorrido["rele"]] | rama_cambiada[recorrido["falla"]]
+                | ((intermedio >= 0) & rele_cambiado[np.maximum(intermedio, 0)])
+            )
+            zona = self._zona.copy()
+
+        bloque = max(1, MAX_PUNTOS_BLOQUE // len(fracciones))
+        with np.errstate(invalid="ignore", over="ignore"):
+            for inicio in range(0, len(filas), bloque):
+                sel = filas[inicio:inicio + bloque]
+                zona[sel] = _zona_que_opera(ajustes, resultado, indice, recorrido, sel, fracciones)
+        self._entradas, self._zona = entradas, zona
+        self.ultimo_informe = {"reevaluadas": len(filas), "filas": n_filas, "puntos": zona.size}
+        return graduar(recorrido, zona, resultado, indice, {**TIEMPOS_ZONA, **(tiempos or {})}, cti, fracciones)
+
+
+# Reducción por grupos contiguos (ptr de G + 1 posiciones); los grupos vacíos quedan en "neutro"
+def _reducir(ufunc, valores, ptr, neutro):
+    relleno = np.concatenate([valores, np.full((1,) + valores.shape[1:], neutro, dtype=valores.dtype)])
+    salida = ufunc.reduceat(relleno, ptr[:-1], axis=0)
+    salida[ptr[:-1] == ptr[1:]] = neutro
+    return salida
+
+
+# Concatena textos elemento a elemento separándolos con "; " (arreglos de objetos)
+def _unir(a, b):
+    return np.where((a != "") & (b != ""), a + "; " + b, a + b)
+
+
+# ------------------------------------------------------------------------------------------------
+# Tiempos, márgenes y tablas: una fila por punto de falla y el mapa de respaldos por par de relés
+# (respaldo, respaldado) con el menor margen y las violaciones del CTI
+# ------------------------------------------------------------------------------------------------
+def graduar(recorrido, zona, resultado, indice, tiempos, cti, fracciones):
+    t_zona = np.array([tiempos[z] for z in ZONAS] + [np.inf])
+    t = t_zona[zona]
+    respaldada = recorrido["respaldada"]
+    t_respaldada = np.where((respaldada >= 0)[:, None], t[np.maximum(respaldada, 0)], np.inf)
+    with np.errstate(invalid="ignore"):
+        margen = np.where(np.isfinite(t) & np.isfinite(t_respaldada), t - t_respaldada, np.inf)
+    violacion = margen < cti - 1e-9
+
+    # --- Por punto de falla (grupos por rama y nivel) ---
+    ramas_falla, ptr = recorrido["ramas_falla"], recorrido["ptr"]
+    forma = (len(ramas_falla), 3, len(fracciones))
+    t_nivel = _reducir(np.minimum, t, ptr, np.inf).reshape(forma)
+    violaciones = _reducir(np.add, violacion.astype(np.int64), ptr, 0).reshape(forma).sum(axis=1)
+    margen_min = _reducir(np.minimum, margen, ptr, np.inf).reshape(forma).min(axis=1)
+    con_primario = ptr[1::3] > ptr[0:-1:3]
+
+    sin_primario = (con_primario[:, None] & ~np.isfinite(t_nivel[:, 0])).ravel()
+    sin_respaldo = ~np.isfinite(t_nivel[:, 1]).ravel()
+    cuentas, inverso = np.unique(violaciones.ravel(), return_inverse=True)
+    textos_cti = np.array([f"{c} respaldos con margen < {cti:g} s" if c else "" for c in cuentas.tolist()], dtype=object)
+    observaciones = np.array(["", "ningún primario ve la falla"], dtype=object)[sin_primario.astype(np.int64)]
+    observaciones = _unir(observaciones, np.array(["", "sin respaldo remoto"], dtype=object)[sin_respaldo.astype(np.int64)])
+    observaciones = _unir(observaciones, textos_cti[inverso.ravel()])
+
+    sin_valor = lambda x: np.where(np.isfinite(x), x, np.nan).ravel()
+    fallas = {
+        "rama": np.repeat(np.array(indice["clave"], dtype=object)[ramas_falla], len(fracciones)),
+        "fraccion": np.tile(fracciones, len(ramas_falla)),
+        "t_primario": np.where(np.repeat(con_primario, len(fracciones)), sin_valor(t_nivel[:, 0]), np.nan),
+        "t_respaldo_1": sin_valor(t_nivel[:, 1]),
+        "t_respaldo_2": sin_valor(t_nivel[:, 2]),
+        "margen_min": sin_valor(margen_min),
+        "violaciones": violaciones.ravel(),
+        "observaciones": list(observaciones),
+    }
+
+    # --- Mapa de respaldos: un registro por (relé de respaldo, relé respaldado) ---
+    rele, nivel = recorrido["rele"], recorrido["nivel"]
+    filas, ptr_pares = recorrido["filas_pares"], recorrido["ptr_pares"]
+    vistas = _reducir(np.add, np.isfinite(t[filas]).sum(axis=1), ptr_pares, 0)
+    n_violaciones = _reducir(np.add, violacion[filas].sum(axis=1), ptr_pares, 0)
+    peor = _reducir(np.minimum, margen[filas].min(axis=1), ptr_pares, np.inf)
+    primera = filas[ptr_pares[:-1]]
+    orden = np.lexsort((peor, -n_violaciones))
+    etiquetas = recorrido["etiquetas"]
+    mapa = {
+        "rele_respaldo": list(etiquetas[rele[primera][orden]]),
+        "nivel": [NIVELES[i] for i in nivel[primera][orden].tolist()],
+        "rele_respaldado": list(etiquetas[rele[respaldada[primera]][orden]]),
+        "puntos_vistos": vistas[orden],
+        "margen_min": sin_valor(peor[orden]),
+        "violaciones": n_violaciones[orden],
+    }
+
+    return {
+        "fallas": fallas,
+        "mapa": mapa,
+        "resumen": {
+            "puntos": len(ramas_falla) * len(fracciones),
+            "puntos_sin_primario": int(sin_primario.sum()),
+            "puntos_sin_respaldo": int(sin_respaldo.sum()),
+            "violaciones": int(violacion.sum()),
+            "pares": len(primera),
+            "pares_con_violacion": int((n_violaciones > 0).sum()),
+        },
+    }
@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from matplotlib.figure import Figure
+
+import perfilador
+
+
+# ------------------------------------------------------------------------------------------------
+# Ciclo de vida de las figuras de matplotlib
+#
+# Las figuras se crean con la API orientada a objetos (sin el estado global de pyplot), se usan
+# dentro de un bloque "with" y se liberan al salir, aunque ocurra una excepción. Las figuras
+# liberadas se limpian y se guardan en un pool acotado para reutilizarlas.
+# ------------------------------------------------------------------------------------------------
+class PoolFiguras:
+    def __init__(self, max_figuras=8):
+        self.max_figuras = max_figuras
+        self._libres = []
+        self._vivas = Counter()
+        self._lock = threading.Lock()
+        self.creadas = 0
+        self.reutilizadas = 0
+
+    def adquirir(self, figsize=(8, 6), sesion=None):
+        with self._lock:
+            fig = self._libres.pop() if self._libres else None
+            self._vivas[sesion] += 1
+            if fig is None:
+                self.creadas += 1
+            else:
+                self.reutilizadas += 1
+        if fig is None:
+            fig = Figure(figsize=figsize)
+        else:
+            fig.set_size_inches(figsize)
+        return fig
+
+    def liberar(self, fig, sesion=None):
+        # clf() suelta todos los artistas; la figura vacía vuelve al pool si hay espacio
+        fig.clf()
+        with self._lock:
+            self._vivas[sesion] -= 1
+            if self._vivas[sesion] <= 0:
+                del self._vivas[sesion]
+            if len(self._libres) < self.max_figuras:
+                self._libres.append(fig)
+
+    @contextmanager
+    def figura(self, figsize=(8, 6), sesion=None):
+        fig = self.adquirir(figsize, sesion)
+        try:
+            # Vida de la figura: dibujo + rasterizado/codificación (si el perfilador está activo)
+            with perfilador.seccion("figura"):
+                yield fig
+        finally:
+            self.liberar(fig, sesion)
+
+    def vivas(self, sesion=None):
+        with self._lock:
+            return self._vivas.get(sesion, 0)
+
+    def vivas_total(self):
+        with self._lock:
+            return sum(self._vivas.values())
+
+    def en_pool(self):
+        with self._lock:
+            return len(self._libres)
+
+
+# Pool compartido por todas las sesiones. Con PROTEC21_POOL_FIGURAS=0 no se reutilizan figuras.
+POOL = PoolFiguras(max_figuras=int(os.environ.get("PROTEC21_POOL_FIGURAS", "8")))
+
+
+def figura(figsize=(8, 6), sesion=None):
+    return POOL.figura(figsize, sesion)
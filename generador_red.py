@@ -0,0 +1,90 @@
+import numpy as np
+
+TOPOLOGIAS = ["radial", "mallada", "anillo"]
+
+# Rangos de los parámetros aleatorios (Ω, grados y A)
+Z_LINEA = (2.0, 30.0)
+ANGULO_LINEA = (70.0, 85.0)
+Z_TRAFO = (20.0, 80.0)
+ANGULO_TRAFO = (85.0, 89.0)
+I_CC = (500.0, 20000.0)
+ANGULO_I = (-85.0, -70.0)
+
+
+def _ramas_base(topologia, n_ramas, rng):
+    if topologia == "anillo":
+        n = max(n_ramas, 3)
+        origen = np.arange(n)
+        return origen, (origen + 1) % n
+
+    if topologia == "radial":
+        # Árbol: el nodo k cuelga de un nodo anterior elegido al azar
+        hijos = np.arange(1, n_ramas + 1)
+        return rng.integers(0, hijos), hijos
+
+    # Mallada: árbol con ~70 % de las ramas más cuerdas entre nodos cercanos en la numeración
+    n_arbol = max(1, int(round(0.7 * n_ramas)))
+    hijos = np.arange(1, n_arbol + 1)
+    origen, destino = rng.integers(np.maximum(0, hijos - 20), hijos), hijos
+    pares = set(zip(np.minimum(origen, destino).tolist(), np.maximum(origen, destino).tolist()))
+    extra_o, extra_d = [], []
+    while len(extra_o) < n_ramas - n_arbol:
+        a = rng.integers(0, n_arbol + 1, size=2 * (n_ramas - n_arbol - len(extra_o)) + 8)
+        b = np.minimum(a + rng.integers(2, 30, size=len(a)), n_arbol)
+        for x, y in zip(np.minimum(a, b).tolist(), np.maximum(a, b).tolist()):
+            if x != y and (x, y) not in pares and len(extra_o) < n_ramas - n_arbol:
+                pares.add((x, y))
+                extra_o.append(x)
+                extra_d.append(y)
+    return np.concatenate([origen, extra_o]).astype(np.int64), np.concatenate([destino, extra_d]).astype(np.int64)
+
+
+def _uniforme(rng, rango, n):
+    return rng.uniform(rango[0], rango[1], size=n)
+
+
+# ------------------------------------------------------------------------------------------------
+# Red sintética reproducible (misma semilla -> misma red) con exactamente n_ramas ramas:
+# topología radial, mallada o en anillo, una fracción de transformadores y de líneas paralelas
+# (duplicadas con otra impedancia) e impedancias y corrientes aleatorias.
+# Devuelve las filas de la tabla de red (las de la carga masiva del Paso 1).
+# ------------------------------------------------------------------------------------------------
+def generar_red(n_ramas, topologia="radial", frac_trafos=0.1, frac_paralelas=0.05, semilla=0):
+    if topologia not in TOPOLOGIAS:
+        raise ValueError(f"topología desconocida ({topologia!r}); opciones: {TOPOLOGIAS}")
+    rng = np.random.default_rng(semilla)
+    n_paralelas = int(frac_paralelas * n_ramas) if topologia != "anillo" or n_ramas > 3 else 0
+    origen, destino = _ramas_base(topologia, n_ramas - n_paralelas, rng)
+    n_base = len(origen)
+
+    es_trafo = np.zeros(n_base, dtype=bool)
+    es_trafo[rng.choice(n_base, size=int(frac_trafos * n_base), replace=False)] = True
+    # Las paralelas duplican líneas (nunca transformadores)
+    lineas = np.flatnonzero(~es_trafo)
+    copias = rng.choice(lineas, size=min(n_paralelas, len(lineas)), replace=len(lineas) < n_paralelas)
+    origen = np.concatenate([origen, origen[copias]])
+    destino = np.concatenate([destino, destino[copias]])
+    es_trafo = np.concatenate([es_trafo, np.zeros(len(copias), dtype=bool)])
+
+    n = len(origen)
+    z_mag = np.where(es_trafo, _uniforme(rng, Z_TRAFO, n), _uniforme(rng, Z_LINEA, n))
+    z_ang = np.where(es_trafo, _uniforme(rng, ANGULO_TRAFO, n), _uniforme(rng, ANGULO_LINEA, n))
+    i_mag = _uniforme(rng, I_CC, n)
+    i_ang = _uniforme(rng, ANGULO_I, n)
+    return [
+        {"tipo": "trafo" if t else "linea", "origen": f"N{o}", "destino": f"N{d}",
+         "z_mag": zm, "z_ang": za, "i_mag": im, "i_ang": ia}
+        for t, o, d, zm, za, im, ia in zip(
+            es_trafo.tolist(), origen.tolist(), destino.tolist(),
+            z_mag.round(4).tolist(), z_ang.round(2).tolist(), i_mag.round(2).tolist(), i_ang.round(2).tolist()
+        )
+    ]
+
+
+# Fuentes de Thévenin para el cálculo con Zbus: una cada ~n_por_fuente nodos, {nodo: Z (Ω)}
+def fuentes_sinteticas(filas, n_por_fuente=50, semilla=0):
+    rng = np.random.default_rng(semilla)
+    nodos = sorted({f["origen"] for f in filas} | {f["destino"] for f in filas}, key=lambda n: int(n[1:]))
+    elegidos = nodos[::max(1, n_por_fuente)]
+    z = _uniforme(rng, (1.0, 10.0), len(elegidos)) * np.exp(1j * np.radians(_uniforme(rng, (75.0, 88.0), len(elegidos))))
+    return dict(zip(elegidos, z.tolist()))
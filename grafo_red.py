@@ -0,0 +1,79 @@
+import networkx as nx
+
+import layout_red
+import perfilador
+from cache_resultados import CACHE, huella
+
+
+# --- Inicializar grafo como MultiGraph para permitir múltiples aristas ---
+@perfilador.medido("grafo")
+def construir_grafo(lineas, trafos):
+    G = nx.MultiGraph()
+    conflictos = set()
+
+    lineas_set = set()
+    trafos_set = set()
+
+    # --- Agregar líneas ---
+    for linea in lineas:
+        n1 = linea["origen"].strip()
+        n2 = linea["destino"].strip()
+        if n1 and n2:
+            key = frozenset([n1, n2])
+            lineas_set.add(key)
+            G.add_edge(n1, n2, tipo="linea")
+
+    # --- Agregar transformadores y validar conflictos ---
+    for trafo in trafos:
+        t1 = trafo["origen"].strip()
+        t2 = trafo["destino"].strip()
+        par = frozenset([t1, t2])
+        if par in lineas_set:
+            conflictos.add(tuple(sorted([t1, t2])))
+        else:
+            trafos_set.add(par)
+            G.add_edge(t1, t2, tipo="trafo")
+
+    return G, conflictos, trafos_set
+
+
+def _firma(lineas, trafos):
+    return (
+        [(l["origen"].strip(), l["destino"].strip()) for l in lineas],
+        [(t["origen"].strip(), t["destino"].strip()) for t in trafos],
+    )
+
+
+# Grafo memorizado por la huella de la topología (compartido entre sesiones, de solo lectura)
+def grafo(lineas, trafos, cache=CACHE):
+    return cache.obtener_o_calcular(huella("grafo", _firma(lineas, trafos)), construir_grafo, lineas, trafos)
+
+
+# Grafo y posiciones de un estudio. "estado" es el layout anterior del mismo estudio (o None):
+# si existe, solo se recalculan los componentes afectados partiendo de las posiciones previas.
+# El primer dibujo de una topología se comparte entre sesiones. Devuelve también el nuevo estado.
+def grafo_y_posiciones(lineas, trafos, estado=None, fijas=None, cache=CACHE):
+    G, conflictos, trafos_set = grafo(lineas, trafos, cache)
+    if conflictos:
+        return G, conflictos, trafos_set, {}, estado
+
+    fijas = {n: p for n, p in (fijas or {}).items() if n in G}
+    if estado and any(n in estado["pos"] for n in G):
+        pos, estado = layout_red.calcular_layout(G, estado, fijas)
+    else:
+        clave = huella("layout", _firma(lineas, trafos), sorted(fijas.items()))
+        pos, estado = cache.obtener_o_calcular(clave, layout_red.calcular_layout, G, None, fijas)
+    return G, conflictos, trafos_set, pos, estado
+
+
+# Redes con más nodos que este umbral se dibujan con el layout calculado en segundo plano
+UMBRAL_SEGUNDO_PLANO = layout_red.UMBRAL_MULTINIVEL
+
+
+def cantidad_nodos(lineas, trafos):
+    return len({e["origen"].strip() for e in lineas + trafos} | {e["destino"].strip() for e in lineas + trafos})
+
+
+# Clave del trabajo de grafo + layout (la comparten las sesiones con la misma topología)
+def clave_layout(lineas, trafos, fijas=None):
+    return huella("trabajo layout", _firma(lineas, trafos), sorted((fijas or {}).items()))
@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+
+# Columnas de la tabla de red (una fila por línea o transformador)
+COLUMNAS = ["tipo", "origen", "destino", "z_mag", "z_ang", "i_mag", "i_ang"]
+CAMPOS_NUMERICOS = ["z_mag", "z_ang", "i_mag", "i_ang"]
+
+TIPOS = {
+    "linea": "linea", "línea": "linea", "l": "linea", "line": "linea",
+    "trafo": "trafo", "transformador": "trafo", "t": "trafo", "transformer": "trafo",
+    "nodo": "nodo", "bus": "nodo", "barra": "nodo",
+}
+
+
+# ------------------------------------------------------------------------------------------------
+# Lectura en streaming: cada lector entrega (número de registro, dict) sin cargar el archivo entero
+# ------------------------------------------------------------------------------------------------
+def leer_csv(flujo):
+    lector = csv.DictReader(flujo)
+    if lector.fieldnames:
+        lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+    # Número de línea del archivo (la cabecera es la línea 1)
+    for n, registro in enumerate(lector, start=2):
+        yield n, registro
+
+
+# Arreglo JSON de registros o JSON Lines, decodificado registro a registro
+def leer_json(flujo, tam_bloque=1 << 16):
+    decodificador = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    n = 0
+    fin = False
+    while True:
+        # Saltar espacios y la estructura del arreglo de nivel superior
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buffer):
+            if fin:
+                return
+            buffer = buffer[pos:] + flujo.read(tam_bloque)
+            pos = 0
+            fin = len(buffer) == 0
+            continue
+        try:
+            registro, pos = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            bloque = flujo.read(tam_bloque)
+            if not bloque:
+                raise ValueError(f"JSON incompleto o inválido después del registro {n}")
+            buffer = buffer[pos:] + bloque
+            pos = 0
+            continue
+        n += 1
+        yield n, registro
+
+
+# ------------------------------------------------------------------------------------------------
+# Validación
+# ------------------------------------------------------------------------------------------------
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+def _numero(registro, campo):
+    valor = registro.get(campo)
+    if valor is None or _texto(valor) == "":
+        return 0.0
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{campo}' no es numérico ({valor!r})")
+    if numero != numero:
+        raise ValueError(f"'{campo}' no es numérico ({valor!r})")
+    return numero
+
+
+# Normaliza un registro; devuelve la fila (o el nombre del nodo) o lanza ValueError
+def validar_registro(registro):
+    if not isinstance(registro, dict):
+        raise ValueError("el registro no es un objeto")
+    tipo = TIPOS.get(_texto(registro.get("tipo")).lower())
+    if tipo is None:
+        raise ValueError(f"tipo desconocido ({registro.get('tipo')!r})")
+
+    if tipo == "nodo":
+        nombre = _texto(registro.get("nombre")) or _texto(registro.get("origen"))
+        if not nombre:
+            raise ValueError("nodo sin nombre")
+        return tipo, nombre
+
+    origen = _texto(registro.get("origen"))
+    destino = _texto(registro.get("destino"))
+    if not origen or not destino:
+        raise ValueError("falta el nodo de origen o de destino")
+    if origen == destino:
+        raise ValueError(f"origen y destino iguales ({origen})")
+
+    fila = {"tipo": tipo, "origen": origen, "destino": destino}
+    for campo in CAMPOS_NUMERICOS:
+        fila[campo] = _numero(registro, campo)
+    # Id estable de la rama en el modelo de red (las filas nuevas no lo traen)
+    if _texto(registro.get("id")):
+        fila["id"] = int(_numero(registro, "id"))
+    if fila["z_mag"] < 0 or fila["i_mag"] < 0:
+        raise ValueError("las magnitudes de Z e I no pueden ser negativas")
+    return tipo, fila
+
+
+# Coordenadas fijas opcionales (x, y) de un registro de nodo, p. ej. la posición de la subestación
+def coordenadas_nodo(registro):
+    x, y = _texto(registro.get("x")), _texto(registro.get("y"))
+    if not x and not y:
+        return None
+    if not x or not y:
+        raise ValueError("el nodo debe tener ambas coordenadas x e y")
+    return _numero(registro, "x"), _numero(registro, "y")
+
+
+# Valida una secuencia de (n, registro); los errores se acumulan en lugar de abortar la carga
+def validar_registros(registros, max_errores=50, etiqueta="Registro"):
+    filas, nodos, errores = [], [], []
+    coordenadas = {}
+    pares_linea, pares_trafo = set(), set()
+    ids = set()
+
+    for n, registro in registros:
+        try:
+            tipo, fila = validar_registro(registro)
+            xy = coordenadas_nodo(registro) if tipo == "nodo" else None
+        except ValueError as e:
+            if len(errores) < max_errores:
+                errores.append(f"{etiqueta} {n}: {e}")
+            continue
+
+        if tipo == "nodo":
+            nodos.append(fila)
+            if xy is not None:
+                coordenadas[fila] = xy
+            continue
+
+        par = frozenset([fila["origen"], fila["destino"]])
+        if par in (pares_trafo if tipo == "linea" else pares_linea):
+            if len(errores) < max_errores:
+                errores.append(f"{etiqueta} {n}: hay una línea y un transformador entre {sorted(par)}")
+            continue
+        (pares_linea if tipo == "linea" else pares_trafo).add(par)
+        # Una fila duplicada (p. ej. copiada en la tabla) recibe un id nuevo
+        if "id" in fila:
+            if fila["id"] in ids:
+                del fila["id"]
+            else:
+                ids.add(fila["id"])
+        filas.append(fila)
+
+    return {"filas": filas, "nodos": nodos, "coordenadas": coordenadas, "errores": errores}
+
+
+def importar_red(flujo, formato, max_errores=50):
+    lector = leer_csv if formato == "csv" else leer_json
+    try:
+        return validar_registros(lector(flujo), max_errores)
+    except (ValueError, csv.Error) as e:
+        return {"filas": [], "nodos": [], "coordenadas": {}, "errores": [f"No se pudo leer el archivo: {e}"]}
+
+
+# Filas editadas en la tabla: se descartan las completamente vacías y se validan las demás
+def validar_filas(filas, max_errores=50):
+    registros = (
+        (n, fila) for n, fila in enumerate(filas, start=1)
+        if any(_texto(fila.get(c)) for c in ("tipo", "origen", "destino"))
+    )
+    return validar_registros(registros, max_errores, etiqueta="Fila")
+
+
+def filas_a_csv(filas):
+    salida = io.StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=COLUMNAS, extrasaction="ignore")
+    escritor.writeheader()
+    escritor.writerows(filas)
+    return salida.getvalue()
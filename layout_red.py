@@ -0,0 +1,311 @@
+import networkx as nx
+import numpy as np
+
+import perfilador
+
+# Por encima de esta cantidad de nodos se usa el layout multinivel en lugar de spring_layout
+UMBRAL_MULTINIVEL = 500
+# Tamaño del grafo más grueso en el esquema multinivel
+TAM_BASE = 200
+
+
+# ------------------------------------------------------------------------------------------------
+# Layout incremental de la red
+#
+# estado = {"pos": {nodo: (x, y)}, "vecinos": {nodo: frozenset}} describe el último dibujo del
+# estudio. Los componentes cuya vecindad no cambió conservan sus posiciones; los afectados se
+# recalculan partiendo de las posiciones previas. Los nodos de "fijas" (p. ej. coordenadas
+# geográficas de subestaciones) nunca se mueven.
+# ------------------------------------------------------------------------------------------------
+@perfilador.medido("layout")
+def calcular_layout(G, estado=None, fijas=None, umbral_multinivel=UMBRAL_MULTINIVEL, seed=42):
+    fijas = {n: (float(p[0]), float(p[1])) for n, p in (fijas or {}).items() if n in G}
+    previas = (estado or {}).get("pos", {})
+    vecinos_previos = (estado or {}).get("vecinos", {})
+    vecinos = {n: frozenset(G.neighbors(n)) - {n} for n in G}
+
+    if not any(n in previas for n in G):
+        # Sin dibujo previo: layout completo (idéntico al original en redes pequeñas sin coordenadas)
+        pos = _layout_componente(G, {}, fijas, umbral_multinivel, seed)
+        return pos, {"pos": pos, "vecinos": vecinos}
+
+    pos = {}
+    nuevos = []
+    for comp in nx.connected_components(G):
+        sucio = any(
+            n not in previas or vecinos_previos.get(n) != vecinos[n] or (n in fijas and previas[n] != fijas[n])
+            for n in comp
+        )
+        if not sucio:
+            pos.update({n: previas[n] for n in comp})
+            continue
+
+        sub = G.subgraph(comp)
+        inicial = _posiciones_iniciales(sub, previas, fijas, seed)
+        pos_comp = _layout_componente(sub, inicial, {n: fijas[n] for n in comp if n in fijas}, umbral_multinivel, seed)
+
+        conocidos = [n for n in comp if n in previas]
+        if not any(n in fijas for n in comp):
+            if len(conocidos) >= 2:
+                pos_comp = _alinear(pos_comp, previas, conocidos)
+            elif not conocidos:
+                nuevos.append(pos_comp)
+                continue
+        pos.update(pos_comp)
+
+    # Componentes totalmente nuevos: se ubican a la derecha del dibujo existente
+    for pos_comp in nuevos:
+        pos.update(_ubicar_al_lado(pos_comp, pos))
+
+    return pos, {"pos": pos, "vecinos": vecinos}
+
+
+def _layout_componente(G, inicial, fijas, umbral_multinivel, seed):
+    n = G.number_of_nodes()
+    if n == 0:
+        return {}
+    if n == 1:
+        nodo = next(iter(G))
+        return {nodo: fijas.get(nodo, inicial.get(nodo, (0.0, 0.0)))}
+
+    if n > umbral_multinivel:
+        return layout_multinivel(G, inicial, fijas, seed)
+
+    pos_inicial = {**inicial, **fijas} or None
+    if fijas and len(pos_inicial) < n:
+        pos_inicial = {**_posiciones_iniciales(G, pos_inicial, fijas, seed), **fijas}
+    pos = nx.spring_layout(
+        G, pos=pos_inicial, fixed=list(fijas) or None, seed=seed,
+        iterations=30 if inicial else 50
+    )
+    return {nodo: (float(p[0]), float(p[1])) for nodo, p in pos.items()}
+
+
+# Posición inicial de cada nodo: la previa si existe; si no, el promedio de sus vecinos ya ubicados
+def _posiciones_iniciales(G, previas, fijas, seed):
+    rng = np.random.default_rng(seed)
+    inicial = {n: previas[n] for n in G if n in previas}
+    inicial.update({n: fijas[n] for n in G if n in fijas})
+    if not inicial:
+        return {}
+
+    escala = _longitud_tipica(G, inicial)
+    pendientes = [n for n in G if n not in inicial]
+    centro = np.mean(list(inicial.values()), axis=0)
+    while pendientes:
+        siguientes = []
+        for n in pendientes:
+            ubicados = [inicial[v] for v in G.neighbors(n) if v in inicial]
+            if ubicados:
+                p = np.mean(ubicados, axis=0) + rng.normal(scale=0.3 * escala, size=2)
+                inicial[n] = (float(p[0]), float(p[1]))
+            else:
+                siguientes.append(n)
+        if len(siguientes) == len(pendientes):
+            for n in siguientes:
+                p = centro + rng.normal(scale=escala, size=2)
+                inicial[n] = (float(p[0]), float(p[1]))
+            break
+        pendientes = siguientes
+    return inicial
+
+
+def _longitud_tipica(G, pos):
+    longitudes = [
+        np.hypot(pos[u][0] - pos[v][0], pos[u][1] - pos[v][1])
+        for u, v in G.edges() if u in pos and v in pos and u != v
+    ]
+    longitudes = [l for l in longitudes if l > 0]
+    return float(np.median(longitudes)) if longitudes else 0.1
+
+
+# Transformación de similitud (escala, rotación, traslación) que lleva el layout nuevo sobre el previo
+def _alinear(pos, previas, conocidos):
+    a = np.array([pos[n] for n in conocidos])
+    b = np.array([previas[n] for n in conocidos])
+    media_a, media_b = a.mean(axis=0), b.mean(axis=0)
+    a0, b0 = a - media_a, b - media_b
+    var_a = (a0 ** 2).sum()
+    if var_a == 0:
+        return {n: tuple(np.asarray(p) - media_a + media_b) for n, p in pos.items()}
+    u, s, vt = np.linalg.svd(b0.T @ a0)
+    d = np.sign(np.linalg.det(u @ vt)) or 1.0
+    D = np.diag([1.0, d])
+    R = u @ D @ vt
+    escala = (s * np.diag(D)).sum() / var_a
+    return {n: tuple(float(c) for c in escala * R @ (np.asarray(p) - media_a) + media_b) for n, p in pos.items()}
+
+
+def _ubicar_al_lado(pos_comp, pos):
+    if not pos:
+        return pos_comp
+    existente = np.array(list(pos.values()))
+    nuevo = np.array(list(pos_comp.values()))
+    ancho = np.ptp(existente, axis=0).max() or 1.0
+    ancho_nuevo = np.ptp(nuevo, axis=0).max() or 1.0
+    escala = min(1.0, 0.5 * ancho / ancho_nuevo)
+    nuevo = (nuevo - nuevo.min(axis=0)) * escala
+    desplazamiento = np.array([existente[:, 0].max() + 0.1 * ancho, existente[:, 1].mean() - nuevo[:, 1].mean()])
+    return {n: tuple(float(c) for c in p + desplazamiento) for n, p in zip(pos_comp, nuevo)}
+
+
+# ------------------------------------------------------------------------------------------------
+# Layout multinivel para redes grandes
+# Engrosado por emparejamiento de aristas, spring_layout en el nivel más grueso y refinamiento
+# Fruchterman-Reingold con repulsión solo entre nodos cercanos (rejilla), O(n + m) por iteración.
+# ------------------------------------------------------------------------------------------------
+def layout_multinivel(G, inicial=None, fijas=None, seed=42, tam_base=TAM_BASE):
+    inicial = inicial or {}
+    fijas = fijas or {}
+    rng = np.random.default_rng(seed)
+    nodos = list(G)
+    n = len(nodos)
+    idx = {nodo: i for i, nodo in enumerate(nodos)}
+    aristas = np.array([(idx[u], idx[v]) for u, v in G.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+    fijo = np.array([nodo in fijas for nodo in nodos])
+    xy_fijo = np.array([fijas.get(nodo, (0.0, 0.0)) for nodo in nodos], dtype=float)
+
+    # Dominio del dibujo: el de las coordenadas fijas si las hay, si no [-1, 1]²
+    if fijo.sum() >= 2:
+        caja = np.ptp(xy_fijo[fijo], axis=0)
+        area = max(caja[0], 1e-9) * max(caja[1], 1e-9) if caja.min() > 0 else max(caja.max(), 1e-9) ** 2
+    else:
+        area = 4.0
+
+    if len(inicial) == n:
+        # Arranque en caliente: solo refinamiento suave sobre las posiciones previas
+        xy = np.array([inicial[nodo] for nodo in nodos], dtype=float)
+        k = np.sqrt(area / n)
+        return _a_dict(nodos, _refinar(xy, aristas, fijo, xy_fijo, k, 15, 0.1 * k))
+
+    # --- Engrosado ---
+    niveles = []
+    n_nivel, aristas_nivel, fijo_nivel = n, aristas, fijo
+    while n_nivel > tam_base:
+        padre = _emparejar(n_nivel, aristas_nivel, fijo_nivel, rng)
+        n_padres = int(padre.max()) + 1
+        if n_padres > 0.9 * n_nivel:
+            break
+        niveles.append((padre, aristas_nivel, fijo_nivel))
+        aristas_nivel = np.unique(np.sort(padre[aristas_nivel], axis=1), axis=0).reshape(-1, 2)
+        aristas_nivel = aristas_nivel[aristas_nivel[:, 0] != aristas_nivel[:, 1]]
+        fijo_nivel = np.bincount(padre, weights=fijo_nivel, minlength=n_padres) > 0
+        n_nivel = n_padres
+
+    # Posición fija de cada nodo grueso (los nodos fijos nunca se emparejan)
+    xy_fijo_nivel = xy_fijo
+    for padre, _, fijo_hijo in niveles:
+        agregado = np.zeros((int(padre.max()) + 1, 2))
+        agregado[padre[fijo_hijo]] = xy_fijo_nivel[fijo_hijo]
+        xy_fijo_nivel = agregado
+
+    # --- Nivel más grueso ---
+    grueso = nx.Graph()
+    grueso.add_nodes_from(range(n_nivel))
+    grueso.add_edges_from(map(tuple, aristas_nivel))
+    fijos_gruesos = np.flatnonzero(fijo_nivel)
+    pos_grueso = nx.spring_layout(
+        grueso, seed=seed,
+        pos={int(i): tuple(xy_fijo_nivel[i]) for i in fijos_gruesos} or None,
+        fixed=[int(i) for i in fijos_gruesos] or None,
+    ) if len(fijos_gruesos) else nx.spring_layout(grueso, seed=seed)
+    xy = np.array([pos_grueso[i] for i in range(n_nivel)], dtype=float)
+
+    # --- Proyección y refinamiento nivel por nivel ---
+    xy_fijos_por_nivel = [xy_fijo]
+    for padre, _, fijo_hijo in niveles[:-1]:
+        agregado = np.zeros((int(padre.max()) + 1, 2))
+        agregado[padre[fijo_hijo]] = xy_fijos_por_nivel[-1][fijo_hijo]
+        xy_fijos_por_nivel.append(agregado)
+
+    for (padre, aristas_hijo, fijo_hijo), xy_fijo_hijo in zip(reversed(niveles), reversed(xy_fijos_por_nivel)):
+        k = np.sqrt(area / len(padre))
+        xy = xy[padre] + rng.normal(scale=0.1 * k, size=(len(padre), 2))
+        xy = _refinar(xy, aristas_hijo, fijo_hijo, xy_fijo_hijo, k, 20, k)
+
+    # Nodos con posición previa conocida parten de ella (arranque en caliente parcial)
+    if inicial:
+        previos = np.array([nodo in inicial for nodo in nodos])
+        xy[previos] = [inicial[nodo] for nodo in nodos if nodo in inicial]
+        k = np.sqrt(area / n)
+        xy = _refinar(xy, aristas, fijo, xy_fijo, k, 15, 0.3 * k)
+    return _a_dict(nodos, xy)
+
+
+def _a_dict(nodos, xy):
+    return {nodo: (float(x), float(y)) for nodo, (x, y) in zip(nodos, xy)}
+
+
+# Emparejamiento maximal aleatorio: cada par de nodos emparejados forma un nodo del nivel siguiente
+def _emparejar(n, aristas, fijo, rng):
+    pareja = np.full(n, -1, dtype=np.int64)
+    for u, v in aristas[rng.permutation(len(aristas))]:
+        if pareja[u] < 0 and pareja[v] < 0 and not fijo[u] and not fijo[v]:
+            pareja[u] = v
+            pareja[v] = u
+    representante = np.where((pareja >= 0) & (pareja < np.arange(n)), pareja, np.arange(n))
+    _, padre = np.unique(representante, return_inverse=True)
+    return padre.ravel()
+
+
+# Pares (i < j) de nodos a menos de "radio", usando una rejilla de celdas de lado "radio"
+def _pares_cercanos(xy, radio):
+    celda = np.floor((xy - xy.min(axis=0)) / radio).astype(np.int64)
+    ancho = int(celda[:, 1].max()) + 3
+    clave = (celda[:, 0] + 1) * ancho + (celda[:, 1] + 1)
+    orden = np.argsort(clave, kind="stable")
+    claves_ordenadas = clave[orden]
+
+    pares_i, pares_j = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            objetivo = clave + dx * ancho + dy
+            ini = np.searchsorted(claves_ordenadas, objetivo, side="left")
+            fin = np.searchsorted(claves_ordenadas, objetivo, side="right")
+            cuentas = fin - ini
+            i = np.repeat(np.arange(len(xy)), cuentas)
+            desde = np.repeat(ini - np.cumsum(cuentas) + cuentas, cuentas)
+            j = orden[desde + np.arange(cuentas.sum())]
+            mascara = i < j
+            pares_i.append(i[mascara])
+            pares_j.append(j[mascara])
+    i = np.concatenate(pares_i)
+    j = np.concatenate(pares_j)
+    cerca = np.hypot(*(xy[i] - xy[j]).T) < radio
+    return i[cerca], j[cerca]
+
+
+def _acumular(indices, valores, n):
+    return np.column_stack([
+        np.bincount(indices, weights=valores[:, 0], minlength=n),
+        np.bincount(indices, weights=valores[:, 1], minlength=n),
+    ])
+
+
+def _refinar(xy, aristas, fijo, xy_fijo, k, iteraciones, temperatura):
+    n = len(xy)
+    xy = xy.copy()
+    xy[fijo] = xy_fijo[fijo]
+    enfriamiento = temperatura / (iteraciones + 1)
+    for it in range(iteraciones):
+        # Repulsión k²/d entre nodos cercanos; la lista de vecinos se renueva cada pocas iteraciones
+        if it % 5 == 0:
+            i, j = _pares_cercanos(xy, 2.5 * k)
+        delta = xy[i] - xy[j]
+        dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 0.01 * k)
+        fuerza = delta * (k * k / dist ** 2)[:, None]
+        desplazamiento = _acumular(i, fuerza, n) - _acumular(j, fuerza, n)
+
+        # Atracción d²/k a lo largo de las ramas
+        if len(aristas):
+            u, v = aristas[:, 0], aristas[:, 1]
+            delta = xy[u] - xy[v]
+            dist = np.maximum(np.hypot(delta[:, 0], delta[:, 1]), 0.01 * k)
+            fuerza = delta * (dist / k)[:, None]
+            desplazamiento += _acumular(v, fuerza, n) - _acumular(u, fuerza, n)
+
+        largo = np.maximum(np.hypot(desplazamiento[:, 0], desplazamiento[:, 1]), 1e-12)
+        xy += desplazamiento * (np.minimum(largo, temperatura) / largo)[:, None]
+        xy[fijo] = xy_fijo[fijo]
+        temperatura -= enfriamiento
+    return xy
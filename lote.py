@@ -0,0 +1,248 @@
+import argparse
+import cmath
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import coordinacion
+import importacion
+import modelo_red
+
+# ------------------------------------------------------------------------------------------------
+# Ejecución por lotes, sin interfaz, de los cálculos de los Pasos 5 y 6 (alcances, infeed y ajuste
+# por R_arco de todos los relés) para uno o más estudios:
+#   python lote.py estudio1.json subestaciones/*.csv -o ajustes --formato json --procesos 8
+#
+# Un estudio es un archivo de red (CSV / JSON / JSON Lines con las columnas de la carga masiva del
+# Paso 1) o un JSON con la red y sus datos:
+#   {"red": "red.csv" | [filas], "rtc": 1.0, "rtp": 1.0, "porcentaje_z1": 85, "theta": 60,
+#    "fuentes": {"A": [|Zs| (Ω), ∠Zs (°)]}, "tension_kv": 115,
+#    "reles": [{"linea": 1, "extremo": "origen"}, ...]}   (opcional; sin "reles", todos los relés)
+# Los datos que falten se toman de las opciones de la línea de comandos. Cada estudio se escribe en
+# -o como <nombre>.<formato>, con su carpeta relativa como prefijo si el lote abarca varias carpetas
+# (norte__red.csv, sur__red.csv). No importa Streamlit ni matplotlib, y scipy solo se carga si algún
+# estudio define fuentes (corrientes con Zbus).
+# ------------------------------------------------------------------------------------------------
+PREDETERMINADOS = {"rtc": 1.0, "rtp": 1.0, "porcentaje_z1": 85.0, "theta": 60.0, "tension_kv": 115.0}
+FORMATOS = ["csv", "json"]
+
+
+def _formato_red(ruta):
+    return "csv" if ruta.lower().endswith(".csv") else "json"
+
+
+def _leer_red(ruta):
+    with open(ruta, encoding="utf-8-sig", newline="") as flujo:
+        return importacion.importar_red(flujo, _formato_red(ruta))
+
+
+# Estudio normalizado: {nombre, carga (filas validadas y errores), datos numéricos, fuentes, relés}
+def estudio_desde_json(contenido, nombre, directorio="", predeterminados=PREDETERMINADOS):
+    datos = dict(predeterminados)
+    red = contenido["red"]
+    if isinstance(red, str):
+        carga = _leer_red(os.path.join(directorio, red))
+    else:
+        carga = importacion.validar_registros(enumerate(red, start=1))
+    for campo in PREDETERMINADOS:
+        if contenido.get(campo) is not None:
+            datos[campo] = float(contenido[campo])
+    fuentes = {
+        str(nodo).strip(): cmath.rect(float(z_mag), math.radians(float(z_ang)))
+        for nodo, (z_mag, z_ang) in (contenido.get("fuentes") or {}).items()
+    }
+    return {
+        "nombre": str(contenido.get("nombre") or nombre), "carga": carga, "datos": datos,
+        "fuentes": fuentes, "reles": contenido.get("reles"),
+    }
+
+
+def leer_estudio(ruta, predeterminados=PREDETERMINADOS):
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    if ruta.lower().endswith(".json"):
+        with open(ruta, encoding="utf-8-sig") as flujo:
+            contenido = json.load(flujo)
+        if isinstance(contenido, dict) and "red" in contenido:
+            return estudio_desde_json(contenido, nombre, os.path.dirname(ruta), predeterminados)
+    return {
+        "nombre": nombre, "carga": _leer_red(ruta), "datos": dict(predeterminados), "fuentes": {}, "reles": None,
+    }
+
+
+# Relés pedidos como [{"linea": n (1, 2, ...), "extremo": "origen" | "destino"}] -> (rama_rele, sentido)
+def _reles_pedidos(indice, reles):
+    if reles is None:
+        return None, None
+    rama_rele = np.empty(len(reles), dtype=np.int64)
+    sentido = np.empty(len(reles), dtype=np.int8)
+    for k, rele in enumerate(reles):
+        linea = int(rele["linea"]) - 1
+        extremo = rele.get("extremo", "origen")
+        if not 0 <= linea < len(indice["rama_de_linea"]) or indice["rama_de_linea"][linea] < 0:
+            raise ValueError(f"la línea {linea + 1} no existe o no tiene ambos nodos")
+        if extremo not in ("origen", "destino"):
+            raise ValueError(f"extremo desconocido ({extremo!r})")
+        rama_rele[k] = indice["rama_de_linea"][linea]
+        sentido[k] = 0 if extremo == "origen" else 1
+    return rama_rele, sentido
+
+
+# ------------------------------------------------------------------------------------------------
+# Cálculo de un estudio: las mismas funciones que usa la página (modelo -> índice -> zonas)
+# ------------------------------------------------------------------------------------------------
+def calcular_estudio(estudio):
+    datos = estudio["datos"]
+    ajuste = datos["rtc"] / datos["rtp"] if datos["rtp"] != 0 else 1.0
+    red = modelo_red.desde_filas(estudio["carga"]["filas"], ajuste)
+    indice = coordinacion.indice_desde_modelo(red)
+
+    rama_rele, sentido = _reles_pedidos(indice, estudio.get("reles"))
+    if estudio["fuentes"] and datos["tension_kv"] > 0:
+        import cortocircuito
+
+        # Igual que en el Paso 4: la corriente de cada rama es su aporte a la falla en su destino
+        fallas = cortocircuito.fallas_trifasicas(indice, estudio["fuentes"], datos["tension_kv"], ajuste)
+        con_param = indice["tiene_param"]
+        modelo_red.asignar(red, indice["id"][con_param], icc=fallas["i_en_destino"][con_param])
+        coordinacion.parametros_desde_modelo(indice, red)
+        zonas_reles = coordinacion.calcular_zonas(indice, datos["porcentaje_z1"], rama_rele, sentido)
+        resultado = cortocircuito.aplicar_infeed(zonas_reles, indice, fallas)
+    else:
+        resultado = coordinacion.calcular_zonas(indice, datos["porcentaje_z1"], rama_rele, sentido)
+
+    return coordinacion.tabla_coordinacion(coordinacion.agregar_r_arco(resultado, datos["theta"]))
+
+
+def _valor_json(valor):
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def resultado_json(tabla, estudio):
+    return {
+        "estudio": estudio["nombre"],
+        "datos": estudio["datos"],
+        "errores": estudio["carga"]["errores"],
+        "reles": {c: [_valor_json(v) for v in np.asarray(valores).tolist()] for c, valores in tabla.items()},
+    }
+
+
+def tabla_a_json(tabla, estudio):
+    return json.dumps(resultado_json(tabla, estudio), ensure_ascii=False)
+
+
+# Nombre de archivo del estudio (el "nombre" del JSON puede traer carpetas): solo el último
+# componente, para que la salida nunca quede fuera del directorio -o
+def _nombre_archivo(nombre, ruta):
+    limpio = os.path.basename(nombre.replace("\\", "/").rstrip("/")).strip()
+    return limpio if limpio not in ("", ".", "..") else os.path.splitext(os.path.basename(ruta))[0]
+
+
+# Prefijo de salida de cada estudio: su carpeta relativa a la carpeta común del lote, con "__" como
+# separador (subestaciones/norte/red.csv y subestaciones/sur/red.csv -> norte__red, sur__red)
+def _prefijos(rutas):
+    carpetas = [os.path.dirname(os.path.abspath(r)) for r in rutas]
+    comun = os.path.commonpath(carpetas)
+    return ["" if c == comun else os.path.relpath(c, comun).replace(os.sep, "__") + "__" for c in carpetas]
+
+
+# Lee, calcula y escribe un estudio; devuelve solo el resumen (la tabla no vuelve al proceso principal)
+def procesar(ruta, directorio, formato, predeterminados=PREDETERMINADOS, prefijo=""):
+    inicio = time.perf_counter()
+    try:
+        estudio = leer_estudio(ruta, predeterminados)
+        tabla = calcular_estudio(estudio)
+        salida = os.path.join(directorio, f"{prefijo}{_nombre_archivo(estudio['nombre'], ruta)}.{formato}")
+        texto = coordinacion.tabla_a_csv(tabla) if formato == "csv" else tabla_a_json(tabla, estudio)
+        with open(salida, "w", encoding="utf-8", newline="") as flujo:
+            flujo.write(texto)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return {"estudio": ruta, "ok": False, "error": f"{type(e).__name__}: {e}",
+                "segundos": time.perf_counter() - inicio}
+    return {
+        "estudio": ruta, "ok": True, "salida": salida, "reles": len(tabla["linea"]),
+        "advertencias": estudio["carga"]["errores"], "segundos": time.perf_counter() - inicio,
+    }
+
+
+# Dos estudios con la misma salida (mismo nombre en la misma carpeta) se pisarían y no se sabe cuál
+# escribió último: ambos se marcan como error y el archivo se borra
+def _marcar_repetidos(resumen):
+    por_salida = {}
+    for r in resumen:
+        if r["ok"]:
+            por_salida.setdefault(os.path.normcase(os.path.abspath(r["salida"])), []).append(r)
+    for salida, grupo in por_salida.items():
+        if len(grupo) > 1:
+            if os.path.exists(salida):
+                os.remove(salida)
+            estudios = ", ".join(r["estudio"] for r in grupo)
+            for r in grupo:
+                r.update({"ok": False, "error": f"ValueError: salida repetida {r['salida']} ({estudios})"})
+    return resumen
+
+
+# Estudios repartidos en un pool de procesos (en el mismo proceso si hay uno solo o procesos=1)
+def procesar_lote(rutas, directorio, formato="csv", procesos=None, predeterminados=PREDETERMINADOS):
+    os.makedirs(directorio, exist_ok=True)
+    prefijos = _prefijos(rutas) if rutas else []
+    procesos = min(procesos or os.cpu_count() or 1, len(rutas))
+    if procesos <= 1:
+        return _marcar_repetidos([
+            procesar(r, directorio, formato, predeterminados, p) for r, p in zip(rutas, prefijos)
+        ])
+    tam_tanda = max(1, len(rutas) // (4 * procesos))
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return _marcar_repetidos(list(pool.map(
+            procesar, rutas, [directorio] * len(rutas), [formato] * len(rutas),
+            [predeterminados] * len(rutas), prefijos, chunksize=tam_tanda
+        )))
+
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(
+        prog="lote.py", description="Calcula los ajustes de distancia (Pasos 5 y 6) de uno o más estudios."
+    )
+    parser.add_argument("estudios", nargs="+", help="archivos de estudio (.json) o de red (.csv/.json/.jsonl)")
+    parser.add_argument("-o", "--salida", default="ajustes", help="directorio de salida (predeterminado: ajustes)")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos del pool (predeterminado: CPUs)")
+    parser.add_argument("--rtc", type=float, default=PREDETERMINADOS["rtc"])
+    parser.add_argument("--rtp", type=float, default=PREDETERMINADOS["rtp"])
+    parser.add_argument("--porcentaje-z1", type=float, default=PREDETERMINADOS["porcentaje_z1"])
+    parser.add_argument("--theta", type=float, default=PREDETERMINADOS["theta"], help="ángulo de R_arco (°)")
+    parser.add_argument("--tension-kv", type=float, default=PREDETERMINADOS["tension_kv"])
+    parser.add_argument("--resumen", help="escribe el resumen del lote en este archivo JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _argumentos(argv)
+    predeterminados = {campo: getattr(args, campo) for campo in PREDETERMINADOS}
+    inicio = time.perf_counter()
+    resumen = procesar_lote(args.estudios, args.salida, args.formato, args.procesos, predeterminados)
+
+    for r in resumen:
+        if r["ok"]:
+            print(f"{r['estudio']}: {r['reles']} relés -> {r['salida']} ({r['segundos']:.3f} s)")
+            for advertencia in r["advertencias"]:
+                print(f"  ⚠️ {advertencia}", file=sys.stderr)
+        else:
+            print(f"{r['estudio']}: ERROR {r['error']}", file=sys.stderr)
+    fallidos = sum(not r["ok"] for r in resumen)
+    print(f"{len(resumen) - fallidos}/{len(resumen)} estudios en {time.perf_counter() - inicio:.3f} s")
+
+    if args.resumen:
+        with open(args.resumen, "w", encoding="utf-8") as flujo:
+            json.dump(resumen, flujo, ensure_ascii=False, indent=2)
+    return 1 if fallidos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import numpy as np
+
+# Códigos de tipo de rama
+LINEA = 0
+TRAFO = 1
+TIPOS = {"linea": LINEA, "trafo": TRAFO}
+NOMBRES_TIPO = {LINEA: "linea", TRAFO: "trafo"}
+
+# Columnas por rama (estructura de arreglos): ~50 bytes por rama
+COLUMNAS = {
+    "id": np.int64,          # identificador estable (no cambia al editar ni al reordenar)
+    "tipo": np.int8,
+    "origen": np.int32,      # nodo internado (-1 = sin definir)
+    "destino": np.int32,
+    "z": np.complex128,      # impedancia (Ω, con el ajuste RTC/RTP aplicado)
+    "icc": np.complex128,    # corriente de cortocircuito (A)
+    "tiene_param": np.bool_,
+}
+
+
+# ------------------------------------------------------------------------------------------------
+# Modelo de red: nodos internados a enteros y ramas en columnas NumPy, en el orden de edición.
+# Las ramas paralelas entre los mismos nodos son registros distintos con su propio id.
+# "version" cambia cada vez que cambia la topología (ids, tipos o extremos).
+# ------------------------------------------------------------------------------------------------
+def red_vacia():
+    red = {c: np.empty(0, dtype=t) for c, t in COLUMNAS.items()}
+    red.update({"nodos": [], "nodo_id": {}, "proximo_id": 0, "version": 0})
+    return red
+
+
+def _internar(red, nombres):
+    nodo_id = red["nodo_id"]
+    ids = np.empty(len(nombres), dtype=np.int32)
+    for i, nombre in enumerate(nombres):
+        nombre = "" if nombre is None else str(nombre).strip()
+        if not nombre:
+            ids[i] = -1
+            continue
+        n = nodo_id.get(nombre)
+        if n is None:
+            n = nodo_id[nombre] = len(red["nodos"])
+            red["nodos"].append(nombre)
+        ids[i] = n
+    return ids
+
+
+def _id_de(elemento):
+    valor = elemento.get("id")
+    if valor is None or valor == "" or valor != valor:
+        return None
+    return int(valor)
+
+
+def nuevo_id(red):
+    red["proximo_id"] += 1
+    return red["proximo_id"] - 1
+
+
+# Asigna un id nuevo a los elementos que no lo tienen (en el lugar)
+def fijar_ids(red, elementos):
+    for elemento in elementos:
+        if _id_de(elemento) is None:
+            elemento["id"] = nuevo_id(red)
+        else:
+            red["proximo_id"] = max(red["proximo_id"], _id_de(elemento) + 1)
+    return elementos
+
+
+# Posición de cada id en las columnas (-1 si no existe)
+def filas(red, ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(red["id"]):
+        return np.full(len(ids), -1, dtype=np.int64)
+    orden = np.argsort(red["id"], kind="stable")
+    ordenados = red["id"][orden]
+    pos = np.searchsorted(ordenados, ids).clip(0, len(ordenados) - 1)
+    return np.where(ordenados[pos] == ids, orden[pos], -1)
+
+
+# ------------------------------------------------------------------------------------------------
+# Sincroniza el modelo con una lista de elementos {id, tipo, origen, destino[, z_mag, z_ang, i_mag,
+# i_ang]} en su orden. Los elementos sin id reciben ids provisionales (proximo_id + k) que se
+# vuelven definitivos con fijar_ids. Con con_parametros=False se conservan los parámetros
+# que ya tenía cada id (los del Paso 4).
+# ------------------------------------------------------------------------------------------------
+def sincronizar(red, elementos, ajuste_impedancia=1.0, con_parametros=False):
+    n = len(elementos)
+    ids = np.empty(n, dtype=np.int64)
+    provisional = red["proximo_id"]
+    for i, elemento in enumerate(elementos):
+        id_elemento = _id_de(elemento)
+        if id_elemento is None:
+            id_elemento = provisional
+            provisional += 1
+        ids[i] = id_elemento
+    tipo = np.array([TIPOS.get(e.get("tipo"), e.get("tipo")) for e in elementos], dtype=np.int8)
+    origen = _internar(red, [e.get("origen") for e in elementos])
+    destino = _internar(red, [e.get("destino") for e in elementos])
+
+    if con_parametros:
+        valor = lambda campo: np.array([float(e.get(campo) or 0.0) for e in elementos], dtype=np.float64)
+        z = valor("z_mag") * ajuste_impedancia * np.exp(1j * np.radians(valor("z_ang")))
+        icc = valor("i_mag") * np.exp(1j * np.radians(valor("i_ang")))
+        tiene_param = np.ones(n, dtype=bool)
+    else:
+        previas = filas(red, ids)
+        existe = previas >= 0
+        z = np.zeros(n, dtype=np.complex128)
+        icc = np.zeros(n, dtype=np.complex128)
+        tiene_param = np.zeros(n, dtype=bool)
+        z[existe] = red["z"][previas[existe]]
+        icc[existe] = red["icc"][previas[existe]]
+        tiene_param[existe] = red["tiene_param"][previas[existe]]
+
+    topologia_igual = all(
+        np.array_equal(red[c], v) for c, v in (("id", ids), ("tipo", tipo), ("origen", origen), ("destino", destino))
+    )
+    red.update({
+        "id": ids, "tipo": tipo, "origen": origen, "destino": destino,
+        "z": z.astype(np.complex128), "icc": icc.astype(np.complex128), "tiene_param": tiene_param.astype(bool),
+    })
+    if not topologia_igual:
+        red["version"] += 1
+    return red
+
+
+# Escribe parámetros por id (vectorizado); las ramas con Z asignada quedan con parámetros
+def asignar(red, ids, z=None, icc=None):
+    pos = filas(red, ids)
+    ok = pos >= 0
+    if z is not None:
+        red["z"][pos[ok]] = np.broadcast_to(z, ok.shape)[ok]
+        red["tiene_param"][pos[ok]] = True
+    if icc is not None:
+        red["icc"][pos[ok]] = np.broadcast_to(icc, ok.shape)[ok]
+    return red
+
+
+# ------------------------------------------------------------------------------------------------
+# Vistas para la interfaz: filas de la tabla de red y listas de elementos del formulario
+# ------------------------------------------------------------------------------------------------
+def nombres(red, nodos):
+    return ["" if n < 0 else red["nodos"][n] for n in nodos]
+
+
+def a_filas(red, ajuste_impedancia=1.0):
+    tipos = [NOMBRES_TIPO[int(t)] for t in red["tipo"]]
+    z_mag = np.abs(red["z"]) / (ajuste_impedancia or 1.0)
+    return [
+        {
+            "id": int(i), "tipo": t, "origen": o, "destino": d,
+            "z_mag": float(zm), "z_ang": float(za), "i_mag": float(im), "i_ang": float(ia),
+        }
+        for i, t, o, d, zm, za, im, ia in zip(
+            red["id"], tipos, nombres(red, red["origen"]), nombres(red, red["destino"]),
+            z_mag, np.degrees(np.angle(red["z"])), np.abs(red["icc"]), np.degrees(np.angle(red["icc"]))
+        )
+    ]
+
+
+# Líneas y transformadores como listas [{id, origen, destino}] en el orden del modelo
+def listas(red):
+    origenes, destinos = nombres(red, red["origen"]), nombres(red, red["destino"])
+    elementos = {LINEA: [], TRAFO: []}
+    for i, t, o, d in zip(red["id"], red["tipo"], origenes, destinos):
+        elementos[int(t)].append({"id": int(i), "origen": o, "destino": d})
+    return elementos[LINEA], elementos[TRAFO]
+
+
+def cantidad(red, tipo=None):
+    return len(red["id"]) if tipo is None else int((red["tipo"] == tipo).sum())
+
+
+def bytes_por_rama(red):
+    n = len(red["id"])
+    return sum(red[c].nbytes for c in COLUMNAS) / n if n else float(sum(np.dtype(t).itemsize for t in COLUMNAS.values()))
+
+
+def desde_filas(filas_red, ajuste_impedancia=1.0):
+    red = red_vacia()
+    return sincronizar(red, fijar_ids(red, [dict(f) for f in filas_red]), ajuste_impedancia, con_parametros=True)
@@ -0,0 +1,153 @@
+import numpy as np
+
+import coordinacion
+import cortocircuito
+import perfilador
+
+
+# Relés agrupados por nodo en formato CSR: ptr (n_nodos + 1) y relés ordenados por nodo
+def _por_nodo(nodo_de_rele, n_nodos):
+    ptr = np.zeros(n_nodos + 1, dtype=np.int64)
+    np.cumsum(np.bincount(nodo_de_rele, minlength=n_nodos), out=ptr[1:])
+    return ptr, np.argsort(nodo_de_rele, kind="stable")
+
+
+def _en_nodos(ptr, reles, nodos):
+    if not len(nodos):
+        return reles[:0]
+    return np.concatenate([reles[ptr[n]:ptr[n + 1]] for n in nodos])
+
+
+def _iguales(a, b):
+    if a.dtype.kind in "fc":
+        return (a == b) | (np.isnan(a) & np.isnan(b))
+    return a == b
+
+
+# ------------------------------------------------------------------------------------------------
+# Recálculo incremental de las zonas de todos los relés.
+#
+# Grafo de dependencias entre entradas y valores derivados (por relé con nodos A -> B):
+#   Z / parámetros de la rama b  -> alcances e infeed de los relés con A o B en un extremo de b
+#                                   (Z2/Z3 miran las ramas de B, Z4 las de A, Z1 la propia línea)
+#   I de la rama b               -> infeed de los relés cuyo nodo B es el origen de b (aguas abajo)
+#                                   y de los relés de la propia rama (I_r)
+#   porcentaje de Z1             -> Z1 de todos los relés (nada más depende de Z1)
+#   RTC/RTP                      -> llegan como cambio de Z en todas las ramas
+#   fuentes / Zbus               -> con config_falla el infeed sale de las fallas de toda la red:
+#                                   cualquier cambio de Z o de fuentes recalcula el infeed de todos
+# Solo se recalculan los relés sucios; el resto de columnas se copia sin tocar (el resultado
+# anterior puede seguir en uso).
+# ------------------------------------------------------------------------------------------------
+class MotorZonas:
+    def __init__(self, indice, porcentaje_z1=85, config_falla=None):
+        self.indice = indice
+        self.ultimo_informe = None
+        self._reconstruir(porcentaje_z1, config_falla)
+
+    def _reconstruir(self, porcentaje_z1, config_falla):
+        indice = self.indice
+        self.porcentaje_z1 = porcentaje_z1
+        self.config_falla = config_falla
+        self.rama_rele, self.sentido = coordinacion.reles_de_red(indice)
+        self._entradas = {k: indice[k].copy() for k in ("z", "i_mag", "tiene_param")}
+        # Mismos relés que reles_de_red: el cálculo inicial se comparte con la caché entre sesiones
+        self._local = coordinacion.zonas_red(indice, porcentaje_z1)
+        self.resultado = self._con_infeed(self._local)
+
+        n_nodos = len(indice["nodos"])
+        self._por_a = _por_nodo(self._local["nodo_rele"], n_nodos)
+        self._por_b = _por_nodo(self._local["nodo_remoto"], n_nodos)
+        self._por_rama = _por_nodo(self.rama_rele, len(indice["origen"]))
+
+    def _con_infeed(self, resultado):
+        if not self.config_falla:
+            return resultado
+        fallas = cortocircuito.fallas_red(self.indice, **self.config_falla)
+        return cortocircuito.aplicar_infeed(resultado, self.indice, fallas)
+
+    # Relés afectados por un conjunto de ramas con Z o parámetros distintos
+    def _dependientes_z(self, ramas):
+        extremos = np.unique(np.concatenate([self.indice["origen"][ramas], self.indice["destino"][ramas]]))
+        return np.union1d(_en_nodos(*self._por_a, extremos), _en_nodos(*self._por_b, extremos))
+
+    # Relés afectados por un conjunto de ramas con corriente distinta
+    def _dependientes_i(self, ramas):
+        return np.union1d(
+            _en_nodos(*self._por_b, np.unique(self.indice["origen"][ramas])),
+            _en_nodos(*self._por_rama, ramas),
+        )
+
+    # --------------------------------------------------------------------------------------------
+    # Compara las entradas actuales del índice (se modifica en el lugar) con las de la última
+    # sincronización, recalcula lo necesario y devuelve el informe del cambio.
+    # --------------------------------------------------------------------------------------------
+    @perfilador.medido("motor de zonas")
+    def sincronizar(self, porcentaje_z1=None, config_falla=None):
+        indice = self.indice
+        porcentaje_z1 = self.porcentaje_z1 if porcentaje_z1 is None else porcentaje_z1
+        anterior = self.resultado
+
+        cambio_z = np.flatnonzero(
+            (indice["z"] != self._entradas["z"]) | (indice["tiene_param"] != self._entradas["tiene_param"])
+        )
+        cambio_i = np.flatnonzero(indice["i_mag"] != self._entradas["i_mag"])
+        cambio_porcentaje = porcentaje_z1 != self.porcentaje_z1
+        cambio_fallas = config_falla != self.config_falla or (bool(config_falla) and cambio_z.size > 0)
+        if not (cambio_z.size or cambio_i.size or cambio_porcentaje or cambio_fallas):
+            return None
+
+        rama_rele, _ = coordinacion.reles_de_red(indice)
+        if not np.array_equal(rama_rele, self.rama_rele):
+            # Cambió el conjunto de líneas con parámetros (y con él la lista de relés)
+            self._reconstruir(porcentaje_z1, config_falla)
+            self.ultimo_informe = {
+                "recalculados": len(self.rama_rele),
+                "cambiados": np.arange(len(self.rama_rele)),
+                "ramas": np.union1d(cambio_z, cambio_i),
+                "completo": True,
+            }
+            return self.ultimo_informe
+
+        sucios = np.union1d(self._dependientes_z(cambio_z), self._dependientes_i(cambio_i)).astype(np.int64)
+        local = dict(self._local)
+        if sucios.size:
+            parcial = coordinacion.calcular_zonas(
+                indice, porcentaje_z1, self.rama_rele[sucios], self.sentido[sucios]
+            )
+            for clave, valor in parcial.items():
+                if isinstance(valor, np.ndarray) and clave in local:
+                    completo = np.array(local[clave], copy=True)
+                    completo[sucios] = valor
+                    local[clave] = completo
+        if cambio_porcentaje:
+            local["z1"] = (np.asarray(porcentaje_z1) / 100) * local["z_linea"]
+
+        self.porcentaje_z1 = porcentaje_z1
+        self.config_falla = config_falla
+        self._entradas = {k: indice[k].copy() for k in ("z", "i_mag", "tiene_param")}
+        self._local = local
+        self.resultado = self._con_infeed(local)
+
+        # Relés cuyo resultado cambió efectivamente (los sucios, o todos si cambió Z1 o el infeed global)
+        candidatos = np.arange(len(self.rama_rele)) if cambio_porcentaje or self.config_falla else sucios
+        distinto = np.zeros(len(candidatos), dtype=bool)
+        for clave, valor in self.resultado.items():
+            if isinstance(valor, np.ndarray) and clave in anterior and valor.shape == anterior[clave].shape:
+                distinto |= ~_iguales(valor[candidatos], anterior[clave][candidatos])
+        self.ultimo_informe = {
+            "recalculados": len(sucios),
+            "cambiados": candidatos[distinto],
+            "ramas": np.union1d(cambio_z, cambio_i),
+            "completo": False,
+        }
+        return self.ultimo_informe
+
+    # Etiquetas legibles de los relés de un informe
+    def describir(self, reles):
+        nodos = self.indice["nodos"]
+        return [
+            f"{self.indice['clave'][self.rama_rele[r]]} ({nodos[self._local['nodo_rele'][r]]} → "
+            f"{nodos[self._local['nodo_remoto'][r]]})"
+            for r in reles
+        ]
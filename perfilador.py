@@ -0,0 +1,204 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# Eventos guardados por sesión (los más viejos se descartan)
+MAX_EVENTOS = 20000
+
+# ------------------------------------------------------------------------------------------------
+# Perfilador opcional de los Pasos y de las secciones críticas.
+#
+# Con el perfilador apagado (sin registro activo en el hilo) seccion() devuelve siempre el mismo
+# contexto vacío y medido() llama directo a la función: el costo es una lectura de un atributo
+# del hilo. Con un registro activo, cada sección guarda un evento
+#   {nombre, corrida, inicio_us, duracion_us, profundidad, hilo, widgets}
+# (widgets = widgets creados dentro de la sección, si el registro tiene contador_widgets).
+# ------------------------------------------------------------------------------------------------
+_hilo = threading.local()
+_NULO = nullcontext()
+
+
+class Registro:
+    def __init__(self, max_eventos=MAX_EVENTOS, contador_widgets=None):
+        self.max_eventos = max_eventos
+        self.contador_widgets = contador_widgets
+        self.eventos = []
+        self.corrida = 0
+        self.memoria = {}
+        self._origen_ns = time.perf_counter_ns()
+        self._lock = threading.Lock()
+
+    def nueva_corrida(self):
+        self.corrida += 1
+
+    def agregar(self, evento):
+        with self._lock:
+            self.eventos.append(evento)
+            if len(self.eventos) > self.max_eventos:
+                del self.eventos[:len(self.eventos) - self.max_eventos]
+
+    def limpiar(self):
+        with self._lock:
+            self.eventos.clear()
+
+
+class _Seccion:
+    __slots__ = ("registro", "nombre", "inicio", "widgets", "profundidad")
+
+    def __init__(self, registro, nombre):
+        self.registro = registro
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.profundidad = getattr(_hilo, "profundidad", 0)
+        _hilo.profundidad = self.profundidad + 1
+        contador = self.registro.contador_widgets
+        self.widgets = contador() if contador else None
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        fin = time.perf_counter_ns()
+        _hilo.profundidad = self.profundidad
+        contador = self.registro.contador_widgets
+        self.registro.agregar({
+            "nombre": self.nombre,
+            "corrida": self.registro.corrida,
+            "inicio_us": (self.inicio - self.registro._origen_ns) / 1000,
+            "duracion_us": (fin - self.inicio) / 1000,
+            "profundidad": self.profundidad,
+            "hilo": threading.get_ident(),
+            "widgets": contador() - self.widgets if contador else None,
+        })
+        return False
+
+
+def seccion(nombre):
+    registro = getattr(_hilo, "registro", None)
+    return _NULO if registro is None else _Seccion(registro, nombre)
+
+
+# Decorador: mide cada llamada a la función como una sección
+def medido(nombre):
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            registro = getattr(_hilo, "registro", None)
+            if registro is None:
+                return funcion(*args, **kwargs)
+            with _Seccion(registro, nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# Activa un registro en el hilo (None lo apaga); devuelve el anterior para restaurarlo
+def fijar(registro):
+    anterior = getattr(_hilo, "registro", None)
+    _hilo.registro = registro
+    _hilo.profundidad = 0
+    return anterior
+
+
+# Registro activo solo dentro del bloque (p. ej. la ejecución de un fragmento)
+@contextmanager
+def activo(registro):
+    anterior = getattr(_hilo, "registro", None)
+    profundidad = getattr(_hilo, "profundidad", 0)
+    _hilo.registro = registro
+    try:
+        yield registro
+    finally:
+        _hilo.registro = anterior
+        _hilo.profundidad = profundidad
+
+
+# Sección abierta sin bloque "with" (código de nivel superior); se cierra con terminar()
+def iniciar(nombre):
+    actual = seccion(nombre)
+    actual.__enter__()
+    return actual
+
+
+def terminar(actual):
+    actual.__exit__(None, None, None)
+
+
+# ------------------------------------------------------------------------------------------------
+# Memoria: RSS del proceso y tamaño aproximado de un estado (arreglos NumPy por nbytes, el resto
+# por sys.getsizeof recorriendo contenedores hasta max_profundidad)
+# ------------------------------------------------------------------------------------------------
+def rss_proceso():
+    try:
+        with open("/proc/self/statm") as flujo:
+            return int(flujo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # ru_maxrss: pico (KiB en Linux, bytes en macOS)
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == "darwin" else pico * 1024
+
+
+def tamano_aproximado(valor, max_profundidad=4, _vistos=None):
+    vistos = set() if _vistos is None else _vistos
+    if id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    if isinstance(valor, np.ndarray):
+        return max(sys.getsizeof(valor), valor.nbytes)
+    tamano = sys.getsizeof(valor, 0)
+    if max_profundidad <= 0:
+        return tamano
+    if isinstance(valor, dict):
+        for k, v in valor.items():
+            tamano += tamano_aproximado(k, max_profundidad - 1, vistos) + tamano_aproximado(v, max_profundidad - 1, vistos)
+    elif isinstance(valor, (list, tuple, set, frozenset)):
+        for v in valor:
+            tamano += tamano_aproximado(v, max_profundidad - 1, vistos)
+    return tamano
+
+
+# ------------------------------------------------------------------------------------------------
+# Resumen y exportación
+# ------------------------------------------------------------------------------------------------
+# Tabla por columnas con llamadas, total, media y máximo (ms) y widgets por sección
+def resumen(eventos):
+    por_nombre = {}
+    for e in eventos:
+        por_nombre.setdefault(e["nombre"], []).append(e)
+    tabla = {"seccion": [], "llamadas": [], "total_ms": [], "media_ms": [], "max_ms": [], "widgets": []}
+    for nombre, grupo in sorted(por_nombre.items(), key=lambda g: -sum(e["duracion_us"] for e in g[1])):
+        duraciones = np.array([e["duracion_us"] for e in grupo]) / 1000
+        widgets = [e["widgets"] for e in grupo if e["widgets"] is not None]
+        tabla["seccion"].append(nombre)
+        tabla["llamadas"].append(len(grupo))
+        tabla["total_ms"].append(round(float(duraciones.sum()), 3))
+        tabla["media_ms"].append(round(float(duraciones.mean()), 3))
+        tabla["max_ms"].append(round(float(duraciones.max()), 3))
+        tabla["widgets"].append(max(widgets) if widgets else None)
+    return tabla
+
+
+def exportar_json(registro):
+    return json.dumps({"eventos": registro.eventos, "memoria": registro.memoria}, ensure_ascii=False, indent=1)
+
+
+# Formato de eventos de traza (Chrome / Perfetto / about:tracing): eventos completos "X"
+def exportar_traza(registro, proceso="protec21"):
+    eventos = [
+        {
+            "name": e["nombre"], "cat": "seccion", "ph": "X", "ts": e["inicio_us"], "dur": e["duracion_us"],
+            "pid": os.getpid(), "tid": e["hilo"],
+            "args": {"corrida": e["corrida"], **({"widgets": e["widgets"]} if e["widgets"] is not None else {})},
+        }
+        for e in registro.eventos
+    ]
+    eventos.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": proceso}})
+    return json.dumps({"traceEvents": eventos, "displayTimeUnit": "ms"})
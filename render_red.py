@@ -0,0 +1,193 @@
+import numpy as np
+from matplotlib.collections import LineCollection
+
+import perfilador
+import vista_vega
+
+# Por encima de estos umbrales se omiten las etiquetas (nivel de detalle)
+MAX_ETIQUETAS_NODOS = 150
+MAX_ETIQUETAS_TRAFOS = 300
+
+
+# Tamaño de nodo y de fuente según la cantidad de nodos
+def _escala(n_nodos):
+    if n_nodos <= 50:
+        return 800, 12
+    if n_nodos <= 500:
+        return 200, 8
+    return max(4, 80000 / n_nodos), 6
+
+
+# Extremos de todas las aristas como arreglos (n, 2) en el orden de G.edges
+def _aristas(G, pos, tipo):
+    aristas = [(u, v, k) for u, v, k, d in G.edges(keys=True, data=True) if d["tipo"] == tipo]
+    if not aristas:
+        vacio = np.empty((0, 2))
+        return aristas, vacio, vacio
+    p0 = np.array([pos[u] for u, _, _ in aristas], dtype=float)
+    p1 = np.array([pos[v] for _, v, _ in aristas], dtype=float)
+    return aristas, p0, p1
+
+
+# Desplazamiento perpendicular de líneas paralelas, calculado para todas a la vez
+def desplazar_paralelas(aristas, p0, p1, separacion=0.05):
+    if not aristas:
+        return p0, p1
+    nodos = {}
+    pares = np.array(
+        [sorted((nodos.setdefault(u, len(nodos)), nodos.setdefault(v, len(nodos)))) for u, v, _ in aristas]
+    )
+    _, grupo, tam = np.unique(pares, axis=0, return_inverse=True, return_counts=True)
+    grupo = grupo.ravel()
+
+    # Posición de cada arista dentro de su grupo, respetando el orden original
+    orden = np.argsort(grupo, kind="stable")
+    inicio_grupo = np.concatenate([[0], np.cumsum(tam)[:-1]])
+    rango = np.empty(len(grupo), dtype=np.int64)
+    rango[orden] = np.arange(len(grupo)) - inicio_grupo[grupo[orden]]
+
+    offset = (rango - (tam[grupo] - 1) / 2) * separacion
+    perp = np.column_stack([p1[:, 1] - p0[:, 1], p0[:, 0] - p1[:, 0]])
+    norma = np.hypot(perp[:, 0], perp[:, 1])
+    norma[norma == 0] = 1
+    desplazamiento = perp / norma[:, None] * offset[:, None]
+    return p0 + desplazamiento, p1 + desplazamiento
+
+
+@perfilador.medido("dibujo de la red")
+def dibujar_red(ax, G, pos, linea_protegida_idx=None, lp_origen=None, lp_destino=None):
+    nombres = list(G.nodes)
+    xy = np.array([pos[n] for n in nombres], dtype=float).reshape(-1, 2)
+    tam_nodo, tam_fuente = _escala(len(nombres))
+
+    # --- Líneas (una sola LineCollection; la protegida en verde) ---
+    aristas, p0, p1 = _aristas(G, pos, "linea")
+    p0, p1 = desplazar_paralelas(aristas, p0, p1)
+    colores = np.full(len(aristas), "gray", dtype=object)
+    if linea_protegida_idx is not None and linea_protegida_idx < len(aristas):
+        colores[linea_protegida_idx] = "green"
+    ancho_linea = 3 if len(nombres) <= 500 else 1
+    ax.add_collection(LineCollection(np.stack([p0, p1], axis=1), colors=list(colores), linewidths=ancho_linea, zorder=1))
+
+    # --- Transformadores (LineCollection discontinua + marcadores "T") ---
+    trafos, t0, t1 = _aristas(G, pos, "trafo")
+    if trafos:
+        ax.add_collection(LineCollection(
+            np.stack([t0, t1], axis=1), colors="red", linewidths=2 if len(nombres) <= 500 else 1,
+            linestyles="dashed", zorder=1
+        ))
+        if len(trafos) <= MAX_ETIQUETAS_TRAFOS:
+            medio = (t0 + t1) / 2
+            ax.scatter(medio[:, 0], medio[:, 1], s=tam_fuente * 30, marker="s", facecolor="white",
+                       edgecolor="black", zorder=3)
+            ax.scatter(medio[:, 0], medio[:, 1], s=tam_fuente * 12, marker="$T$", color="black", zorder=4)
+
+    # --- Nodos (una PathCollection) y etiquetas según nivel de detalle ---
+    ax.scatter(xy[:, 0], xy[:, 1], s=tam_nodo, c="lightblue", zorder=2)
+    if len(nombres) <= MAX_ETIQUETAS_NODOS:
+        for nombre, (x, y) in zip(nombres, xy):
+            ax.text(x, y, nombre, fontsize=tam_fuente, fontweight="bold", ha="center", va="center", zorder=5)
+
+    # === Dibujar recuadro "R" encima de la línea protegida, cerca al nodo de origen ===
+    if lp_origen in pos and lp_destino in pos:
+        x0, y0 = pos[lp_origen]
+        x1, y1 = pos[lp_destino]
+
+        # Calcular punto entre origen y destino, más cerca del origen (80%)
+        rx = x0 * 0.8 + x1 * 0.2
+        ry = y0 * 0.8 + y1 * 0.2
+
+        ax.text(
+            rx, ry, "R",
+            fontsize=14, fontweight="bold", ha="center", va="center", zorder=6,
+            bbox=dict(facecolor="mediumpurple", edgecolor="black", boxstyle="round,pad=0.3")
+        )
+
+    ax.autoscale_view()
+    ax.margins(0.08)
+    ax.tick_params(axis="both", which="both", bottom=False, left=False, labelbottom=False, labelleft=False)
+    return ax
+
+
+# ------------------------------------------------------------------------------------------------
+# Vista vectorial de la red (Vega-Lite, ver vista_vega): nodos y ramas como arreglos compactos,
+# con zoom, desplazamiento y tooltips en el navegador
+# ------------------------------------------------------------------------------------------------
+def _segmentos(aristas, p0, p1):
+    return vista_vega.columnas(
+        x=p0[:, 0], y=p0[:, 1], x2=p1[:, 0], y2=p1[:, 1],
+        origen=[str(u) for u, _, _ in aristas], destino=[str(v) for _, v, _ in aristas]
+    )
+
+
+@perfilador.medido("vista de la red")
+def especificacion_red(G, pos, linea_protegida_idx=None, lp_origen=None, lp_destino=None, alto=520):
+    nombres = list(G.nodes)
+    xy = np.array([pos[n] for n in nombres], dtype=float).reshape(-1, 2)
+    tam_nodo, tam_fuente = _escala(len(nombres))
+    # Dominio inicial con el mismo margen que el dibujo de matplotlib (8 %)
+    minimo, maximo = (xy.min(axis=0), xy.max(axis=0)) if len(xy) else (np.zeros(2), np.ones(2))
+    margen = np.maximum(maximo - minimo, 1e-9) * 0.08
+    dominio = np.round(np.column_stack([minimo - margen, maximo + margen]), vista_vega.DECIMALES).tolist()
+    x = lambda: {"field": "x", "type": "quantitative", "axis": None, "scale": {"domain": dominio[0]}}
+    y = lambda: {"field": "y", "type": "quantitative", "axis": None, "scale": {"domain": dominio[1]}}
+    info_rama = [{"field": "origen", "title": "Origen"}, {"field": "destino", "title": "Destino"}]
+    capas = []
+
+    # --- Líneas (la protegida aparte, en verde) ---
+    aristas, p0, p1 = _aristas(G, pos, "linea")
+    p0, p1 = desplazar_paralelas(aristas, p0, p1)
+    ancho_linea = 3 if len(nombres) <= 500 else 1
+    protegida = np.zeros(len(aristas), dtype=bool)
+    if linea_protegida_idx is not None and linea_protegida_idx < len(aristas):
+        protegida[linea_protegida_idx] = True
+    for mascara, color in ((~protegida, "gray"), (protegida, "green")):
+        if mascara.any():
+            capas.append(vista_vega.capa(
+                _segmentos([a for a, m in zip(aristas, mascara) if m], p0[mascara], p1[mascara]),
+                {"type": "rule", "color": color, "strokeWidth": ancho_linea},
+                {"x": x(), "y": y(), "x2": {"field": "x2"}, "y2": {"field": "y2"}, "tooltip": info_rama}
+            ))
+
+    # --- Transformadores (discontinuos, con recuadro "T" según nivel de detalle) ---
+    trafos, t0, t1 = _aristas(G, pos, "trafo")
+    if trafos:
+        capas.append(vista_vega.capa(
+            _segmentos(trafos, t0, t1),
+            {"type": "rule", "color": "red", "strokeWidth": 2 if len(nombres) <= 500 else 1, "strokeDash": [6, 4]},
+            {"x": x(), "y": y(), "x2": {"field": "x2"}, "y2": {"field": "y2"}, "tooltip": info_rama}
+        ))
+        if len(trafos) <= MAX_ETIQUETAS_TRAFOS:
+            medio = (t0 + t1) / 2
+            datos = vista_vega.columnas(x=medio[:, 0], y=medio[:, 1])
+            capas.append(vista_vega.capa(datos, {"type": "square", "size": tam_fuente * 30, "fill": "white", "stroke": "black", "opacity": 1},
+                               {"x": x(), "y": y()}))
+            capas.append(vista_vega.capa(datos, {"type": "text", "text": "T", "fontSize": tam_fuente, "fontWeight": "bold"},
+                               {"x": x(), "y": y()}))
+
+    # --- Nodos (con tooltip y zoom/desplazamiento) y etiquetas ---
+    grado = [G.degree(n) for n in nombres]
+    nodos = vista_vega.columnas(x=xy[:, 0], y=xy[:, 1], nodo=[str(n) for n in nombres], grado=grado)
+    capas.append(vista_vega.capa(
+        nodos, {"type": "circle", "size": tam_nodo, "color": "lightblue", "opacity": 1},
+        {"x": x(), "y": y(), "tooltip": [{"field": "nodo", "title": "Nodo"}, {"field": "grado", "title": "Ramas"}]},
+        params=[{"name": "zoom_red", "select": "interval", "bind": "scales"}]
+    ))
+    if len(nombres) <= MAX_ETIQUETAS_NODOS:
+        capas.append(vista_vega.capa(nodos, {"type": "text", "fontSize": tam_fuente, "fontWeight": "bold"},
+                           {"x": x(), "y": y(), "text": {"field": "nodo"}}))
+
+    # === Recuadro "R" sobre la línea protegida, cerca del nodo de origen (80 %) ===
+    if lp_origen in pos and lp_destino in pos:
+        r = 0.8 * np.asarray(pos[lp_origen], dtype=float) + 0.2 * np.asarray(pos[lp_destino], dtype=float)
+        datos = vista_vega.columnas(x=[r[0]], y=[r[1]])
+        capas.append(vista_vega.capa(datos, {"type": "square", "size": 500, "fill": "mediumpurple", "stroke": "black", "opacity": 1},
+                           {"x": x(), "y": y()}))
+        capas.append(vista_vega.capa(datos, {"type": "text", "text": "R", "fontSize": 14, "fontWeight": "bold"},
+                           {"x": x(), "y": y()}))
+
+    return {
+        "$schema": vista_vega.ESQUEMA,
+        "height": alto, "layer": capas,
+        "config": {"view": {"stroke": None}},
+    }
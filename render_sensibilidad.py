@@ -0,0 +1,53 @@
+import numpy as np
+
+import perfilador
+import vista_vega
+
+
+def _bordes(eje):
+    eje = np.asarray(eje, dtype=np.float64)
+    if len(eje) == 1:
+        return np.array([eje[0] - 0.5, eje[0] + 0.5])
+    medios = (eje[1:] + eje[:-1]) / 2
+    return np.concatenate([[2 * eje[0] - medios[0]], medios, [2 * eje[-1] - medios[-1]]])
+
+
+# ------------------------------------------------------------------------------------------------
+# Mapa de calor (Vega-Lite) de una métrica sobre la malla porcentaje de Z1 (filas) × theta
+# (columnas): una celda rectangular por combinación, sin las celdas sin valor. Con centrado=True la
+# escala es divergente y simétrica en 0 (márgenes: rojo = criterio violado).
+# ------------------------------------------------------------------------------------------------
+@perfilador.medido("vista de sensibilidad")
+def especificacion_mapa_calor(valores, porcentajes, thetas, titulo, etiqueta, centrado=False, ancho=560, alto=380):
+    valores = np.asarray(valores, dtype=np.float64)
+    porcentajes, thetas = np.asarray(porcentajes, dtype=np.float64), np.asarray(thetas, dtype=np.float64)
+    bordes_p, bordes_t = _bordes(porcentajes), _bordes(thetas)
+    fila, columna = np.nonzero(np.isfinite(valores))
+    datos = vista_vega.columnas(
+        porcentaje=porcentajes[fila], theta=thetas[columna], valor=valores[fila, columna],
+        p0=bordes_p[fila], p1=bordes_p[fila + 1], t0=bordes_t[columna], t1=bordes_t[columna + 1],
+    )
+
+    escala = {"scheme": "viridis"}
+    if centrado and len(fila):
+        limite = max(float(np.abs(valores[fila, columna]).max()), 1e-9)
+        escala = {"scheme": "redyellowgreen", "domain": [-limite, limite]}
+    dominio = lambda bordes: [round(float(bordes[0]), vista_vega.DECIMALES), round(float(bordes[-1]), vista_vega.DECIMALES)]
+    codificacion = {
+        "x": {"field": "t0", "type": "quantitative", "title": "Theta de Rₐᵣcₒ (°)",
+              "scale": {"domain": dominio(bordes_t), "nice": False}},
+        "x2": {"field": "t1"},
+        "y": {"field": "p0", "type": "quantitative", "title": "Porcentaje de Zona 1 (%)",
+              "scale": {"domain": dominio(bordes_p), "nice": False}},
+        "y2": {"field": "p1"},
+        "color": {"field": "valor", "type": "quantitative", "title": etiqueta, "scale": escala},
+        "tooltip": [
+            {"field": "porcentaje", "title": "Z1 (%)"}, {"field": "theta", "title": "Theta (°)"},
+            {"field": "valor", "title": etiqueta, "format": ".3f"},
+        ],
+    }
+    return {
+        "$schema": vista_vega.ESQUEMA,
+        "title": titulo, "width": ancho, "height": alto,
+        "layer": [vista_vega.capa(datos, {"type": "rect"}, codificacion)],
+    }
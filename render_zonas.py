@@ -0,0 +1,147 @@
+import numpy as np
+from matplotlib.patches import Circle, Polygon
+
+import perfilador
+import vista_vega
+import zonas
+
+# Vértices por contorno en la vista vectorial
+PUNTOS_CONTORNO = 96
+
+
+# Dibuja una zona (mho, mho desplazado o cuadrilateral) en el plano R-X
+def dibujar_zona(ax, zona, color, etiqueta):
+    if zona["tipo"] == "mho":
+        centro = complex((zona["alcance"] + zona["inverso"]) / 2)
+        radio = abs(complex(zona["alcance"] - zona["inverso"])) / 2
+        contorno = Circle((centro.real, centro.imag), radio, color=color, fill=False, linestyle='--', linewidth=2, label=etiqueta)
+        alcance = complex(zona["alcance"])
+    else:
+        vertices = zonas.contorno(zona)
+        contorno = Polygon(np.column_stack([vertices.real, vertices.imag]), closed=True, color=color, fill=False, linestyle='--', linewidth=2, label=etiqueta)
+        alcance = complex(0, float(zona["x"]))
+    ax.add_patch(contorno)
+    ax.plot(alcance.real, alcance.imag, 'o', color=color)
+    ax.plot([0, alcance.real], [0, alcance.imag], color=color, linewidth=1, linestyle=':')
+
+
+def _formato_ejes(ax, titulo):
+    ax.set_xlabel('Parte Real (Ω)')
+    ax.set_ylabel('Parte Imaginaria (Ω)')
+    ax.set_title(titulo)
+    ax.grid(True)
+    ax.legend()
+    ax.set_aspect('equal', adjustable='box')
+    ax.axhline(0, color='gray', linewidth=0.5)
+    ax.axvline(0, color='gray', linewidth=0.5)
+    ax.autoscale_view()
+
+
+# Varias zonas con sus etiquetas: [(zona, color, etiqueta), ...]
+@perfilador.medido("dibujo de zonas")
+def dibujar_zonas(ax, zonas_etiquetadas, titulo='Zonas de Protección'):
+    for zona, color, etiqueta in zonas_etiquetadas:
+        dibujar_zona(ax, zona, color, etiqueta)
+    _formato_ejes(ax, titulo)
+    return ax
+
+
+# Círculos mho de las cuatro zonas (ajustadas por R_arco) en el plano R-X
+def dibujar_zonas_con_circulos(ax, z1, z2, z3, z4):
+    colores = ['blue', 'green', 'red', 'orange']
+    return dibujar_zonas(ax, [
+        (zonas.mho(z), color, f"Zona {i} (R_arco) (|Z|={abs(z):.2f})")
+        for i, (z, color) in enumerate(zip([z1, z2, z3, z4], colores), start=1)
+    ], 'Zonas de Protección con Ajuste por Rₐᵣcₒ')
+
+
+# ------------------------------------------------------------------------------------------------
+# Vista vectorial (Vega-Lite, ver vista_vega) del plano R-X: contornos de las zonas como
+# polígonos, alcances y, opcionalmente, una trayectoria de Z aparente; zoom y tooltips en el
+# navegador. Los ejes comparten escala (dominio cuadrado) como set_aspect('equal').
+# ------------------------------------------------------------------------------------------------
+@perfilador.medido("vista de zonas")
+def especificacion_zonas(zonas_etiquetadas, titulo='Zonas de Protección', trayectoria=None, lado=560):
+    contornos, alcances = [], []
+    etiquetas, colores = [], []
+    for zona, color, etiqueta in zonas_etiquetadas:
+        vertices = zonas.contorno(zona, PUNTOS_CONTORNO)
+        contornos.append((etiqueta, np.append(vertices, vertices[:1])))
+        alcances.append(complex(zona["alcance"]) if zona["tipo"] == "mho" else complex(0, float(zona["x"])))
+        etiquetas.append(etiqueta)
+        colores.append(color)
+    z_contornos = np.concatenate([v for _, v in contornos]) if contornos else np.empty(0, dtype=np.complex128)
+    z_trayectoria = np.empty(0, dtype=np.complex128) if trayectoria is None else np.asarray(trayectoria, dtype=np.complex128)
+    z_trayectoria = z_trayectoria[np.isfinite(z_trayectoria)]
+
+    # Dominio cuadrado que contiene el origen, los contornos, los alcances y la trayectoria
+    todos = np.concatenate([[0], z_contornos, alcances, z_trayectoria])
+    todos = todos[np.isfinite(todos)]
+    centro = (todos.real.min() + todos.real.max()) / 2 + 1j * (todos.imag.min() + todos.imag.max()) / 2
+    medio_lado = max(np.ptp(todos.real), np.ptp(todos.imag), 1e-9) * 0.55
+    dominio_x = [round(centro.real - medio_lado, vista_vega.DECIMALES), round(centro.real + medio_lado, vista_vega.DECIMALES)]
+    dominio_y = [round(centro.imag - medio_lado, vista_vega.DECIMALES), round(centro.imag + medio_lado, vista_vega.DECIMALES)]
+    x = {"field": "r", "type": "quantitative", "title": "Parte Real (Ω)", "scale": {"domain": dominio_x}}
+    y = {"field": "x", "type": "quantitative", "title": "Parte Imaginaria (Ω)", "scale": {"domain": dominio_y}}
+    # La escala de colores y la leyenda se definen en la capa de los alcances y las comparten las
+    # capas de contornos y trayectoria (color constante con "datum", que no admite escala propia)
+    color_campo = {
+        "field": "zona", "type": "nominal", "title": None,
+        "scale": {"domain": etiquetas + (["Trayectoria de Z aparente"] if len(z_trayectoria) else []),
+                  "range": colores + (["purple"] if len(z_trayectoria) else [])},
+        "legend": {"orient": "bottom", "columns": 2, "labelLimit": 400},
+    }
+    puntos = lambda z: {"r": z.real, "x": z.imag}
+    tooltip = [{"field": "zona", "title": "Zona"}, {"field": "r", "title": "R (Ω)", "format": ".3f"},
+               {"field": "x", "title": "X (Ω)", "format": ".3f"}]
+
+    ejes = vista_vega.capa(
+        vista_vega.columnas(r=[dominio_x[0], 0.0], x=[0.0, dominio_y[0]], r2=[dominio_x[1], 0.0], x2=[0.0, dominio_y[1]]),
+        {"type": "rule", "color": "gray", "strokeWidth": 0.5},
+        {"x": x, "y": y, "x2": {"field": "r2"}, "y2": {"field": "x2"}},
+        params=[{"name": "zoom_zonas", "select": "interval", "bind": "scales"}]
+    )
+    capas = [ejes]
+    # Un contorno por capa (sin repetir la etiqueta en cada vértice)
+    for etiqueta, vertices in contornos:
+        capas.append(vista_vega.capa(
+            vista_vega.columnas(orden=np.arange(len(vertices)), **puntos(vertices)),
+            {"type": "line", "strokeDash": [6, 4], "strokeWidth": 2},
+            {"x": x, "y": y, "color": {"datum": etiqueta, "type": "nominal"},
+             "order": {"field": "orden", "type": "quantitative"}, "tooltip": {"value": etiqueta}}
+        ))
+    if contornos or len(z_trayectoria):
+        z_alcances = np.array(alcances, dtype=np.complex128).reshape(-1)
+        validos = np.isfinite(z_alcances)
+        datos = vista_vega.columnas(
+            zona=np.array(etiquetas)[validos], r2=np.zeros(validos.sum()), x2=np.zeros(validos.sum()),
+            **puntos(z_alcances[validos])
+        )
+        capas.append(vista_vega.capa(
+            datos, {"type": "rule", "strokeDash": [1, 3], "strokeWidth": 1},
+            {"x": x, "y": y, "x2": {"field": "r2"}, "y2": {"field": "x2"}, "color": color_campo}
+        ))
+        capas.append(vista_vega.capa(
+            datos, {"type": "point", "filled": True, "size": 50, "opacity": 1},
+            {"x": x, "y": y, "color": color_campo, "tooltip": tooltip}
+        ))
+    if len(z_trayectoria):
+        capas.append(vista_vega.capa(
+            vista_vega.columnas(orden=np.arange(len(z_trayectoria)), **puntos(z_trayectoria)),
+            {"type": "line", "strokeWidth": 1},
+            {"x": x, "y": y, "color": {"datum": "Trayectoria de Z aparente", "type": "nominal"},
+             "order": {"field": "orden", "type": "quantitative"}, "tooltip": tooltip[1:]}
+        ))
+
+    return {
+        "$schema": vista_vega.ESQUEMA,
+        "title": titulo, "width": lado, "height": lado, "layer": capas,
+    }
+
+
+def especificacion_zonas_con_circulos(z1, z2, z3, z4, trayectoria=None):
+    colores = ['blue', 'green', 'red', 'orange']
+    return especificacion_zonas([
+        (zonas.mho(z), color, f"Zona {i} (R_arco) (|Z|={abs(z):.2f})")
+        for i, (z, color) in enumerate(zip([z1, z2, z3, z4], colores), start=1)
+    ], 'Zonas de Protección con Ajuste por Rₐᵣcₒ', trayectoria)
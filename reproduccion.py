@@ -0,0 +1,155 @@
+import time
+
+import numpy as np
+
+import comtrade
+import escalonamiento
+import zonas
+
+ZONAS = ["z1", "z2", "z3", "z4"]
+# Temporizaciones por defecto de cada zona (s): las del escalonamiento (Paso 7) más la Z4
+TIEMPOS_ZONA = {**escalonamiento.TIEMPOS_ZONA, "z4": 1.0}
+# Puntos de la trayectoria R-X que se conservan por ciclo
+PUNTOS_POR_CICLO = 4
+
+# Operador de secuencia a = 1∠120°
+_A = np.exp(2j * np.pi / 3)
+
+
+# ------------------------------------------------------------------------------------------------
+# Etapas del pipeline. Cada una consume y produce bloques, con el estado necesario entre bloques,
+# de modo que el registro nunca se carga completo en memoria.
+# ------------------------------------------------------------------------------------------------
+
+# DFT deslizante recursivo de la componente fundamental (fasor eficaz, referencia fija):
+#   X(k) = X(k-1) + √2/N · (x_k - x_{k-N}) · e^{-j2πk/N}
+# Al inicio de cada bloque X se recalcula de forma directa sobre la última ventana, así el error de
+# redondeo de la recursión no se acumula a lo largo de registros largos.
+def fasores(bloques, n_ciclo):
+    ventana = None
+    k0 = 0
+    for t, x in bloques:
+        n = len(x)
+        if ventana is None:
+            ventana = np.zeros((n_ciclo, x.shape[1]))
+        k = k0 + np.arange(n)
+        giro = np.exp(-2j * np.pi * (k % n_ciclo) / n_ciclo)[:, None]
+        giro_previo = np.exp(-2j * np.pi * ((k0 - n_ciclo + np.arange(n_ciclo)) % n_ciclo) / n_ciclo)[:, None]
+
+        extendido = np.concatenate([ventana, x])
+        x_previo = (ventana * giro_previo).sum(axis=0)
+        X = (np.sqrt(2) / n_ciclo) * (x_previo + np.cumsum((x - extendido[:n]) * giro, axis=0))
+
+        valido = k >= n_ciclo - 1
+        ventana = extendido[-n_ciclo:]
+        k0 += n
+        yield t, X, valido
+
+
+# Impedancia aparente: V/I de un canal, o de secuencia positiva si hay tres fases de cada una
+def impedancias(bloques_fasores, n_tension, factor_z=1.0, i_minima=0.0):
+    for t, X, valido in bloques_fasores:
+        v, i = X[:, :n_tension], X[:, n_tension:]
+        if n_tension == 3:
+            v = (v[:, 0] + _A * v[:, 1] + _A ** 2 * v[:, 2]) / 3
+            i = (i[:, 0] + _A * i[:, 1] + _A ** 2 * i[:, 2]) / 3
+        else:
+            v, i = v[:, 0], i[:, 0]
+        con_corriente = valido & (np.abs(i) > i_minima)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(con_corriente, factor_z * v / i, np.nan)
+        yield t, z
+
+
+# Prueba mho de cada muestra contra las cuatro zonas: (n, 4) booleano
+def _dentro(z, ajustes):
+    return zonas.contiene(zonas.mho(ajustes[None, :]), z[:, None])
+
+
+def linea_de_tiempo(bloques_z, ajustes, tiempos=None, decimacion=1):
+    tiempos = {**TIEMPOS_ZONA, **(tiempos or {})}
+    ajustes = np.asarray(ajustes, dtype=np.complex128)
+    intervalos = [[] for _ in ZONAS]
+    dentro_previo = np.zeros(len(ZONAS), dtype=bool)
+    desde = np.zeros(len(ZONAS))
+    tray_t, tray_z = [], []
+    muestras = 0
+    t_final = 0.0
+    desfase = 0
+
+    for t, z in bloques_z:
+        dentro = _dentro(z, ajustes)
+        for j in range(len(ZONAS)):
+            estado = np.concatenate([[dentro_previo[j]], dentro[:, j]])
+            for c in np.flatnonzero(estado[1:] != estado[:-1]):
+                if dentro[c, j]:
+                    desde[j] = t[c]
+                else:
+                    intervalos[j].append((desde[j], t[c]))
+        dentro_previo = dentro[-1] if len(dentro) else dentro_previo
+
+        sel = np.arange(desfase, len(z), decimacion)
+        tray_t.append(t[sel])
+        tray_z.append(z[sel])
+        desfase = (desfase - len(z)) % decimacion
+        muestras += len(z)
+        t_final = t[-1] if len(t) else t_final
+
+    for j in range(len(ZONAS)):
+        if dentro_previo[j]:
+            intervalos[j].append((desde[j], t_final))
+
+    eventos = {}
+    for j, zona in enumerate(ZONAS):
+        demora = tiempos[zona]
+        arranque = intervalos[j][0][0] if intervalos[j] else None
+        disparo = next((ini + demora for ini, fin in intervalos[j] if fin - ini >= demora), None)
+        eventos[zona] = {"arranque": arranque, "disparo": disparo, "intervalos": intervalos[j]}
+
+    return {
+        "eventos": eventos,
+        "trayectoria_t": np.concatenate(tray_t) if tray_t else np.empty(0),
+        "trayectoria_z": np.concatenate(tray_z) if tray_z else np.empty(0, dtype=np.complex128),
+        "muestras": muestras,
+    }
+
+
+# ------------------------------------------------------------------------------------------------
+# Reproducción completa de un registro: lectura -> fasores -> Z aparente -> zonas.
+# canales_v / canales_i: índices de 1 o 3 canales analógicos de tensión y de corriente.
+# ajustes: alcances Z1..Z4 (complejos) en las mismas unidades que factor_z · V/I.
+# ------------------------------------------------------------------------------------------------
+def reproducir(cfg, ruta_dat, canales_v, canales_i, ajustes, tiempos=None, factor_z=1.0, i_minima=0.0,
+               tam_bloque=comtrade.TAM_BLOQUE):
+    if len(canales_v) != len(canales_i) or len(canales_v) not in (1, 3):
+        raise ValueError("se requieren 1 o 3 canales de tensión y el mismo número de corriente")
+    fs = comtrade.frecuencia_muestreo(cfg)
+    n_ciclo = max(2, int(round(fs / cfg["frecuencia"])))
+
+    inicio = time.perf_counter()
+    lectura = comtrade.bloques(cfg, ruta_dat, list(canales_v) + list(canales_i), tam_bloque)
+    resultado = linea_de_tiempo(
+        impedancias(fasores(lectura, n_ciclo), len(canales_v), factor_z, i_minima),
+        ajustes, tiempos, decimacion=max(1, n_ciclo // PUNTOS_POR_CICLO)
+    )
+    duracion = time.perf_counter() - inicio
+
+    resultado.update({
+        "muestras_por_ciclo": n_ciclo,
+        "segundos": duracion,
+        "muestras_por_s": resultado["muestras"] / duracion if duracion > 0 else float("inf"),
+    })
+    return resultado
+
+
+def _segundos(valor):
+    return None if valor is None else float(valor)
+
+
+def tabla_eventos(resultado):
+    return {
+        "zona": [z.upper() for z in ZONAS],
+        "arranque_s": [_segundos(resultado["eventos"][z]["arranque"]) for z in ZONAS],
+        "disparo_s": [_segundos(resultado["eventos"][z]["disparo"]) for z in ZONAS],
+        "intervalos": [len(resultado["eventos"][z]["intervalos"]) for z in ZONAS],
+    }
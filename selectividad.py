@@ -0,0 +1,215 @@
+import numpy as np
+
+import coordinacion
+import perfilador
+
+ZONAS = ["z1", "z2", "z3"]
+# Solapes menores (fracción de la rama) se consideran contacto en un extremo, no solape
+TOLERANCIA = 1e-6
+
+
+# ------------------------------------------------------------------------------------------------
+# Cobertura de las zonas de cada relé sobre las ramas de la red
+#
+# Cada zona hacia adelante (Z1-Z3) se proyecta sobre la red como una distancia |Z| recorrida desde
+# el relé: la línea protegida (salto 0) y luego, desde el nodo remoto B, los caminos más cortos
+# (por |Z| acumulada) que no vuelven por la línea protegida. Más allá de B el alcance restante se
+# divide por (1 + K) con el infeed del relé, como en el barrido de fallas del Paso 7.
+# Los caminos se buscan para todos los relés a la vez, por relajaciones vectorizadas acotadas por
+# el mayor alcance de cada relé (solo se visitan los nodos dentro del alcance).
+#
+# Resultado: un intervalo por (relé, rama, extremo de entrada) con la fracción de la rama cubierta
+# por cada zona, medida desde el extremo por el que se entra (0 = origen, 1 = destino).
+# ------------------------------------------------------------------------------------------------
+def _alcance_restante(resultado, zonas, usar_infeed):
+    z_linea = np.abs(resultado["z_linea"])
+    restante = []
+    for zona in zonas:
+        k = resultado["k_infeed_z3" if zona == "z3" else "k_infeed"] if usar_infeed else 0.0
+        k = np.nan_to_num(np.asarray(k, dtype=np.float64), nan=0.0, posinf=0.0, neginf=0.0)
+        alcance = np.abs(resultado[zona])
+        restante.append(np.where(np.isfinite(alcance), (alcance - z_linea) / (1 + np.maximum(k, 0.0)), 0.0))
+    return np.stack(restante)
+
+
+def _caminos(indice, rama_rele, nodo_b, limite):
+    ptr, inc = indice["ptr"], indice["inc"]
+    o_r, d_r = indice["origen"], indice["destino"]
+    mod_z = np.abs(indice["z"])
+    util = indice["tiene_param"] & (o_r != d_r)
+    n_nodos = len(indice["nodos"])
+
+    # Estados (relé, nodo, distancia más allá de B, saltos, rama de llegada); se parte de B con
+    # distancia 0, llegando por la línea protegida
+    vivos = limite > 0
+    rele = np.flatnonzero(vivos)
+    nodo = nodo_b[vivos].astype(np.int64)
+    dist = np.zeros(len(rele))
+    saltos = np.ones(len(rele), dtype=np.int64)
+    llegada = rama_rele[vivos]
+    frontera = np.arange(len(rele))
+    while frontera.size:
+        f_rel, ram = coordinacion._pares(ptr, inc, nodo[frontera])
+        r, d, h = rele[frontera][f_rel], dist[frontera][f_rel], saltos[frontera][f_rel]
+        siguiente = np.where(o_r[ram] == nodo[frontera][f_rel], d_r[ram], o_r[ram])
+        d = d + mod_z[ram]
+        ok = util[ram] & (ram != rama_rele[r]) & (d < limite[r])
+        if not ok.any():
+            break
+        # Mejor distancia por (relé, nodo) entre los estados anteriores y los nuevos
+        n_previos = len(rele)
+        rele = np.concatenate([rele, r[ok]])
+        nodo = np.concatenate([nodo, siguiente[ok]])
+        dist = np.concatenate([dist, d[ok]])
+        saltos = np.concatenate([saltos, h[ok] + 1])
+        llegada = np.concatenate([llegada, ram[ok]])
+        clave = rele * n_nodos + nodo
+        orden = np.lexsort((np.arange(len(rele)), dist, clave))
+        primero = np.ones(len(orden), dtype=bool)
+        primero[1:] = clave[orden][1:] != clave[orden][:-1]
+        mejores = orden[primero]
+        rele, nodo, dist = rele[mejores], nodo[mejores], dist[mejores]
+        saltos, llegada = saltos[mejores], llegada[mejores]
+        frontera = np.flatnonzero(mejores >= n_previos)
+    return rele, nodo, dist, saltos, llegada
+
+
+@perfilador.medido("coberturas")
+def coberturas(resultado, indice, zonas=ZONAS, usar_infeed=True):
+    o_r, d_r = indice["origen"], indice["destino"]
+    mod_z = np.abs(indice["z"])
+    rama_rele = np.asarray(resultado["rama"], dtype=np.int64)
+    n = len(rama_rele)
+    z_linea = np.abs(resultado["z_linea"])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        restante = _alcance_restante(resultado, zonas, usar_infeed)
+        # Línea protegida, entrando por el extremo del relé
+        propia = np.stack([
+            np.where(z_linea > 0, np.abs(resultado[zona]) / z_linea, 0.0) for zona in zonas
+        ]).clip(0, 1)
+
+    # Ramas alcanzadas desde cada nodo dentro del alcance (sin la línea protegida ni la rama por la
+    # que llega el camino más corto: sus puntos quedan más cerca desde el otro extremo)
+    rele, nodo, dist, saltos, llegada = _caminos(
+        indice, rama_rele, resultado["nodo_remoto"], restante.max(axis=0, initial=0)
+    )
+    p_est, ram = coordinacion._pares(indice["ptr"], indice["inc"], nodo)
+    p_rel = rele[p_est]
+    ok = indice["tiene_param"][ram] & (o_r[ram] != d_r[ram]) & (ram != rama_rele[p_rel]) & (ram != llegada[p_est])
+    p_est, p_rel, ram = p_est[ok], p_rel[ok], ram[ok]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        libre = restante[:, p_rel] - dist[p_est]
+        fraccion = np.where(mod_z[ram] > 0, libre / mod_z[ram], np.where(libre > 0, 1.0, 0.0)).clip(0, 1)
+    cubre = fraccion.max(axis=0) > 0
+
+    return {
+        "zonas": list(zonas),
+        "rele": np.concatenate([np.arange(n), p_rel[cubre]]),
+        "rama": np.concatenate([rama_rele, ram[cubre]]),
+        "entrada": np.concatenate([
+            np.asarray(resultado["sentido"], dtype=np.int8), (o_r[ram[cubre]] != nodo[p_est[cubre]]).astype(np.int8)
+        ]),
+        "saltos": np.concatenate([np.zeros(n, dtype=np.int64), saltos[p_est[cubre]]]),
+        "fraccion": np.concatenate([propia, fraccion[:, cubre]], axis=1),
+    }
+
+
+# ------------------------------------------------------------------------------------------------
+# Solapes de zonas con el mismo escalón de tiempo
+#
+# En cada punto de una rama, la zona más rápida de un relé es la menor que lo cubre: el tramo
+# (max(f[0..k-1]), f[k]] de la rama es Zk. Si dos relés ven el mismo tramo en la misma zona desde
+# el mismo extremo y uno está más cerca (menos saltos), el más lejano no respalda con retardo:
+# disparan con el mismo tiempo (p. ej. la Z2 de un relé sobre la Z2 del relé aguas abajo).
+#
+# Los tramos se indexan ordenándolos por (rama, extremo, inicio); los solapes de cada tramo son
+# los siguientes del mismo grupo que empiezan antes de su fin (búsqueda binaria). El costo es
+# O(I log I + S) con I tramos y S solapes, en lugar de comparar todos los pares de relés.
+# ------------------------------------------------------------------------------------------------
+def _tramos(cob, k):
+    inicio = cob["fraccion"][:k].max(axis=0) if k else np.zeros(len(cob["rele"]))
+    fin = cob["fraccion"][k]
+    valido = fin > inicio + TOLERANCIA
+    return np.flatnonzero(valido), inicio[valido], fin[valido]
+
+
+def _solapes(cob, k):
+    fila, inicio, fin = _tramos(cob, k)
+    grupo = cob["rama"][fila] * 2 + cob["entrada"][fila]
+    _, rango = np.unique(grupo, return_inverse=True)
+    orden = np.lexsort((inicio, rango))
+    fila, inicio, fin, rango = fila[orden], inicio[orden], fin[orden], rango[orden]
+
+    # Inicio y fin en una sola escala creciente (grupo + fracción) para buscar dentro del grupo
+    clave_inicio = rango * 2.0 + inicio
+    hasta = np.searchsorted(clave_inicio, rango * 2.0 + fin - TOLERANCIA, side="left")
+    cuentas = np.maximum(hasta - np.arange(len(fila)) - 1, 0)
+    i = np.repeat(np.arange(len(fila)), cuentas)
+    j = i + 1 + (np.arange(cuentas.sum()) - np.repeat(np.cumsum(cuentas) - cuentas, cuentas))
+
+    saltos = cob["saltos"][fila]
+    distinto = (cob["rele"][fila[i]] != cob["rele"][fila[j]]) & (saltos[i] != saltos[j])
+    i, j = i[distinto], j[distinto]
+    lejano_i = saltos[i] > saltos[j]
+    return {
+        "lejano": np.where(lejano_i, fila[i], fila[j]),
+        "cercano": np.where(lejano_i, fila[j], fila[i]),
+        "desde": np.maximum(inicio[i], inicio[j]),
+        "hasta": np.minimum(fin[i], fin[j]),
+    }
+
+
+@perfilador.medido("selectividad")
+def verificar_selectividad(resultado, indice, zonas=ZONAS, usar_infeed=True):
+    cob = coberturas(resultado, indice, zonas, usar_infeed)
+    mod_z = np.abs(indice["z"])
+    nodos, claves = indice["nodos"], indice["clave"]
+    n = len(resultado["rama"])
+
+    # Un registro por (zona, relé lejano, relé cercano): primera rama solapada, cantidad de ramas
+    # y |Z| total del solape
+    partes = []
+    for k in range(len(zonas)):
+        s = _solapes(cob, k)
+        lejano, cercano = cob["rele"][s["lejano"]], cob["rele"][s["cercano"]]
+        par = (k * n + lejano.astype(np.int64)) * n + cercano
+        _, primera, inverso = np.unique(par, return_index=True, return_inverse=True)
+        p = s["lejano"][primera]
+        # Tramo de la primera rama, medido desde el origen de la rama
+        desde, hasta = s["desde"][primera], s["hasta"][primera]
+        entra_destino = cob["entrada"][p] == 1
+        partes.append({
+            "zona": np.full(len(primera), k),
+            "lejano": lejano[primera],
+            "cercano": cercano[primera],
+            "saltos_lejano": cob["saltos"][p],
+            "saltos_cercano": cob["saltos"][s["cercano"][primera]],
+            "rama": cob["rama"][p],
+            "desde": np.where(entra_destino, 1 - hasta, desde),
+            "hasta": np.where(entra_destino, 1 - desde, hasta),
+            "ramas": np.bincount(inverso, minlength=len(primera)),
+            "ohm": np.bincount(
+                inverso, weights=(s["hasta"] - s["desde"]) * mod_z[cob["rama"][s["lejano"]]], minlength=len(primera)
+            ),
+        })
+    todo = {c: np.concatenate([p[c] for p in partes]) for c in partes[0]}
+    orden = np.argsort(-todo["ohm"], kind="stable")
+    todo = {c: v[orden] for c, v in todo.items()}
+
+    rama, remoto = np.asarray(resultado["rama"]), resultado["nodo_remoto"]
+    etiqueta = lambda reles: [
+        f"{claves[rama[r]]} ({nodos[resultado['nodo_rele'][r]]} → {nodos[remoto[r]]})" for r in reles.tolist()
+    ]
+    tabla = {
+        "zona": [zonas[k].upper() for k in todo["zona"].tolist()],
+        "rele_respaldo": etiqueta(todo["lejano"]),
+        "saltos_respaldo": todo["saltos_lejano"],
+        "rele_cercano": etiqueta(todo["cercano"]),
+        "saltos_cercano": todo["saltos_cercano"],
+        "rama": [claves[b] for b in todo["rama"].tolist()],
+        "desde": todo["desde"],
+        "hasta": todo["hasta"],
+        "ramas_solapadas": todo["ramas"],
+        "solape_ohm": todo["ohm"],
+    }
+    return tabla, len(cob["rele"])
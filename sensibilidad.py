@@ -0,0 +1,134 @@
+import numpy as np
+
+import coordinacion
+import zonas
+from cache_resultados import CACHE, huella
+
+# Factores de coordinacion.FACTORES_ZONA que se pueden barrer
+FACTORES_BARRIDO = ["z2", "z3", "z3_siguiente", "z3_trafo"]
+# Celdas de malla × relés evaluadas por bloque (acota la memoria con redes grandes)
+MAX_CELDAS = 2_000_000
+
+# Alcances (Ω) de las características ajustadas por R_arco y su cobertura resistiva (Ω) para una
+# falla a mitad del alcance
+ALCANCES = ["alcance_z1", "alcance_z2", "alcance_z3", "alcance_z4", "rf_z1", "rf_z2", "rf_z3"]
+# Márgenes en p.u. de la línea protegida, medidos sobre su dirección (negativo = criterio violado):
+#   margen_z1_remota: Z1 no debe alcanzar la barra remota
+#   margen_z2_remota: Z2 debe sobrepasar la barra remota
+#   margen_z2_z1 / margen_z3_z2: cada zona debe llegar más lejos que la anterior
+MARGENES = ["margen_z1_remota", "margen_z2_remota", "margen_z2_z1", "margen_z3_z2"]
+
+# Datos por relé de la etapa topológica que usa coordinacion._alcances
+_POR_RELE = [
+    "z_linea", "rama_min_linea", "rama_min_trafo", "rama_may_linea", "rama_may_trafo",
+    "rama_local_linea", "rama_local_trafo",
+]
+
+
+# Eje k de una malla de n_ejes dimensiones (el último eje extra es el de relés)
+def _sobre_eje(valores, k, n_ejes):
+    forma = [1] * (n_ejes + 1)
+    forma[k] = -1
+    return np.asarray(valores, dtype=np.float64).reshape(forma)
+
+
+def _metricas(indice, ramas, porcentajes, thetas_rad, factores):
+    alcances = coordinacion._alcances(indice, ramas, porcentajes, factores)
+    z_linea = ramas["z_linea"]
+    mod_linea = np.abs(z_linea)
+    angulo_linea = np.angle(z_linea)
+
+    metricas = {}
+    efectivo = {}
+    for k in range(1, 5):
+        zona = zonas.mho_por_punto(alcances[f"z{k}"], thetas_rad)
+        metricas[f"alcance_z{k}"] = np.abs(zona["alcance"])
+        # Alcance de la característica sobre la dirección de la línea protegida
+        efectivo[k] = np.abs(zona["alcance"]) * np.cos(thetas_rad - angulo_linea)
+        if k < 4:
+            metricas[f"rf_z{k}"] = zonas.alcance_resistivo(zona, alcances[f"z{k}"] / 2)
+
+    metricas["margen_z1_remota"] = (mod_linea - efectivo[1]) / mod_linea
+    metricas["margen_z2_remota"] = (efectivo[2] - mod_linea) / mod_linea
+    metricas["margen_z2_z1"] = (efectivo[2] - efectivo[1]) / mod_linea
+    metricas["margen_z3_z2"] = (efectivo[3] - efectivo[2]) / mod_linea
+    return metricas
+
+
+# ------------------------------------------------------------------------------------------------
+# Malla de sensibilidad: porcentaje de Z1 × theta de R_arco × factores de Z2/Z3, en una sola
+# evaluación vectorizada. La etapa topológica de coordinacion se calcula una vez; los ejes de la
+# malla se agregan por broadcasting delante del eje de relés.
+# factores: {nombre: valores} (nombres de FACTORES_BARRIDO); el resto toma FACTORES_ZONA.
+# Devuelve los ejes y, por métrica, el mínimo y el máximo sobre los relés (iguales con un solo
+# relé) y, para los márgenes, la cantidad de relés que violan el criterio.
+# ------------------------------------------------------------------------------------------------
+def barrido_sensibilidad(indice, porcentajes, thetas_deg, factores=None, rama_rele=None, sentido=None,
+                         max_celdas=MAX_CELDAS):
+    factores = {f: np.asarray(v, dtype=np.float64) for f, v in (factores or {}).items()}
+    desconocidos = set(factores) - set(FACTORES_BARRIDO)
+    if desconocidos:
+        raise ValueError(f"factores no barribles: {sorted(desconocidos)}")
+    if rama_rele is None:
+        rama_rele, sentido = coordinacion.reles_de_red(indice)
+    rama_rele = np.asarray(rama_rele, dtype=np.int64)
+    sentido = np.asarray(sentido, dtype=np.int8)
+
+    ejes = {
+        "porcentaje_z1": np.asarray(porcentajes, dtype=np.float64),
+        "theta": np.asarray(thetas_deg, dtype=np.float64),
+        **factores,
+    }
+    n_ejes = len(ejes)
+    forma = tuple(len(v) for v in ejes.values())
+    celdas = int(np.prod(forma))
+    porcentajes = _sobre_eje(ejes["porcentaje_z1"], 0, n_ejes)
+    thetas_rad = np.radians(_sobre_eje(ejes["theta"], 1, n_ejes))
+    factores_malla = {f: _sobre_eje(v, 2 + k, n_ejes) for k, (f, v) in enumerate(factores.items())}
+
+    minimo = {m: np.full(forma, np.nan) for m in ALCANCES + MARGENES}
+    maximo = {m: np.full(forma, np.nan) for m in ALCANCES + MARGENES}
+    violaciones = {m: np.zeros(forma, dtype=np.int64) for m in MARGENES}
+
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        ramas = coordinacion._ramas_de_alcance(indice, rama_rele, sentido)
+        tam = max(1, max_celdas // max(celdas, 1))
+        for inicio in range(0, len(rama_rele), tam):
+            bloque = {k: ramas[k][inicio:inicio + tam] for k in _POR_RELE}
+            metricas = _metricas(indice, bloque, porcentajes, thetas_rad, factores_malla)
+            for m, valores in metricas.items():
+                valores = np.broadcast_to(valores, forma + (len(bloque["z_linea"]),))
+                minimo[m] = np.fmin(minimo[m], np.fmin.reduce(valores, axis=-1))
+                maximo[m] = np.fmax(maximo[m], np.fmax.reduce(valores, axis=-1))
+                if m in violaciones:
+                    violaciones[m] += (valores < 0).sum(axis=-1)
+
+    resultado = {"ejes": ejes, "reles": len(rama_rele), "celdas": celdas}
+    for m in ALCANCES + MARGENES:
+        resultado[f"{m}_min"] = minimo[m]
+        resultado[f"{m}_max"] = maximo[m]
+    for m in MARGENES:
+        resultado[f"{m}_violaciones"] = violaciones[m]
+    return resultado
+
+
+# Malla memorizada por topología + impedancias + ejes + relés (compartida, de solo lectura): cambiar
+# el corte mostrado no vuelve a evaluar la malla
+def barrido_red(indice, porcentajes, thetas_deg, factores=None, rama_rele=None, sentido=None, cache=CACHE):
+    clave = huella(
+        "sensibilidad", indice["firma"], indice["z"], indice["tiene_param"],
+        np.asarray(porcentajes, dtype=np.float64), np.asarray(thetas_deg, dtype=np.float64),
+        sorted((f, np.asarray(v, dtype=np.float64).tolist()) for f, v in (factores or {}).items()),
+        None if rama_rele is None else np.asarray(rama_rele, dtype=np.int64),
+        None if sentido is None else np.asarray(sentido, dtype=np.int8),
+    )
+    return cache.obtener_o_calcular(
+        clave, barrido_sensibilidad, indice, porcentajes, thetas_deg, factores, rama_rele, sentido
+    )
+
+
+# Corte 2D (porcentaje_z1 × theta) de una métrica con los demás ejes fijos en los índices dados
+def corte(resultado, clave, indices_factores=None):
+    valores = resultado[clave]
+    indices = tuple((indices_factores or {}).get(f, 0) for f in list(resultado["ejes"])[2:])
+    return valores[(slice(None), slice(None)) + indices]
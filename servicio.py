@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import lote
+
+# ------------------------------------------------------------------------------------------------
+# Servicio HTTP local (asyncio, sin dependencias externas) con los cálculos de los Pasos 5 y 6:
+#   GET  /salud       -> {"ok": true, "procesos": n}
+#   POST /coordinar   -> un estudio (JSON de lote.py con la red en línea) -> tabla de relés en JSON
+#   POST /lote        -> muchos estudios: {"estudios": [...]} o un estudio por línea (NDJSON).
+#                        Responde en NDJSON con codificación chunked, una línea por estudio a medida
+#                        que terminan (con "indice" = posición en la petición).
+# Las conexiones HTTP/1.1 se mantienen abiertas entre peticiones (keep-alive). Los cálculos corren en
+# un pool de procesos para no bloquear el bucle de eventos.
+#   python servicio.py --puerto 8021 --procesos 4
+# ------------------------------------------------------------------------------------------------
+MAX_CUERPO = 64 * 1024 * 1024
+MAX_CABECERAS = 100
+ESPERA_INACTIVA = 30.0
+ESTADOS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+
+class ErrorHTTP(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+# Calcula un estudio recibido por HTTP (en un proceso del pool); solo se aceptan redes en línea
+def calcular(contenido, indice=None, predeterminados=lote.PREDETERMINADOS):
+    inicio = time.perf_counter()
+    try:
+        if not isinstance(contenido, dict) or not isinstance(contenido.get("red"), list):
+            raise ValueError("el estudio debe ser un objeto con la red en línea (\"red\": [filas])")
+        estudio = lote.estudio_desde_json(contenido, f"estudio_{indice or 0}", predeterminados=predeterminados)
+        respuesta = lote.resultado_json(lote.calcular_estudio(estudio), estudio)
+        respuesta["ok"] = True
+    except (ValueError, KeyError, TypeError) as e:
+        respuesta = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    if indice is not None:
+        respuesta["indice"] = indice
+    respuesta["segundos"] = time.perf_counter() - inicio
+    return json.dumps(respuesta, ensure_ascii=False)
+
+
+# ------------------------------------------------------------------------------------------------
+# HTTP/1.1 mínimo: cabeceras, cuerpo con Content-Length y respuestas completas o chunked
+# ------------------------------------------------------------------------------------------------
+async def _leer_peticion(lector):
+    linea = await asyncio.wait_for(lector.readline(), ESPERA_INACTIVA)
+    if not linea:
+        return None
+    try:
+        metodo, destino, version = linea.decode("latin-1").split()
+    except ValueError:
+        raise ErrorHTTP(400, "línea de petición inválida")
+
+    cabeceras = {}
+    while True:
+        linea = await lector.readline()
+        if linea in (b"\r\n", b"\n", b""):
+            break
+        if len(cabeceras) >= MAX_CABECERAS:
+            raise ErrorHTTP(400, "demasiadas cabeceras")
+        nombre, _, valor = linea.decode("latin-1").partition(":")
+        cabeceras[nombre.strip().lower()] = valor.strip()
+
+    cuerpo = b""
+    if "transfer-encoding" in cabeceras:
+        raise ErrorHTTP(411, "el cuerpo debe enviarse con Content-Length")
+    if cabeceras.get("content-length"):
+        largo = int(cabeceras["content-length"])
+        if largo > MAX_CUERPO:
+            raise ErrorHTTP(413, f"el cuerpo supera {MAX_CUERPO} bytes")
+        cuerpo = await lector.readexactly(largo)
+    elif metodo == "POST":
+        raise ErrorHTTP(411, "falta Content-Length")
+
+    mantener = cabeceras.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return {
+        "metodo": metodo, "ruta": urlsplit(destino).path, "cabeceras": cabeceras,
+        "cuerpo": cuerpo, "mantener": mantener, "cabecera_enviada": False,
+    }
+
+
+def _cabecera(estado, tipo, extra, mantener):
+    lineas = [f"HTTP/1.1 {estado} {ESTADOS.get(estado, '')}", f"Content-Type: {tipo}"]
+    lineas += extra
+    lineas.append(f"Connection: {'keep-alive' if mantener else 'close'}")
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1")
+
+
+async def _responder(escritor, estado, contenido, mantener):
+    cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+    escritor.write(_cabecera(estado, "application/json; charset=utf-8", [f"Content-Length: {len(cuerpo)}"], mantener))
+    escritor.write(cuerpo)
+    await escritor.drain()
+
+
+async def _escribir_trozo(escritor, datos):
+    escritor.write(f"{len(datos):x}\r\n".encode("latin-1") + datos + b"\r\n")
+    await escritor.drain()
+
+
+# Estudios de /lote: objeto {"estudios": [...]}, arreglo JSON o NDJSON
+def _estudios_de(peticion):
+    texto = peticion["cuerpo"].decode("utf-8-sig")
+    if "ndjson" in peticion["cabeceras"].get("content-type", ""):
+        return [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    contenido = json.loads(texto)
+    estudios = contenido.get("estudios") if isinstance(contenido, dict) else contenido
+    if not isinstance(estudios, list):
+        raise ValueError("se esperaba {\"estudios\": [...]} o un arreglo de estudios")
+    return estudios
+
+
+class Servicio:
+    def __init__(self, procesos=None, predeterminados=lote.PREDETERMINADOS):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.predeterminados = predeterminados
+        self.pool = ProcessPoolExecutor(max_workers=self.procesos)
+        self.servidor = None
+        # Conexiones abiertas (tarea -> escritor), para cerrarlas al apagar el servicio
+        self.conexiones = {}
+
+    async def iniciar(self, host="127.0.0.1", puerto=8021):
+        # Los procesos del pool se crean antes de aceptar conexiones: si se bifurcaran después
+        # heredarían los sockets abiertos y el cliente no vería el cierre de la conexión
+        await asyncio.get_running_loop().run_in_executor(self.pool, os.getpid)
+        self.servidor = await asyncio.start_server(self.atender, host, puerto)
+        return self.servidor.sockets[0].getsockname()[:2]
+
+    # Las conexiones keep-alive inactivas seguirían esperando la siguiente petición: se cierran y se
+    # espera a que sus tareas terminen (una que está calculando termina al escribir en la conexión)
+    async def cerrar(self):
+        if self.servidor is not None:
+            self.servidor.close()
+        for escritor in list(self.conexiones.values()):
+            escritor.close()
+        await asyncio.gather(*self.conexiones, return_exceptions=True)
+        if self.servidor is not None:
+            await self.servidor.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    def _en_pool(self, contenido, indice=None):
+        return asyncio.get_running_loop().run_in_executor(
+            self.pool, calcular, contenido, indice, self.predeterminados
+        )
+
+    # Una conexión: peticiones en secuencia mientras el cliente la mantenga abierta
+    async def atender(self, lector, escritor):
+        tarea = asyncio.current_task()
+        self.conexiones[tarea] = escritor
+        try:
+            while True:
+                try:
+                    peticion = await _leer_peticion(lector)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except (ErrorHTTP, ValueError) as e:
+                    await _responder(escritor, getattr(e, "estado", 400), {"ok": False, "error": str(e)}, False)
+                    break
+                if peticion is None:
+                    break
+                try:
+                    await self.despachar(peticion, escritor)
+                except ConnectionError:
+                    break
+                except (ErrorHTTP, ValueError) as e:
+                    if peticion["cabecera_enviada"]:
+                        break
+                    await _responder(escritor, getattr(e, "estado", 400), {"ok": False, "error": str(e)}, peticion["mantener"])
+                except Exception as e:
+                    # Error inesperado (p. ej. el pool de procesos se rompió): 500 si la respuesta no
+                    # empezó; si ya se envió la cabecera solo queda cortar la conexión
+                    traceback.print_exc()
+                    if not peticion["cabecera_enviada"]:
+                        await _responder(escritor, 500, {"ok": False, "error": f"{type(e).__name__}: {e}"}, False)
+                    break
+                if not peticion["mantener"]:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.conexiones.pop(tarea, None)
+            escritor.close()
+
+    async def despachar(self, peticion, escritor):
+        metodo, ruta, mantener = peticion["metodo"], peticion["ruta"], peticion["mantener"]
+        rutas = {"/salud": "GET", "/coordinar": "POST", "/lote": "POST"}
+        if ruta not in rutas:
+            raise ErrorHTTP(404, f"ruta desconocida ({ruta})")
+        if metodo != rutas[ruta]:
+            raise ErrorHTTP(405, f"{ruta} solo acepta {rutas[ruta]}")
+
+        if ruta == "/salud":
+            peticion["cabecera_enviada"] = True
+            await _responder(escritor, 200, {"ok": True, "procesos": self.procesos}, mantener)
+        elif ruta == "/coordinar":
+            respuesta = await self._en_pool(json.loads(peticion["cuerpo"].decode("utf-8-sig")))
+            cuerpo = respuesta.encode("utf-8")
+            estado = 200 if json.loads(respuesta)["ok"] else 400
+            peticion["cabecera_enviada"] = True
+            escritor.write(_cabecera(estado, "application/json; charset=utf-8", [f"Content-Length: {len(cuerpo)}"], mantener))
+            escritor.write(cuerpo)
+            await escritor.drain()
+        else:
+            estudios = _estudios_de(peticion)
+            peticion["cabecera_enviada"] = True
+            escritor.write(_cabecera(200, "application/x-ndjson; charset=utf-8", ["Transfer-Encoding: chunked"], mantener))
+            tareas = [self._en_pool(e, k) for k, e in enumerate(estudios)]
+            try:
+                for tarea in asyncio.as_completed(tareas):
+                    await _escribir_trozo(escritor, (await tarea).encode("utf-8") + b"\n")
+            finally:
+                # Si la respuesta se corta (cliente desconectado, pool roto) no se calcula el resto
+                for tarea in tareas:
+                    tarea.cancel()
+                await asyncio.gather(*tareas, return_exceptions=True)
+            escritor.write(b"0\r\n\r\n")
+            await escritor.drain()
+
+
+async def _servir(host, puerto, procesos):
+    servicio = Servicio(procesos)
+    direccion = await servicio.iniciar(host, puerto)
+    print(f"Servicio de coordinación en http://{direccion[0]}:{direccion[1]} ({servicio.procesos} procesos)")
+    try:
+        await servicio.servidor.serve_forever()
+    finally:
+        await servicio.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="servicio.py", description="API HTTP local de coordinación de relés.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8021)
+    parser.add_argument("--procesos", type=int, default=None, help="procesos del pool (predeterminado: CPUs)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_servir(args.host, args.puerto, args.procesos))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import contingencias
+import coordinacion
+import cortocircuito
+import generador_red
+import modelo_red
+
+TENSION_KV = 115.0
+PORCENTAJE_Z1 = 85
+CLAVES_FALLA = ["zth", "i_falla", "i_en_origen", "i_en_destino"]
+CLAVES_ZONA = ["z1", "z2", "z3", "z4", "rama_z2", "rama_z3", "ir", "k_infeed", "k_infeed_z3", "z2_infeed", "z3_infeed"]
+
+
+def _estado(topologia, n_ramas=60, semilla=5):
+    filas = generador_red.generar_red(n_ramas, topologia, semilla=semilla)
+    fuentes = generador_red.fuentes_sinteticas(filas, n_por_fuente=20, semilla=semilla)
+    indice = coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas))
+    config_falla = {"fuentes": fuentes, "tension_kv": TENSION_KV}
+    return contingencias._preparar(indice, PORCENTAJE_Z1, config_falla), config_falla
+
+
+def _sin_rama(indice, c):
+    tiene_param = indice["tiene_param"].copy()
+    tiene_param[c] = False
+    return dict(indice, tiene_param=tiene_param)
+
+
+# La actualización de rango 1 (con islas que quedan sin fuente) coincide con refactorizar Ybus
+# sin la rama
+@pytest.mark.parametrize("topologia", generador_red.TOPOLOGIAS)
+def test_fallas_sin_rama_igual_a_refactorizar(topologia):
+    estado, config_falla = _estado(topologia)
+    indice = estado["indice"]
+    islas = 0
+    for c in range(len(indice["origen"])):
+        actualizada = contingencias._fallas_sin_rama(estado, c)
+        indice_c = _sin_rama(indice, c)
+        referencia = cortocircuito.fallas_trifasicas(indice_c, **config_falla)
+
+        np.testing.assert_array_equal(actualizada["energizado"], referencia["energizado"], err_msg=f"rama {c}")
+        islas += (referencia["energizado"] != estado["fallas"]["energizado"]).any()
+        for clave in CLAVES_FALLA:
+            escala = np.abs(referencia[clave]).max()
+            np.testing.assert_allclose(
+                actualizada[clave], referencia[clave], rtol=0, atol=1e-12 * escala, err_msg=f"rama {c} {clave}"
+            )
+        _, _, _, activa = cortocircuito.matriz_admitancia(indice_c, config_falla["fuentes"])
+        escala = np.abs(referencia["z_rama"]).max()
+        np.testing.assert_allclose(
+            actualizada["z_rama"][activa], referencia["z_rama"][activa], rtol=0, atol=1e-12 * escala
+        )
+    if topologia == "radial":
+        assert islas > 0
+
+
+# Las zonas recalculadas solo para los relés afectados coinciden con el cálculo completo
+@pytest.mark.parametrize("topologia", generador_red.TOPOLOGIAS)
+def test_zonas_sin_rama_igual_a_calculo_completo(topologia):
+    estado, config_falla = _estado(topologia)
+    indice = estado["indice"]
+    for c in range(len(indice["origen"])):
+        resultado, _ = contingencias.zonas_sin_rama(estado, c)
+        indice_c = _sin_rama(indice, c)
+        completo = coordinacion.calcular_zonas(indice_c, PORCENTAJE_Z1, estado["rama_rele"], estado["sentido"])
+        completo = cortocircuito.aplicar_infeed(
+            completo, indice_c, cortocircuito.fallas_trifasicas(indice_c, **config_falla)
+        )
+        # Los relés de la propia rama conservan sus ajustes base
+        otros = estado["rama_rele"] != c
+        for clave in CLAVES_ZONA:
+            valor, esperado = np.asarray(resultado[clave])[otros], np.asarray(completo[clave])[otros]
+            finito = np.isfinite(esperado)
+            np.testing.assert_array_equal(np.isfinite(valor), finito, err_msg=f"rama {c} {clave}")
+            np.testing.assert_allclose(
+                valor[finito], esperado[finito], rtol=1e-9, atol=1e-9, err_msg=f"rama {c} {clave}"
+            )
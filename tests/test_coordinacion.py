@@ -0,0 +1,130 @@
+import cmath
+import math
+
+import numpy as np
+import pytest
+
+import coordinacion
+import modelo_red
+
+# ------------------------------------------------------------------------------------------------
+# Red pequeña armada a mano: en B hay líneas que salen y que entran, un trafo y una línea corta
+# entrante (Z2 media); en A hay una línea local que sale y un trafo (Z4). En L el trafo es corto y
+# la línea larga (Z2 máxima, Z3 por trafo) y desde P se elige Z3_1.
+# ------------------------------------------------------------------------------------------------
+FILAS = [
+    {"tipo": "linea", "origen": "A", "destino": "B", "z_mag": 10.0, "z_ang": 80.0, "i_mag": 1000.0, "i_ang": -80.0},
+    {"tipo": "linea", "origen": "B", "destino": "C", "z_mag": 8.0, "z_ang": 75.0, "i_mag": 600.0, "i_ang": -75.0},
+    {"tipo": "linea", "origen": "B", "destino": "D", "z_mag": 15.0, "z_ang": 78.0, "i_mag": 400.0, "i_ang": -78.0},
+    {"tipo": "linea", "origen": "E", "destino": "B", "z_mag": 5.0, "z_ang": 82.0, "i_mag": 300.0, "i_ang": -82.0},
+    {"tipo": "linea", "origen": "A", "destino": "F", "z_mag": 6.0, "z_ang": 79.0, "i_mag": 250.0, "i_ang": -79.0},
+    {"tipo": "linea", "origen": "C", "destino": "D", "z_mag": 12.0, "z_ang": 77.0, "i_mag": 350.0, "i_ang": -77.0},
+    {"tipo": "trafo", "origen": "B", "destino": "T", "z_mag": 40.0, "z_ang": 87.0, "i_mag": 200.0, "i_ang": -87.0},
+    {"tipo": "trafo", "origen": "G", "destino": "A", "z_mag": 25.0, "z_ang": 88.0, "i_mag": 150.0, "i_ang": -88.0},
+    {"tipo": "trafo", "origen": "D", "destino": "H", "z_mag": 30.0, "z_ang": 86.0, "i_mag": 120.0, "i_ang": -86.0},
+    {"tipo": "linea", "origen": "P", "destino": "K", "z_mag": 2.0, "z_ang": 80.0, "i_mag": 900.0, "i_ang": -80.0},
+    {"tipo": "linea", "origen": "K", "destino": "L", "z_mag": 10.0, "z_ang": 80.0, "i_mag": 800.0, "i_ang": -80.0},
+    {"tipo": "linea", "origen": "L", "destino": "M", "z_mag": 50.0, "z_ang": 80.0, "i_mag": 100.0, "i_ang": -80.0},
+    {"tipo": "trafo", "origen": "L", "destino": "N", "z_mag": 8.0, "z_ang": 88.0, "i_mag": 450.0, "i_ang": -88.0},
+]
+
+
+# ------------------------------------------------------------------------------------------------
+# Reglas por relé de la página original (Paso 5 e infeed del Paso 6), para el relé de la línea
+# lp_origen-lp_destino ubicado en lp_origen
+# ------------------------------------------------------------------------------------------------
+def _zonas_de_referencia(filas, lp_origen, lp_destino, porcentaje_z1=85):
+    z = lambda f: cmath.rect(f["z_mag"], math.radians(f["z_ang"]))
+    lineas = [f for f in filas if f["tipo"] == "linea"]
+    trafos = [f for f in filas if f["tipo"] == "trafo"]
+    protegida = next(f for f in lineas if {f["origen"], f["destino"]} == {lp_origen, lp_destino})
+    otras = [f for f in lineas if f is not protegida]
+    z_linea = z(protegida)
+
+    z1 = porcentaje_z1 / 100 * z_linea
+
+    z2_min = 1.2 * z_linea
+    conectadas = [z(f) for f in otras if lp_destino in (f["origen"], f["destino"])]
+    z_min_linea = min(conectadas, key=abs) if conectadas else None
+    z2_med = z_linea + 0.5 * z_min_linea if conectadas else 0
+    trafos_b = [z(f) for f in trafos if lp_destino in (f["origen"], f["destino"])]
+    z_min_trafo = min(trafos_b, key=abs) if trafos_b else None
+    z2_max = z_linea + 0.5 * z_min_trafo if trafos_b else float("inf")
+    if abs(z2_med) < abs(z2_min):
+        z2 = z2_med
+    elif abs(z2_med) > abs(z2_max):
+        z2 = z2_max
+    else:
+        z2 = z2_min
+
+    salen = [z(f) for f in otras if f["origen"] == lp_destino]
+    z_mayor_linea = max(salen, key=abs) if salen else 0j
+    z_mayor_trafo = max(trafos_b, key=abs) if trafos_b else float("inf")
+    z3_1 = 1.2 * (z_linea + z_mayor_linea)
+    z3_2 = z_linea + 1.25 * z_mayor_linea
+    z3_3 = z_linea + 0.8 * z_mayor_trafo
+    z3 = min([z3_1, z3_2, z3_3], key=abs)
+
+    locales = [z(f) for f in otras if f["origen"] == lp_origen]
+    trafos_a = [z(f) for f in trafos if lp_origen in (f["origen"], f["destino"])]
+    z4_1 = 0.2 * min(locales, key=abs) if locales else 0
+    z4_2 = 0.2 * z_linea
+    z4_3 = 0.2 * min(trafos_a, key=abs) if trafos_a else 0
+    z4 = min((c for c in [z4_1, z4_2, z4_3] if c != 0), key=abs)
+
+    # Infeed: corrientes de las ramas que salen de B, sin la rama usada en el alcance
+    def infeed(z_excluir, tipo_excluir):
+        total = 0.0
+        for f in filas:
+            if f is protegida or f["origen"] != lp_destino:
+                continue
+            if not (f["tipo"] == tipo_excluir and abs(z(f) - z_excluir) < 1e-6):
+                total += f["i_mag"]
+        return total
+
+    ir = protegida["i_mag"]
+    if abs(z2 - z2_min) < 1e-6:
+        if_z2 = infeed(z_min_linea, "linea")
+    elif abs(z2 - z2_max) < 1e-6:
+        if_z2 = infeed(z_min_trafo, "trafo")
+    else:
+        if_z2 = infeed(None, None)
+    if_z3 = infeed(z_mayor_trafo, "trafo") if z3 == z3_3 else infeed(z_mayor_linea, "linea")
+    k_infeed = if_z2 / ir
+    k_infeed_z3 = if_z3 / ir
+    return {
+        "z1": z1, "z2": z2, "z3": z3, "z4": z4,
+        "k_infeed": k_infeed, "k_infeed_z3": k_infeed_z3,
+        "z2_infeed": z2 * (1 + k_infeed), "z3_infeed": z3 * (1 + k_infeed_z3),
+    }
+
+
+@pytest.mark.parametrize("porcentaje_z1", [80, 85])
+def test_calcular_zonas_igual_a_reglas_por_rele(porcentaje_z1):
+    indice = coordinacion.indice_desde_modelo(modelo_red.desde_filas(FILAS))
+    resultado = coordinacion.calcular_zonas(indice, porcentaje_z1)
+    nodos = resultado["nodos"]
+
+    assert len(resultado["rama"]) == 2 * sum(f["tipo"] == "linea" for f in FILAS)
+    for r in range(len(resultado["rama"])):
+        a, b = nodos[resultado["nodo_rele"][r]], nodos[resultado["nodo_remoto"][r]]
+        referencia = _zonas_de_referencia(FILAS, a, b, porcentaje_z1)
+        for clave, valor in referencia.items():
+            assert resultado[clave][r] == pytest.approx(valor, rel=1e-12), f"{a}->{b} {clave}"
+
+
+def test_calcular_zonas_rele_a_b():
+    indice = coordinacion.indice_desde_modelo(modelo_red.desde_filas(FILAS))
+    resultado = coordinacion.calcular_zonas(indice)
+    rele = coordinacion.seleccionar_rele(resultado, indice["clave"].index("A_B"))
+    z_linea = cmath.rect(10.0, math.radians(80.0))
+
+    # Z2: la media (E-B, 5 Ω) queda entre la mínima y la máxima (trafo B-T) -> se usa la mínima
+    assert rele["z2"] == pytest.approx(1.2 * z_linea)
+    # Z3: línea B-D (la más larga que sale de B); Z3_2 (1.25 sobre B-D) es menor que Z3_1 y Z3_3
+    assert rele["z3"] == pytest.approx(z_linea + 1.25 * cmath.rect(15.0, math.radians(78.0)))
+    # Z4: línea local A-F
+    assert rele["z4"] == pytest.approx(0.2 * cmath.rect(6.0, math.radians(79.0)))
+    # Infeed: B-C + B-D + B-T (E-B entra a B); Z3 excluye B-D
+    assert rele["k_infeed"] == pytest.approx((600 + 400 + 200) / 1000)
+    assert rele["k_infeed_z3"] == pytest.approx((600 + 200) / 1000)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import coordinacion
+import cortocircuito
+import generador_red
+import modelo_red
+
+TENSION_KV = 115.0
+
+
+def _red(topologia, n_ramas=60, semilla=3, isla=False):
+    filas = generador_red.generar_red(n_ramas, topologia, semilla=semilla)
+    fuentes = generador_red.fuentes_sinteticas(filas, n_por_fuente=20, semilla=semilla)
+    if isla:
+        # Par de nodos sin fuente: queda desenergizado
+        filas.append({"tipo": "linea", "origen": "X1", "destino": "X2",
+                      "z_mag": 5.0, "z_ang": 80.0, "i_mag": 100.0, "i_ang": -80.0})
+    return coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas)), fuentes
+
+
+# ------------------------------------------------------------------------------------------------
+# Referencia densa: Ybus completa, Zbus = Ybus⁻¹ sobre los nodos energizados y aportes rama a rama
+# ------------------------------------------------------------------------------------------------
+def _fallas_densas(indice, fuentes, tension_kv):
+    n = len(indice["nodos"])
+    o, d, z = indice["origen"], indice["destino"], indice["z"]
+    activa = indice["tiene_param"] & (z != 0) & (o != d)
+    e = tension_kv * 1e3 / np.sqrt(3)
+
+    energizado = np.zeros(n, dtype=bool)
+    pendientes = [indice["nodo_id"][nodo] for nodo in fuentes if nodo in indice["nodo_id"]]
+    while pendientes:
+        nodo = pendientes.pop()
+        if energizado[nodo]:
+            continue
+        energizado[nodo] = True
+        for b in np.flatnonzero(activa & ((o == nodo) | (d == nodo))):
+            pendientes.append(d[b] if o[b] == nodo else o[b])
+
+    Y = np.zeros((n, n), dtype=np.complex128)
+    for b in np.flatnonzero(activa):
+        y = 1 / z[b]
+        Y[o[b], o[b]] += y
+        Y[d[b], d[b]] += y
+        Y[o[b], d[b]] -= y
+        Y[d[b], o[b]] -= y
+    for nodo, zf in fuentes.items():
+        Y[indice["nodo_id"][nodo], indice["nodo_id"][nodo]] += 1 / zf
+    sel = np.flatnonzero(energizado)
+    Z = np.zeros((n, n), dtype=np.complex128)
+    Z[np.ix_(sel, sel)] = np.linalg.inv(Y[np.ix_(sel, sel)])
+
+    zth = np.diag(Z).copy()
+    i_en_destino = np.zeros(len(o), dtype=np.complex128)
+    i_en_origen = np.zeros(len(o), dtype=np.complex128)
+    for b in np.flatnonzero(activa & energizado[o]):
+        i_en_destino[b] = e * (1 - Z[o[b], d[b]] / zth[d[b]]) / z[b]
+        i_en_origen[b] = e * (1 - Z[d[b], o[b]] / zth[o[b]]) / z[b]
+    i_falla = np.where(energizado, e / np.where(energizado, zth, 1), 0)
+    return {
+        "zth": zth,
+        "i_falla": i_falla,
+        "i_en_origen": i_en_origen,
+        "i_en_destino": i_en_destino,
+        "energizado": energizado,
+    }
+
+
+@pytest.mark.parametrize("topologia", generador_red.TOPOLOGIAS)
+@pytest.mark.parametrize("tam_bloque", [cortocircuito.TAM_BLOQUE, 7])
+def test_fallas_trifasicas_igual_a_zbus_densa(topologia, tam_bloque):
+    indice, fuentes = _red(topologia, isla=True)
+    fallas = cortocircuito.fallas_trifasicas(indice, fuentes, TENSION_KV, tam_bloque=tam_bloque)
+    referencia = _fallas_densas(indice, fuentes, TENSION_KV)
+
+    np.testing.assert_array_equal(fallas["energizado"], referencia["energizado"])
+    assert not fallas["energizado"][indice["nodo_id"]["X1"]]
+    for clave in ["zth", "i_falla", "i_en_origen", "i_en_destino"]:
+        escala = np.abs(referencia[clave]).max()
+        np.testing.assert_allclose(fallas[clave], referencia[clave], rtol=0, atol=1e-10 * escala, err_msg=clave)
+
+
+def test_aplicar_infeed_usa_aportes_en_el_nodo_remoto():
+    indice, fuentes = _red("mallada")
+    fallas = cortocircuito.fallas_trifasicas(indice, fuentes, TENSION_KV)
+    resultado = cortocircuito.aplicar_infeed(coordinacion.calcular_zonas(indice), indice, fallas)
+
+    o = indice["origen"]
+    for r in range(len(resultado["rama"])):
+        rama, remoto = resultado["rama"][r], resultado["nodo_remoto"][r]
+        aporte = lambda b: fallas["i_en_origen"][b] if o[b] == remoto else fallas["i_en_destino"][b]
+        ir = aporte(rama)
+        usada = resultado["rama_z2"][r]
+        i_f = fallas["i_falla"][remoto] - ir - (aporte(usada) if usada >= 0 else 0)
+        if abs(ir) > 1e-9 * abs(fallas["i_falla"][remoto]):
+            assert resultado["k_infeed"][r] == pytest.approx(abs(i_f) / abs(ir), rel=1e-12)
+            assert resultado["z2_infeed"][r] == pytest.approx(resultado["z2"][r] * (1 + abs(i_f) / abs(ir)), rel=1e-12)
+        else:
+            assert resultado["k_infeed"][r] == 0
@@ -0,0 +1,85 @@
+import numpy as np
+
+import coordinacion
+import escalonamiento
+import generador_red
+import modelo_red
+from cache_resultados import CacheLRU
+
+
+def _cadena():
+    filas = [
+        {"tipo": "linea", "origen": o, "destino": d, "z_mag": 10.0, "z_ang": 80.0, "i_mag": 1000.0, "i_ang": -80.0}
+        for o, d in [("A", "B"), ("B", "C"), ("C", "D")]
+    ]
+    return coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas))
+
+
+def _punto(tabla, rama, fraccion):
+    return int(np.flatnonzero((np.array(tabla["rama"]) == rama) & np.isclose(tabla["fraccion"], fraccion))[0])
+
+
+# ------------------------------------------------------------------------------------------------
+# Cadena radial A–B–C–D, 10 Ω por línea y Z1 al 85 %:
+#   C→D (extremo sin líneas aguas abajo): Z2 = Z2 media = 0, Z3 = Z3_2 = 10 Ω; la falla al 90 % de
+#   C–D (9 Ω) solo la ve en Z3 (0.8 s).
+#   B→C: Z2 = 12 Ω, Z3 = Z3_2 = 22.5 Ω; la misma falla la ve a 10 + 9 = 19 Ω, en Z3 (0.8 s).
+#   -> margen 0 s < CTI: la única violación de la red.
+# En A–B solo C→B mira hacia B (Z2 = 12 Ω): ve la falla al 90 % (10 + 1 Ω) pero no al 10 % ni al 50 %.
+# ------------------------------------------------------------------------------------------------
+def test_cadena_radial():
+    indice = _cadena()
+    resultado = coordinacion.calcular_zonas(indice, 85)
+    informe = escalonamiento.Escalonador(CacheLRU()).calcular(resultado, indice, usar_r_arco=False)
+    fallas = informe["fallas"]
+
+    p = _punto(fallas, "C_D", 0.9)
+    assert fallas["t_primario"][p] == escalonamiento.TIEMPOS_ZONA["z1"]
+    assert fallas["t_respaldo_1"][p] == escalonamiento.TIEMPOS_ZONA["z3"]
+    assert fallas["margen_min"][p] == 0
+    assert fallas["violaciones"][p] == 1
+    assert informe["resumen"]["violaciones"] == 1
+    assert informe["resumen"]["pares_con_violacion"] == 1
+
+    mapa = informe["mapa"]
+    assert mapa["rele_respaldo"][0] == "B_C (B → C)" and mapa["rele_respaldado"][0] == "C_D (C → D)"
+    assert mapa["margen_min"][0] == 0 and mapa["violaciones"][0] == 1
+
+    for fraccion in (0.1, 0.5):
+        p = _punto(fallas, "A_B", fraccion)
+        assert np.isnan(fallas["t_respaldo_1"][p])
+        assert "sin respaldo remoto" in fallas["observaciones"][p]
+    assert fallas["t_respaldo_1"][_punto(fallas, "A_B", 0.9)] == escalonamiento.TIEMPOS_ZONA["z2"]
+    assert informe["resumen"]["puntos_sin_respaldo"] == 2
+    assert informe["resumen"]["puntos_sin_primario"] == 0
+
+
+def _iguales(a, b):
+    assert a["resumen"] == b["resumen"]
+    for tabla in ("fallas", "mapa"):
+        assert list(a[tabla]) == list(b[tabla])
+        for columna in a[tabla]:
+            np.testing.assert_array_equal(np.asarray(a[tabla][columna]), np.asarray(b[tabla][columna]), err_msg=columna)
+
+
+def _resultado(indice, porcentaje_z1):
+    return coordinacion.agregar_r_arco(coordinacion.calcular_zonas(indice, porcentaje_z1), 60.0)
+
+
+# El recálculo incremental da lo mismo que un Escalonador nuevo con las mismas entradas
+def test_recalculo_incremental_igual_a_escalonador_nuevo():
+    filas = generador_red.generar_red(80, "mallada", semilla=2)
+    indice = coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas))
+    escalonador = escalonamiento.Escalonador(CacheLRU())
+    previo = escalonador.calcular(_resultado(indice, 85), indice)
+
+    resultado = _resultado(indice, 40)
+    incremental = escalonador.calcular(resultado, indice)
+    assert incremental["resumen"] != previo["resumen"]
+    _iguales(incremental, escalonamiento.Escalonador(CacheLRU()).calcular(resultado, indice))
+
+    # Solo cambia la impedancia de una rama (mismos ajustes): se reevalúan las filas de esa falla
+    indice["z"][5] *= 1.5
+    incremental = escalonador.calcular(resultado, indice)
+    assert 0 < escalonador.ultimo_informe["reevaluadas"] < escalonador.ultimo_informe["filas"]
+    _iguales(incremental, escalonamiento.Escalonador(CacheLRU()).calcular(resultado, indice))
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import coordinacion
+import cortocircuito
+import generador_red
+import modelo_red
+import selectividad
+
+
+def _cadena():
+    filas = [
+        {"tipo": "linea", "origen": o, "destino": d, "z_mag": 10.0, "z_ang": 80.0, "i_mag": 1000.0, "i_ang": -80.0}
+        for o, d in [("A", "B"), ("B", "C"), ("C", "D")]
+    ]
+    return coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas))
+
+
+# ------------------------------------------------------------------------------------------------
+# Cadena A–B–C–D, 10 Ω por línea: Z3 de B→C (22.5 Ω) llega al final de C–D, donde C→D solo tiene Z3
+# (Z2 nula en el extremo) desde el 85 %; Z3 de A→B sale 2.5 Ω a C–D, sobre la Z3 de B→C (que empieza
+# al 20 %, donde termina su Z2 de 12 Ω).
+# ------------------------------------------------------------------------------------------------
+def test_solapes_z3_en_cadena():
+    indice = _cadena()
+    tabla, _ = selectividad.verificar_selectividad(coordinacion.calcular_zonas(indice, 85), indice)
+    solapes = {
+        (z, lejano, cercano, rama): (desde, hasta)
+        for z, lejano, cercano, rama, desde, hasta in zip(
+            tabla["zona"], tabla["rele_respaldo"], tabla["rele_cercano"], tabla["rama"], tabla["desde"], tabla["hasta"]
+        )
+    }
+    assert set(solapes) == {
+        ("Z3", "B_C (B → C)", "C_D (C → D)", "C_D"),
+        ("Z3", "A_B (A → B)", "B_C (B → C)", "C_D"),
+    }
+    assert solapes["Z3", "B_C (B → C)", "C_D (C → D)", "C_D"] == pytest.approx((0.85, 1.0))
+    assert solapes["Z3", "A_B (A → B)", "B_C (B → C)", "C_D"] == pytest.approx((0.20, 0.25))
+
+
+# Comparación de todos los pares de tramos (O(I²)) con el mismo criterio que _solapes
+def _solapes_por_pares(cob, k):
+    fila, inicio, fin = selectividad._tramos(cob, k)
+    rama, entrada = cob["rama"][fila], cob["entrada"][fila]
+    rele, saltos = cob["rele"][fila], cob["saltos"][fila]
+    pares = set()
+    for i in range(len(fila)):
+        for j in range(i + 1, len(fila)):
+            if rama[i] != rama[j] or entrada[i] != entrada[j] or rele[i] == rele[j] or saltos[i] == saltos[j]:
+                continue
+            if max(inicio[i], inicio[j]) < min(fin[i], fin[j]) - selectividad.TOLERANCIA:
+                lejano, cercano = (i, j) if saltos[i] > saltos[j] else (j, i)
+                pares.add((fila[lejano], fila[cercano], max(inicio[i], inicio[j]), min(fin[i], fin[j])))
+    return pares
+
+
+@pytest.mark.parametrize("usar_infeed", [False, True])
+def test_indice_de_tramos_no_pierde_solapes(usar_infeed):
+    filas = generador_red.generar_red(60, "mallada", semilla=4)
+    indice = coordinacion.indice_desde_modelo(modelo_red.desde_filas(filas))
+    resultado = coordinacion.calcular_zonas(indice, 85)
+    if usar_infeed:
+        fuentes = generador_red.fuentes_sinteticas(filas, n_por_fuente=15, semilla=4)
+        resultado = cortocircuito.aplicar_infeed(resultado, indice, cortocircuito.fallas_trifasicas(indice, fuentes, 115.0))
+    cob = selectividad.coberturas(resultado, indice, usar_infeed=usar_infeed)
+
+    total = 0
+    for k in range(len(selectividad.ZONAS)):
+        s = selectividad._solapes(cob, k)
+        indexados = set(zip(s["lejano"].tolist(), s["cercano"].tolist(), s["desde"].tolist(), s["hasta"].tolist()))
+        assert len(indexados) == len(s["lejano"])
+        assert indexados == _solapes_por_pares(cob, k)
+        total += len(indexados)
+    assert total > 0
@@ -0,0 +1,89 @@
+import random
+
+import networkx as nx
+
+import modelo_red
+import validacion_red
+
+NODOS = [f"N{k}" for k in range(12)]
+
+
+# Referencia con networkx sobre los elementos (nombres), sin pasar por el modelo
+def _referencia(elementos, declarados):
+    grafo = nx.MultiGraph()
+    completas = [e for e in elementos if e["origen"] and e["destino"]]
+    grafo.add_nodes_from(declarados)
+    grafo.add_edges_from((e["origen"], e["destino"]) for e in completas)
+    tipos = {}
+    for e in completas:
+        tipos.setdefault(tuple(sorted((e["origen"], e["destino"]))), set()).add(e["tipo"])
+    return {
+        "islas": {frozenset(c) for c in nx.connected_components(grafo)},
+        "colgantes": sum(1 for _, g in grafo.degree() if g == 1),
+        "aislados": sorted(n for n in grafo if not grafo.degree(n)),
+        "conflictos": sorted(par for par, t in tipos.items() if len(t) == 2),
+        "lazos": sorted({e["origen"] for e in completas if e["origen"] == e["destino"]}),
+        "incompletas": len(elementos) - len(completas),
+    }
+
+
+def _editar(rng, elementos, red):
+    extremo = lambda: "" if rng.random() < 0.05 else rng.choice(NODOS)
+    accion = rng.random()
+    if accion < 0.3 or len(elementos) < 3:
+        elementos.append({"tipo": rng.choice(["linea", "trafo"]), "origen": extremo(), "destino": extremo()})
+    elif accion < 0.45 or len(elementos) > 40:
+        elementos.pop(rng.randrange(len(elementos)))
+    elif accion < 0.6:
+        e = rng.choice(elementos)
+        e[rng.choice(["origen", "destino"])] = extremo()
+    elif accion < 0.7:
+        e = rng.choice(elementos)
+        e["tipo"] = "trafo" if e["tipo"] == "linea" else "linea"
+    elif accion < 0.8:
+        # Paralela (o duplicada) de una rama existente, con id nuevo
+        e = rng.choice(elementos)
+        elementos.append({k: v for k, v in e.items() if k != "id"})
+    elif accion < 0.85:
+        n = rng.choice(NODOS)
+        elementos.append({"tipo": "linea", "origen": n, "destino": n})
+    elif accion < 0.95:
+        # Parámetros del Paso 4: dos impedancias posibles para que aparezcan duplicadas
+        e = rng.choice(elementos)
+        if "id" in e:
+            modelo_red.asignar(red, [e["id"]], z=rng.choice([5 + 5j, 8 + 2j]), icc=1000 + 0j)
+    else:
+        elementos.sort(key=lambda _: rng.random())
+
+
+# ------------------------------------------------------------------------------------------------
+# Secuencia aleatoria de ediciones: el validador de larga vida (incremental, con el union-find sucio
+# y reconstruido) debe coincidir con uno nuevo y ambos con networkx después de cada sincronización
+# ------------------------------------------------------------------------------------------------
+def test_ediciones_aleatorias_igual_a_validador_nuevo_y_networkx():
+    rng = random.Random(7)
+    red = modelo_red.red_vacia()
+    elementos, declarados = [], []
+    validador = validacion_red.ValidadorRed()
+    for paso in range(3000):
+        _editar(rng, elementos, red)
+        if rng.random() < 0.1:
+            declarados = rng.sample(NODOS, rng.randrange(len(NODOS)))
+        modelo_red.sincronizar(red, modelo_red.fijar_ids(red, elementos))
+
+        incremental = validador.sincronizar(red, declarados).informe()
+        nuevo = validacion_red.ValidadorRed().sincronizar(red, declarados)
+        completo = nuevo.informe()
+        for clave in (
+            "nodos", "ramas", "componentes", "nodos_fuera_de_la_red", "conflictos", "lazos",
+            "cantidad_duplicadas", "incompletas", "aislados", "colgantes",
+        ):
+            assert incremental[clave] == completo[clave], (paso, clave)
+
+        esperado = _referencia(elementos, set(declarados) & set(red["nodo_id"]))
+        for v in (validador, nuevo):
+            islas = {frozenset(red["nodos"][n] for n in isla) for isla in v.islas()}
+            assert islas == esperado["islas"], paso
+        assert sorted(tuple(sorted(par)) for par in completo["conflictos"]) == esperado["conflictos"], paso
+        for clave in ("colgantes", "aislados", "lazos", "incompletas"):
+            assert completo[clave] == esperado[clave], (paso, clave)
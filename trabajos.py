@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Estados de un trabajo
+PENDIENTE = "pendiente"
+EN_CURSO = "en curso"
+TERMINADO = "terminado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+FINALES = (TERMINADO, FALLIDO, CANCELADO)
+
+
+class Cancelado(Exception):
+    pass
+
+
+# ------------------------------------------------------------------------------------------------
+# Trabajos en segundo plano para los cálculos pesados (layout de redes grandes, barrido N-1, ...)
+#
+# Cada trabajo se identifica por una clave (la huella de sus entradas): si varias sesiones piden
+# el mismo cálculo mientras está en curso, comparten el trabajo. Una sesión que ya no necesita el
+# resultado (p. ej. porque cambió las entradas) se da de baja; el trabajo se cancela cuando no
+# queda ninguna sesión suscrita.
+#
+# La función corre en un hilo del pool y puede informar su avance con avance(n, total, texto);
+# la misma llamada lanza Cancelado si el trabajo fue cancelado (cancelación cooperativa). Las
+# funciones que no informan avance solo se pueden cancelar antes de empezar.
+# ------------------------------------------------------------------------------------------------
+_hilo = threading.local()
+
+
+class Trabajo:
+    def __init__(self, clave, nombre):
+        self.clave = clave
+        self.nombre = nombre
+        self.estado = PENDIENTE
+        self.avance = None
+        self.texto = ""
+        self.resultado = None
+        self.error = None
+        self.sesiones = set()
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.cancelar = threading.Event()
+        self.futuro = None
+
+    def segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def terminado(self):
+        return self.estado in FINALES
+
+
+# Avance del trabajo en curso en este hilo (fuera de un trabajo no hace nada)
+def avance(n, total, texto=""):
+    trabajo = getattr(_hilo, "trabajo", None)
+    if trabajo is None:
+        return
+    if trabajo.cancelar.is_set():
+        raise Cancelado(trabajo.nombre)
+    trabajo.avance = n / total if total else None
+    trabajo.texto = texto
+
+
+class PoolTrabajos:
+    def __init__(self, max_hilos=2, max_terminados=32):
+        self.max_terminados = max_terminados
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="protec21-trabajo")
+        self._trabajos = OrderedDict()
+        self._lock = threading.Lock()
+        self.enviados = 0
+        self.compartidos = 0
+
+    def enviar(self, clave, nombre, funcion, *args, sesion=None, **kwargs):
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is not None and not trabajo.terminado():
+                # Mismo cálculo en curso o en cola: se comparte
+                trabajo.sesiones.add(sesion)
+                self._trabajos.move_to_end(clave)
+                self.compartidos += 1
+                return trabajo
+            trabajo = Trabajo(clave, nombre)
+            trabajo.sesiones.add(sesion)
+            self._trabajos[clave] = trabajo
+            self.enviados += 1
+            trabajo.futuro = self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+            self._podar()
+            return trabajo
+
+    def _ejecutar(self, trabajo, funcion, args, kwargs):
+        if trabajo.cancelar.is_set():
+            trabajo.estado = CANCELADO
+            return
+        trabajo.estado = EN_CURSO
+        trabajo.inicio = time.time()
+        _hilo.trabajo = trabajo
+        try:
+            resultado = funcion(*args, **kwargs)
+            trabajo.resultado, trabajo.estado = resultado, TERMINADO
+        except Cancelado:
+            trabajo.estado = CANCELADO
+        except Exception as e:
+            trabajo.error, trabajo.estado = f"{type(e).__name__}: {e}", FALLIDO
+        finally:
+            _hilo.trabajo = None
+            trabajo.fin = time.time()
+
+    def obtener(self, clave):
+        with self._lock:
+            return self._trabajos.get(clave)
+
+    # La sesión deja de esperar el trabajo; sin sesiones suscritas, el trabajo se cancela
+    def soltar(self, clave, sesion=None):
+        with self._lock:
+            trabajo = self._trabajos.get(clave)
+            if trabajo is None:
+                return
+            trabajo.sesiones.discard(sesion)
+            if not trabajo.sesiones and not trabajo.terminado():
+                trabajo.cancelar.set()
+                if trabajo.futuro.cancel():
+                    trabajo.estado = CANCELADO
+                del self._trabajos[clave]
+
+    # Descarta los trabajos terminados más antiguos por encima de max_terminados
+    def _podar(self):
+        terminados = [c for c, t in self._trabajos.items() if t.terminado()]
+        for clave in terminados[:max(0, len(terminados) - self.max_terminados)]:
+            del self._trabajos[clave]
+
+    def resumen(self):
+        with self._lock:
+            estados = [t.estado for t in self._trabajos.values()]
+        return {estado: estados.count(estado) for estado in (PENDIENTE, EN_CURSO, TERMINADO, FALLIDO, CANCELADO)}
+
+
+# Pool compartido por todas las sesiones. PROTEC21_TRABAJOS fija la cantidad de hilos.
+POOL = PoolTrabajos(max_hilos=int(os.environ.get("PROTEC21_TRABAJOS", "2")))
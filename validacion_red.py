@@ -0,0 +1,272 @@
+from collections import Counter
+
+import numpy as np
+
+import modelo_red
+import perfilador
+
+# Islas y elementos que se listan por nombre en el informe (el resto solo se cuenta)
+MAX_LISTADOS = 20
+
+
+# ------------------------------------------------------------------------------------------------
+# Validación incremental de la topología sobre el modelo de red (modelo_red)
+#
+# Estructuras mantenidas rama por rama (agregar/quitar en O(1) amortizado):
+#   por_par    {(a, b): [líneas, trafos]} con a <= b: índice hash de conflictos línea/trafo
+#   firmas     Counter de (tipo, a, b, z, icc): ramas duplicadas (mismos nodos, tipo y parámetros;
+#              las paralelas con otra impedancia son válidas)
+#   grado      Counter de ramas por nodo: nodos aislados (declarados sin ramas) y colgantes (grado 1)
+#   union-find de los nodos: componentes conexas e islas
+# El union-find solo admite uniones; al quitar la única rama entre dos nodos se marca como sucio
+# y se reconstruye (O(n)) una sola vez, en la siguiente consulta de conectividad.
+# sincronizar() compara el modelo con el estado anterior por id (vectorizado) y aplica solo las
+# ramas que cambiaron.
+# ------------------------------------------------------------------------------------------------
+class ValidadorRed:
+    def __init__(self):
+        self.ramas = {}
+        self.por_par = {}
+        self.conflictos = set()
+        self.lazos = set()
+        self.incompletas = set()
+        self.firmas = Counter()
+        self.grado = Counter()
+        self.declarados = set()
+        self.nombres = []
+        self.colgantes = 0
+        self._padre = {}
+        self._miembros = {}
+        self._sucio = False
+        self._previo = None
+        self._informe = None
+        self.cambios = 0
+
+    # --- Union-find con compresión de caminos y unión por tamaño; cada raíz guarda los nodos de su
+    # componente (se fusiona la lista menor en la mayor: O(log n) amortizado por nodo) ---
+    def _raiz(self, n):
+        padre = self._padre
+        raiz = n
+        while padre[raiz] >= 0:
+            raiz = padre[raiz]
+        while padre[n] >= 0 and padre[n] != raiz:
+            padre[n], n = raiz, padre[n]
+        return raiz
+
+    def _nodo(self, n):
+        if n not in self._padre:
+            self._padre[n] = -1
+            self._miembros[n] = [n]
+
+    def _unir(self, a, b):
+        ra, rb = self._raiz(a), self._raiz(b)
+        if ra == rb:
+            return
+        if self._padre[ra] > self._padre[rb]:
+            ra, rb = rb, ra
+        self._padre[ra] += self._padre[rb]
+        self._padre[rb] = ra
+        self._miembros[ra].extend(self._miembros.pop(rb))
+
+    def _reconstruir(self):
+        self._padre, self._miembros = {}, {}
+        for n in self.declarados:
+            self._nodo(n)
+        for n in self.grado:
+            self._nodo(n)
+        for tipo, a, b, _ in self.ramas.values():
+            if a >= 0 and b >= 0:
+                self._unir(a, b)
+        self._sucio = False
+
+    # --- Altas y bajas de ramas ---
+    # Una rama que conserva sus extremos (cambio de tipo o de parámetros) no toca la conectividad
+    def agregar(self, id_rama, tipo, a, b, parametros=None):
+        previo = self.ramas.get(id_rama)
+        mismos_extremos = previo is not None and previo[1:3] == (a, b)
+        self.quitar(id_rama, conectividad=not mismos_extremos)
+        self.ramas[id_rama] = (tipo, a, b, parametros)
+        self._informe = None
+        self.cambios += 1
+        if a < 0 or b < 0:
+            self.incompletas.add(id_rama)
+            return
+        if a == b:
+            self.lazos.add(id_rama)
+        par = (min(a, b), max(a, b))
+        conteo = self.por_par.setdefault(par, [0, 0])
+        conteo[tipo] += 1
+        if conteo[modelo_red.LINEA] and conteo[modelo_red.TRAFO]:
+            self.conflictos.add(par)
+        if parametros is not None:
+            self.firmas[(tipo, *par, *parametros)] += 1
+        if mismos_extremos:
+            return
+        self._sumar_grado(a, 1)
+        self._sumar_grado(b, 1)
+        if not self._sucio:
+            self._nodo(a)
+            self._nodo(b)
+            self._unir(a, b)
+
+    def quitar(self, id_rama, conectividad=True):
+        registro = self.ramas.pop(id_rama, None)
+        if registro is None:
+            return
+        self._informe = None
+        self.cambios += 1
+        tipo, a, b, parametros = registro
+        if a < 0 or b < 0:
+            self.incompletas.discard(id_rama)
+            return
+        self.lazos.discard(id_rama)
+        par = (min(a, b), max(a, b))
+        conteo = self.por_par[par]
+        conteo[tipo] -= 1
+        if not (conteo[modelo_red.LINEA] and conteo[modelo_red.TRAFO]):
+            self.conflictos.discard(par)
+        if not any(conteo):
+            del self.por_par[par]
+        if parametros is not None:
+            firma = (tipo, *par, *parametros)
+            self.firmas[firma] -= 1
+            if not self.firmas[firma]:
+                del self.firmas[firma]
+        if not conectividad:
+            return
+        self._sumar_grado(a, -1)
+        self._sumar_grado(b, -1)
+        # Solo una baja que puede desconectar (no queda otra rama en paralelo) o que deja un nodo
+        # sin ramas obliga a reconstruir el union-find
+        if (a != b and par not in self.por_par) or a not in self.grado or b not in self.grado:
+            self._sucio = True
+
+    def _sumar_grado(self, n, delta):
+        previo = self.grado[n]
+        actual = previo + delta
+        self.colgantes += (actual == 1) - (previo == 1)
+        if actual:
+            self.grado[n] = actual
+        else:
+            del self.grado[n]
+
+    def fijar_declarados(self, nodos):
+        nodos = set(nodos)
+        if nodos == self.declarados:
+            return
+        if self.declarados - nodos:
+            self._sucio = True
+        self.declarados = nodos
+        self._informe = None
+        if not self._sucio:
+            for n in nodos:
+                self._nodo(n)
+
+    # --- Sincronización con el modelo: solo se aplican las ramas nuevas, cambiadas o borradas ---
+    @perfilador.medido("validación de topología")
+    def sincronizar(self, red, declarados=()):
+        self.nombres = red["nodos"]
+        ids = red["id"]
+        campos = {
+            "tipo": red["tipo"], "origen": red["origen"], "destino": red["destino"],
+            "z": np.where(red["tiene_param"], red["z"], np.nan), "icc": np.where(red["tiene_param"], red["icc"], np.nan),
+        }
+        orden = np.argsort(ids, kind="stable")
+        actual = {"id": ids[orden], **{c: v[orden] for c, v in campos.items()}}
+
+        previo = self._previo
+        if previo is None or not len(previo["id"]):
+            cambiadas = np.ones(len(ids), dtype=bool)
+            borradas = np.empty(0, dtype=np.int64)
+        else:
+            pos = np.searchsorted(previo["id"], actual["id"]).clip(0, len(previo["id"]) - 1)
+            cambiadas = previo["id"][pos] != actual["id"]
+            for c in campos:
+                # NaN == NaN cuenta como igual (ramas sin parámetros)
+                a, b = previo[c][pos], actual[c]
+                cambiadas |= ~((a == b) | ((a != a) & (b != b)))
+            borradas = np.setdiff1d(previo["id"], actual["id"], assume_unique=True)
+
+        for id_rama in borradas.tolist():
+            self.quitar(id_rama)
+        for k in np.flatnonzero(cambiadas).tolist():
+            z, icc = complex(actual["z"][k]), complex(actual["icc"][k])
+            self.agregar(
+                int(actual["id"][k]), int(actual["tipo"][k]), int(actual["origen"][k]), int(actual["destino"][k]),
+                None if z != z else (z, icc)
+            )
+        self._previo = actual
+
+        nodo_id = red["nodo_id"]
+        self.fijar_declarados(nodo_id[n] for n in declarados if n in nodo_id)
+        return self
+
+    # --- Consultas ---
+    def componentes(self):
+        if self._sucio:
+            self._reconstruir()
+        return len(self._miembros)
+
+    # Nodos de cada componente, de mayor a menor
+    def islas(self):
+        if self._sucio:
+            self._reconstruir()
+        return sorted(self._miembros.values(), key=len, reverse=True)
+
+    def informe(self):
+        if self._informe is not None:
+            return self._informe
+        nombre = lambda n: self.nombres[n]
+        islas = self.islas()
+        duplicadas = [(f, c) for f, c in self.firmas.items() if c > 1]
+        self._informe = {
+            "nodos": len(self._padre),
+            "ramas": len(self.ramas),
+            "componentes": len(islas),
+            "conexa": len(islas) <= 1,
+            "islas": [sorted(map(nombre, isla)) for isla in islas[1:MAX_LISTADOS + 1]],
+            "nodos_fuera_de_la_red": sum(len(isla) for isla in islas[1:]),
+            "conflictos": sorted((nombre(a), nombre(b)) for a, b in self.conflictos),
+            "lazos": sorted({nombre(self.ramas[i][1]) for i in self.lazos}),
+            "duplicadas": [
+                {"tipo": modelo_red.NOMBRES_TIPO[f[0]], "origen": nombre(f[1]), "destino": nombre(f[2]), "cantidad": c}
+                for f, c in duplicadas[:MAX_LISTADOS]
+            ],
+            "cantidad_duplicadas": sum(c - 1 for _, c in duplicadas),
+            "incompletas": len(self.incompletas),
+            "aislados": sorted(nombre(n) for n in self.declarados if not self.grado[n]),
+            "colgantes": self.colgantes,
+        }
+        return self._informe
+
+
+# Validación completa de un modelo (importaciones y lotes): lineal en la cantidad de ramas
+def validar_red(red, declarados=()):
+    return ValidadorRed().sincronizar(red, declarados).informe()
+
+
+# Mensajes para la interfaz: [(nivel, texto)] con nivel "error", "advertencia" o "info"
+def mensajes(informe):
+    salida = []
+    if informe["conflictos"]:
+        salida.append(("error", f"Hay líneas y transformadores entre los mismos nodos: {informe['conflictos'][:MAX_LISTADOS]}"))
+    if informe["lazos"]:
+        salida.append(("error", f"Ramas con el mismo nodo de origen y destino en: {informe['lazos'][:MAX_LISTADOS]}"))
+    if not informe["conexa"]:
+        salida.append((
+            "advertencia",
+            f"La red no es conexa: {informe['componentes']} componentes, "
+            f"{informe['nodos_fuera_de_la_red']} nodos fuera de la componente principal. "
+            f"Islas: {informe['islas'][:5]}"
+        ))
+    if informe["aislados"]:
+        salida.append(("advertencia", f"Nodos sin ramas: {informe['aislados'][:MAX_LISTADOS]}"))
+    if informe["cantidad_duplicadas"]:
+        salida.append((
+            "advertencia",
+            f"{informe['cantidad_duplicadas']} ramas duplicadas (mismos nodos, tipo y parámetros): "
+            + ", ".join(f"{d['tipo']} {d['origen']}–{d['destino']} ×{d['cantidad']}" for d in informe["duplicadas"])
+        ))
+    if informe["incompletas"]:
+        salida.append(("info", f"{informe['incompletas']} ramas sin origen o destino."))
+    return salida
@@ -0,0 +1,137 @@
+import numpy as np
+
+import coordinacion
+import zonas
+
+ZONAS = ["z1", "z2", "z3", "z4"]
+# Resistencias de arco (Ω) con las que se repite cada falla
+RESISTENCIAS = (0.0, 1.0, 2.0, 5.0, 10.0)
+# Puntos de falla por bloque de relés (acota la memoria del barrido)
+MAX_PUNTOS_BLOQUE = 2_000_000
+
+
+# Zonas mho de ajustes (..., n) listas para compararse contra puntos z de forma (n, ...)
+def _zonas_mho(z_ajuste, ndim):
+    z_ajuste = np.asarray(z_ajuste, dtype=np.complex128)
+    return zonas.mho(z_ajuste.reshape(z_ajuste.shape + (1,) * (ndim - 1)))
+
+
+# Fracción de la rama cubierta de forma continua desde el relé (puntos en el eje -2)
+def _cobertura(visto, paso):
+    return np.cumprod(visto, axis=-2).sum(axis=-2) * paso
+
+
+# ------------------------------------------------------------------------------------------------
+# Barrido de fallas: cada paso (1 % por defecto) de la línea protegida y de cada rama que sale
+# del nodo remoto B, con cada resistencia de arco. Impedancia aparente vista por el relé en A:
+#   falla en la línea protegida:   Z = p·ZL + Rf
+#   falla en una rama adyacente:   Z = ZL + (1 + K)(p·Z_adj + Rf)      (K = factor de infeed)
+# Las coberturas se miden sin resistencia de arco; *_cobertura_rf es la peor con arco y el
+# sobrealcance considera todas las resistencias. Con usar_r_arco=True se verifican las características ajustadas por R_arco (las del Paso 6).
+# Devuelve la tabla por relé y la cantidad de pares falla/relé evaluados.
+# ------------------------------------------------------------------------------------------------
+def verificar_red(resultado, indice, porcentaje_z1=85, paso=0.01, resistencias=RESISTENCIAS,
+                  usar_r_arco=True, max_puntos=MAX_PUNTOS_BLOQUE):
+    n = len(resultado["rama"])
+    fracciones = np.arange(1, int(round(1 / paso)) + 1) * paso
+    rf = np.asarray(resistencias, dtype=np.float64)
+    ajustes = np.stack([
+        resultado[f"r_arco_{z}" if usar_r_arco and f"r_arco_{z}" in resultado else z] for z in ZONAS
+    ])
+
+    # --- Ramas adyacentes (incidentes a B, sin la línea protegida) como pares (relé, rama) ---
+    o_r, d_r, z = indice["origen"], indice["destino"], indice["z"]
+    nodo_a, nodo_b = resultado["nodo_rele"], resultado["nodo_remoto"]
+    rel, ram = coordinacion._pares(indice["ptr"], indice["inc"], nodo_b)
+    misma = ((o_r[ram] == nodo_a[rel]) & (d_r[ram] == nodo_b[rel])) | ((o_r[ram] == nodo_b[rel]) & (d_r[ram] == nodo_a[rel]))
+    ok = ~misma & indice["tiene_param"][ram] & (o_r[ram] != d_r[ram])
+    rel, ram = rel[ok], ram[ok]
+
+    cobertura = np.zeros((4, n))
+    cobertura_rf = np.zeros((4, n))
+    rf_min = int(np.argmin(rf))
+    ve_remota = np.zeros((4, n), dtype=bool)
+    alcance_ady = np.zeros((4, n))
+    cobertura_ady_min = np.full((4, n), np.inf)
+
+    puntos_por_rele = len(fracciones) * len(rf) * (1 + np.bincount(rel, minlength=n))
+    total = int(puntos_por_rele.sum())
+    cortes = np.searchsorted(np.cumsum(puntos_por_rele), np.arange(max_puntos, total, max_puntos))
+    bordes = np.unique(np.concatenate([[0], cortes + 1, [n]]).clip(0, n))
+    for inicio, fin in zip(bordes[:-1], bordes[1:]):
+        sel = np.arange(inicio, fin)
+        z_linea = resultado["z_linea"][sel]
+
+        # Línea protegida: (relé, p, Rf)
+        z_app = fracciones[None, :, None] * z_linea[:, None, None] + rf[None, None, :]
+        visto = zonas.contiene(_zonas_mho(ajustes[:, sel], z_app.ndim), z_app)
+        cob = _cobertura(visto, paso)
+        cobertura[:, sel] = cob[..., rf_min]
+        cobertura_rf[:, sel] = cob.min(axis=-1)
+        ve_remota[:, sel] = visto[:, :, -1, :].any(axis=-1)
+
+        # Ramas adyacentes: (par, p, Rf)
+        en_bloque = (rel >= inicio) & (rel < fin)
+        p_rel, p_ram = rel[en_bloque], ram[en_bloque]
+        if p_rel.size:
+            k = np.nan_to_num(resultado["k_infeed"][p_rel], nan=0.0, posinf=0.0)
+            z_app = resultado["z_linea"][p_rel][:, None, None] + (1 + k)[:, None, None] * (
+                fracciones[None, :, None] * z[p_ram][:, None, None] + rf[None, None, :]
+            )
+            visto = zonas.contiene(_zonas_mho(ajustes[:, p_rel], z_app.ndim), z_app)
+            alcance = (visto.any(axis=-1) * fracciones).max(axis=-1)
+            cob = _cobertura(visto[..., rf_min:rf_min + 1], paso)[..., 0]
+            for i in range(4):
+                np.maximum.at(alcance_ady[i], p_rel, alcance[i])
+                np.minimum.at(cobertura_ady_min[i], p_rel, cob[i])
+
+    tiene_ady = np.bincount(rel, minlength=n) > 0
+    cobertura_ady_min[:, ~tiene_ady] = np.nan
+    objetivo_z1 = porcentaje_z1 / 100
+
+    z1_sobrealcance = ve_remota[0] | (alcance_ady[0] > 0)
+    z1_subalcance = cobertura[0] < objetivo_z1 - paso - 1e-9
+    z2_subalcance = cobertura[1] < 1 - 1e-9
+    z2_sobrealcance = alcance_ady[1] >= 1 - 1e-9
+    z3_subalcance = tiene_ady & (cobertura_ady_min[2] < 1 - 1e-9)
+
+    observaciones = []
+    for i in range(n):
+        notas = []
+        if z1_sobrealcance[i]:
+            notas.append("Z1 alcanza la barra remota")
+        if z1_subalcance[i]:
+            notas.append(f"Z1 subalcanza ({cobertura[0, i]:.0%} < {objetivo_z1:.0%})")
+        elif cobertura_rf[0, i] < objetivo_z1 - paso - 1e-9:
+            notas.append(f"Z1 con Rf = {rf.max():g} Ω cubre {cobertura_rf[0, i]:.0%}")
+        if z2_subalcance[i]:
+            notas.append(f"Z2 no cubre toda la línea ({cobertura[1, i]:.0%})")
+        if z2_sobrealcance[i]:
+            notas.append("Z2 alcanza el extremo de una rama adyacente")
+        if z3_subalcance[i]:
+            notas.append(f"Z3 no cubre las ramas adyacentes ({cobertura_ady_min[2, i]:.0%})")
+        observaciones.append("; ".join(notas))
+
+    nodos = indice["nodos"]
+    return {
+        "rele": [indice["clave"][r] for r in resultado["rama"]],
+        "extremo": list(resultado["extremo"]),
+        "nodo_rele": [nodos[a] for a in nodo_a],
+        "nodo_remoto": [nodos[b] for b in nodo_b],
+        "z1_cobertura": cobertura[0],
+        "z2_cobertura": cobertura[1],
+        "z3_cobertura": cobertura[2],
+        "z4_cobertura": cobertura[3],
+        "z1_cobertura_rf": cobertura_rf[0],
+        "z2_cobertura_rf": cobertura_rf[1],
+        "z1_alcance_adyacente": alcance_ady[0],
+        "z2_alcance_adyacente": alcance_ady[1],
+        "z3_alcance_adyacente": alcance_ady[2],
+        "z3_cobertura_adyacente": cobertura_ady_min[2],
+        "z1_sobrealcance": z1_sobrealcance,
+        "z1_subalcance": z1_subalcance,
+        "z2_subalcance": z2_subalcance,
+        "z2_sobrealcance": z2_sobrealcance,
+        "z3_subalcance": z3_subalcance,
+        "observaciones": observaciones,
+    }, total
@@ -0,0 +1,27 @@
+import numpy as np
+
+ESQUEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+# Decimales con que se serializan las coordenadas
+DECIMALES = 4
+
+
+# ------------------------------------------------------------------------------------------------
+# Especificaciones Vega-Lite para st.vega_lite_chart: el navegador dibuja los gráficos vectoriales
+# (con zoom, desplazamiento y tooltips) y el servidor solo arma los datos y serializa el JSON.
+#
+# Los datos de cada capa van por columnas, un solo registro {campo: [valores]} que la capa
+# expande con la transformación "flatten"; así no se repiten los nombres de campo por cada punto.
+# ------------------------------------------------------------------------------------------------
+def columnas(**campos):
+    registro = {}
+    for nombre, valores in campos.items():
+        valores = np.asarray(valores)
+        registro[nombre] = np.round(valores, DECIMALES).tolist() if valores.dtype.kind == "f" else valores.tolist()
+    return {"values": [registro]}
+
+
+def capa(datos, marca, codificacion, **extra):
+    return {
+        "data": datos, "transform": [{"flatten": list(datos["values"][0])}],
+        "mark": marca, "encoding": codificacion, **extra,
+    }
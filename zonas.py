@@ -0,0 +1,177 @@
+import numpy as np
+
+# Tolerancia relativa de las pruebas de pertenencia (puntos sobre el borde cuentan como dentro)
+TOLERANCIA = 1e-12
+# Vértices con que se aproxima un círculo al recortar y graficar
+PUNTOS_CIRCULO = 256
+
+
+# ------------------------------------------------------------------------------------------------
+# Zonas de distancia en el plano R-X. Cada zona es un dict con su tipo y sus parámetros; los
+# parámetros pueden ser escalares o arreglos (una zona por elemento) y se combinan por
+# broadcasting con los puntos z en contiene().
+# ------------------------------------------------------------------------------------------------
+
+# Mho: círculo cuyo diámetro va del punto inverso (0 = pasa por el origen) al alcance
+def mho(alcance, inverso=0.0):
+    return {
+        "tipo": "mho",
+        "alcance": np.asarray(alcance, dtype=np.complex128),
+        "inverso": np.asarray(inverso, dtype=np.complex128),
+    }
+
+
+# Mho desplazado: el diámetro se prolonga hacia atrás una fracción del alcance
+def mho_desplazado(alcance, fraccion_inversa):
+    alcance = np.asarray(alcance, dtype=np.complex128)
+    return mho(alcance, -np.asarray(fraccion_inversa, dtype=np.float64) * alcance)
+
+
+# Mho con ángulo característico angulo_rad cuyo borde pasa por z (ajuste por R_arco):
+#   |alcance| = |z| / cos(∠z - angulo_rad)
+def mho_por_punto(z, angulo_rad):
+    z = np.asarray(z, dtype=np.complex128)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        modulo = np.abs(z) / np.cos(np.angle(z) - angulo_rad)
+    return mho(modulo * np.exp(1j * np.asarray(angulo_rad, dtype=np.float64)))
+
+
+# Cuadrilateral: línea de reactancia X = x, blinders resistivos paralelos a la línea (ángulo
+# angulo_linea_deg) a +r y -r_izq, y línea direccional por el origen con ángulo angulo_direccional_deg.
+def cuadrilateral(x, r, angulo_linea_deg, r_izq=None, angulo_direccional_deg=-15.0):
+    return {
+        "tipo": "cuadrilateral",
+        "x": np.asarray(x, dtype=np.float64),
+        "r": np.asarray(r, dtype=np.float64),
+        "r_izq": np.asarray(r if r_izq is None else r_izq, dtype=np.float64),
+        "angulo_linea": np.radians(angulo_linea_deg),
+        "angulo_direccional": np.radians(angulo_direccional_deg),
+    }
+
+
+# Semiplanos a·R + b·X <= c que delimitan un cuadrilateral: lista de (a, b, c)
+def _semiplanos(zona):
+    cot = 1 / np.tan(zona["angulo_linea"])
+    seno, coseno = np.sin(zona["angulo_direccional"]), np.cos(zona["angulo_direccional"])
+    return [
+        (0.0, 1.0, zona["x"]),
+        (1.0, -cot, zona["r"]),
+        (-1.0, cot, zona["r_izq"]),
+        (seno, -coseno, 0.0),
+    ]
+
+
+def _escala(zona):
+    if zona["tipo"] == "mho":
+        return np.abs(zona["alcance"]) + np.abs(zona["inverso"])
+    return np.abs(zona["x"]) + np.abs(zona["r"]) + np.abs(zona["r_izq"])
+
+
+# ------------------------------------------------------------------------------------------------
+# Pertenencia de puntos (arreglo complejo) a la zona; zonas degeneradas no contienen nada
+# ------------------------------------------------------------------------------------------------
+def contiene(zona, z):
+    z = np.asarray(z, dtype=np.complex128)
+    with np.errstate(invalid="ignore"):
+        if zona["tipo"] == "mho":
+            centro = (zona["alcance"] + zona["inverso"]) / 2
+            radio = np.abs(zona["alcance"] - zona["inverso"]) / 2
+            valido = np.isfinite(centro) & (radio > 0)
+            return valido & (np.abs(z - centro) <= radio * (1 + TOLERANCIA))
+
+        holgura = TOLERANCIA * _escala(zona)
+        dentro = np.isfinite(_escala(zona))
+        for a, b, c in _semiplanos(zona):
+            dentro = dentro & (a * z.real + b * z.imag <= c + holgura)
+        return dentro
+
+
+# Máxima resistencia de falla Rf >= 0 con la que z + Rf sigue dentro de la zona (nan si z está fuera)
+def alcance_resistivo(zona, z):
+    z = np.asarray(z, dtype=np.complex128)
+    with np.errstate(invalid="ignore"):
+        if zona["tipo"] == "mho":
+            centro = (zona["alcance"] + zona["inverso"]) / 2
+            radio = np.abs(zona["alcance"] - zona["inverso"]) / 2
+            d = z - centro
+            rf = -d.real + np.sqrt(radio ** 2 - d.imag ** 2)
+        else:
+            # Solo limitan los semiplanos que se cierran al aumentar R (a > 0)
+            rf = np.inf
+            for a, b, c in _semiplanos(zona):
+                if np.any(np.asarray(a) > 0):
+                    rf = np.minimum(rf, (c - a * z.real - b * z.imag) / a)
+        return np.where(contiene(zona, z), np.maximum(rf, 0.0), np.nan)
+
+
+# ------------------------------------------------------------------------------------------------
+# Geometría de zonas escalares: contorno poligonal, intersección y área.
+# Todas las características son convexas, así que la intersección se obtiene recortando el
+# contorno de una zona con los semiplanos de las aristas de la otra (Sutherland-Hodgman).
+# ------------------------------------------------------------------------------------------------
+def _recortar(poligono, a, b, c):
+    if len(poligono) == 0:
+        return poligono
+    valor = a * poligono.real + b * poligono.imag - c
+    siguiente = np.roll(poligono, -1)
+    valor_sig = np.roll(valor, -1)
+    puntos = []
+    for p, q, vp, vq in zip(poligono, siguiente, valor, valor_sig):
+        if vp <= 0:
+            puntos.append(p)
+        if (vp <= 0) != (vq <= 0):
+            puntos.append(p + (q - p) * vp / (vp - vq))
+    return np.array(puntos, dtype=np.complex128)
+
+
+# Vértices del contorno en sentido antihorario
+def contorno(zona, n_puntos=PUNTOS_CIRCULO):
+    if zona["tipo"] == "mho":
+        centro = complex((zona["alcance"] + zona["inverso"]) / 2)
+        radio = abs(complex(zona["alcance"] - zona["inverso"])) / 2
+        if not np.isfinite(centro) or radio == 0:
+            return np.empty(0, dtype=np.complex128)
+        return centro + radio * np.exp(2j * np.pi * np.arange(n_puntos) / n_puntos)
+
+    lado = 10 * float(_escala(zona)) or 1.0
+    poligono = lado * np.array([-1 - 1j, 1 - 1j, 1 + 1j, -1 + 1j])
+    for a, b, c in _semiplanos(zona):
+        poligono = _recortar(poligono, float(a), float(b), float(c))
+    return poligono
+
+
+def area(poligono):
+    if len(poligono) < 3:
+        return 0.0
+    x, y = poligono.real, poligono.imag
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def interseccion(zona_a, zona_b, n_puntos=PUNTOS_CIRCULO):
+    poligono = contorno(zona_a, n_puntos)
+    borde = contorno(zona_b, n_puntos)
+    if len(borde) < 3:
+        return np.empty(0, dtype=np.complex128)
+    # Arista p->q de un polígono antihorario: interior a la izquierda, (q-p)×(z-p) >= 0
+    for p, q in zip(borde, np.roll(borde, -1)):
+        d = q - p
+        poligono = _recortar(poligono, d.imag, -d.real, d.imag * p.real - d.real * p.imag)
+    return poligono
+
+
+# Pares de zonas que se solapan: {nombre: zona} -> tabla con el área común y la fracción de la
+# zona menor que queda dentro de la otra
+def solapamientos(zonas, n_puntos=PUNTOS_CIRCULO):
+    nombres = list(zonas)
+    areas = {n: area(contorno(zonas[n], n_puntos)) for n in nombres}
+    tabla = {"zona_a": [], "zona_b": [], "area": [], "fraccion": []}
+    for i, a in enumerate(nombres):
+        for b in nombres[i + 1:]:
+            comun = area(interseccion(zonas[a], zonas[b], n_puntos))
+            if comun <= 0:
+                continue
+            tabla["zona_a"].append(a)
+            tabla["zona_b"].append(b)
+            tabla["area"].append(comun)
+            tabla["fraccion"].append(comun / min(areas[a], areas[b]) if min(areas[a], areas[b]) > 0 else 0.0)
+    return tabla